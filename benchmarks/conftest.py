@@ -0,0 +1,366 @@
+# Benchmarks of the pipeline hot paths on synthetic sessions.
+#
+# Run with, e.g.,
+#   pytest benchmarks --benchmark-json=benchmark.json --bench-duration=60
+#
+# Like the tests, this starts a local DataJoint MySQL server in docker.
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import asdict, fields
+from pathlib import Path
+
+import datajoint as dj
+import numpy as np
+import pytest
+
+from tests.datajoint._config import DATAJOINT_SERVER_PORT
+from tests.datajoint._datajoint_server import (
+    kill_datajoint_server,
+    run_datajoint_server,
+)
+
+from .synthetic import (
+    CHANNELS_PER_GROUP,
+    SESSION_START_TIME,
+    SessionSize,
+    make_timestamps,
+    write_nwb_session,
+)
+
+NWB_FILE_NAME = "benchmark_.nwb"
+TEAM_NAME = "benchmark"
+PROBE_TYPE = "tetrode_12.5"
+SORT_INTERVAL_NAME = "benchmark"
+
+global __PROCESS
+__PROCESS = None
+
+
+def pytest_addoption(parser):
+    for field in fields(SessionSize):
+        parser.addoption(
+            "--bench-" + field.name.replace("_", "-"),
+            action="store",
+            type=field.type,
+            dest=field.name,
+            default=field.default,
+            help=f"synthetic session {field.name}, default {field.default}",
+        )
+
+
+def pytest_configure(config):
+    _set_env()
+
+    global __PROCESS
+    __PROCESS = run_datajoint_server()
+
+
+def pytest_unconfigure(config):
+    if __PROCESS:
+        print("Terminating datajoint compute resource process")
+        __PROCESS.terminate()
+
+    kill_datajoint_server()
+    shutil.rmtree(os.environ["SPYGLASS_BASE_DIR"])
+
+
+def pytest_benchmark_update_json(config, benchmarks, output_json):
+    """Record the synthetic session size with the results."""
+    output_json["session_size"] = asdict(_get_session_size(config))
+
+
+def _set_env():
+    """Set environment variables."""
+    print("Setting datajoint and kachery environment variables.")
+
+    os.environ["SPYGLASS_BASE_DIR"] = str(tempfile.mkdtemp())
+
+    dj.config["database.host"] = "localhost"
+    dj.config["database.port"] = DATAJOINT_SERVER_PORT
+    dj.config["database.user"] = "root"
+    dj.config["database.password"] = "tutorial"
+
+
+def _get_session_size(config):
+    return SessionSize(
+        **{
+            field.name: config.getoption(field.name)
+            for field in fields(SessionSize)
+        }
+    )
+
+
+@pytest.fixture(scope="session")
+def session_size(pytestconfig):
+    return _get_session_size(pytestconfig)
+
+
+@pytest.fixture(scope="session")
+def synthetic_session(session_size):
+    """Writes a synthetic NWB file and inserts its session and electrodes.
+
+    Returns
+    -------
+    nwb_file_name : str
+    spike_frames : list of np.ndarray
+        Sample indices of the spikes of each ground-truth unit.
+    """
+    from spyglass.common import (
+        BrainRegion,
+        Electrode,
+        ElectrodeGroup,
+        IntervalList,
+        Nwbfile,
+        Probe,
+        ProbeType,
+        Session,
+    )
+    from spyglass.settings import raw_dir
+
+    spike_frames = write_nwb_session(
+        str(Path(raw_dir) / NWB_FILE_NAME), session_size
+    )
+    Nwbfile.insert_from_relative_file_name(NWB_FILE_NAME)
+    Session.insert1(
+        {
+            "nwb_file_name": NWB_FILE_NAME,
+            "session_description": "synthetic benchmark session",
+            "session_start_time": SESSION_START_TIME,
+            "timestamps_reference_time": SESSION_START_TIME,
+        },
+        skip_duplicates=True,
+        allow_direct_insert=True,
+    )
+
+    ProbeType.insert1(
+        {
+            "probe_type": PROBE_TYPE,
+            "probe_description": "synthetic tetrode",
+            "num_shanks": 1,
+        },
+        skip_duplicates=True,
+    )
+    Probe.insert1(
+        {
+            "probe_id": PROBE_TYPE,
+            "probe_type": PROBE_TYPE,
+            "contact_side_numbering": "True",
+        },
+        skip_duplicates=True,
+    )
+    Probe.Shank.insert1(
+        {"probe_id": PROBE_TYPE, "probe_shank": 0}, skip_duplicates=True
+    )
+    Probe.Electrode.insert(
+        [
+            {
+                "probe_id": PROBE_TYPE,
+                "probe_shank": 0,
+                "probe_electrode": contact,
+                "rel_x": 12.5 * (contact % 2),
+                "rel_y": 12.5 * (contact // 2),
+            }
+            for contact in range(CHANNELS_PER_GROUP)
+        ],
+        skip_duplicates=True,
+    )
+
+    region_id = BrainRegion.fetch_add(region_name="CA1")
+    ElectrodeGroup.insert(
+        [
+            {
+                "nwb_file_name": NWB_FILE_NAME,
+                "electrode_group_name": str(group),
+                "region_id": region_id,
+                "probe_id": PROBE_TYPE,
+                "description": "synthetic tetrode",
+            }
+            for group in range(session_size.n_groups)
+        ],
+        skip_duplicates=True,
+        allow_direct_insert=True,
+    )
+    Electrode.insert(
+        [
+            {
+                "nwb_file_name": NWB_FILE_NAME,
+                "electrode_group_name": str(electrode_id // CHANNELS_PER_GROUP),
+                "electrode_id": electrode_id,
+                "probe_id": PROBE_TYPE,
+                "probe_shank": 0,
+                "probe_electrode": electrode_id % CHANNELS_PER_GROUP,
+                "region_id": region_id,
+                "name": str(electrode_id),
+                "filtering": "none",
+                "contacts": "",
+            }
+            for electrode_id in range(session_size.n_channels)
+        ],
+        skip_duplicates=True,
+        allow_direct_insert=True,
+    )
+
+    timestamps = make_timestamps(session_size)
+    IntervalList.insert1(
+        {
+            "nwb_file_name": NWB_FILE_NAME,
+            "interval_list_name": "raw data valid times",
+            "valid_times": np.array([[timestamps[0], timestamps[-1]]]),
+        },
+        skip_duplicates=True,
+    )
+
+    return NWB_FILE_NAME, spike_frames
+
+
+@pytest.fixture(scope="session")
+def sort_group_key(synthetic_session, session_size):
+    """A sort group with all electrodes, and a sort interval of the session.
+
+    Returns
+    -------
+    key : dict
+        SpikeSortingRecordingSelection key without preproc_params_name.
+    """
+    from spyglass.common import LabTeam
+    from spyglass.spikesorting import SortGroup, SortInterval
+
+    nwb_file_name, _ = synthetic_session
+    key = {"nwb_file_name": nwb_file_name, "sort_group_id": 0}
+    SortGroup.insert1(
+        {**key, "sort_reference_electrode_id": -2}, skip_duplicates=True
+    )
+    SortGroup.SortGroupElectrode.insert(
+        [
+            {
+                **key,
+                "electrode_group_name": str(electrode_id // CHANNELS_PER_GROUP),
+                "electrode_id": electrode_id,
+            }
+            for electrode_id in range(session_size.n_channels)
+        ],
+        skip_duplicates=True,
+    )
+
+    timestamps = make_timestamps(session_size)
+    SortInterval.insert1(
+        {
+            "nwb_file_name": nwb_file_name,
+            "sort_interval_name": SORT_INTERVAL_NAME,
+            "sort_interval": np.array([timestamps[0], timestamps[-1]]),
+        },
+        skip_duplicates=True,
+    )
+    LabTeam.insert1({"team_name": TEAM_NAME}, skip_duplicates=True)
+
+    return {
+        **key,
+        "sort_interval_name": SORT_INTERVAL_NAME,
+        "team_name": TEAM_NAME,
+        "interval_list_name": "raw data valid times",
+    }
+
+
+@pytest.fixture(scope="session")
+def recording_key(sort_group_key):
+    """Populated SpikeSortingRecording key with the default preprocessing."""
+    from spyglass.spikesorting import (
+        SpikeSortingPreprocessingParameters,
+        SpikeSortingRecording,
+        SpikeSortingRecordingSelection,
+    )
+
+    SpikeSortingPreprocessingParameters().insert_default()
+    key = {**sort_group_key, "preproc_params_name": "default"}
+    SpikeSortingRecordingSelection.insert1(key, skip_duplicates=True)
+    SpikeSortingRecording.populate(key)
+
+    return (SpikeSortingRecording & key).fetch1("KEY")
+
+
+@pytest.fixture(scope="session")
+def curation_key(recording_key, synthetic_session, session_size):
+    """Curation of the ground-truth sorting of the synthetic session.
+
+    The sorting is inserted directly instead of running a sorter.
+    """
+    import spikeinterface as si
+
+    from spyglass.settings import sorting_dir
+    from spyglass.spikesorting import (
+        ArtifactDetection,
+        ArtifactDetectionParameters,
+        ArtifactDetectionSelection,
+        ArtifactRemovedIntervalList,
+        Curation,
+        SpikeSorterParameters,
+        SpikeSorting,
+        SpikeSortingSelection,
+    )
+
+    _, spike_frames = synthetic_session
+
+    ArtifactDetectionParameters().insert_default()
+    artifact_key = {**recording_key, "artifact_params_name": "none"}
+    ArtifactDetectionSelection.insert1(artifact_key, skip_duplicates=True)
+    ArtifactDetection.populate(artifact_key)
+
+    SpikeSorterParameters.insert1(
+        {
+            "sorter": "ground_truth",
+            "sorter_params_name": "benchmark",
+            "sorter_params": {},
+        },
+        skip_duplicates=True,
+    )
+    sorting_key = {
+        **recording_key,
+        "sorter": "ground_truth",
+        "sorter_params_name": "benchmark",
+        "artifact_removed_interval_list_name": (
+            ArtifactRemovedIntervalList & artifact_key
+        ).fetch1("artifact_removed_interval_list_name"),
+    }
+    SpikeSortingSelection.insert1(sorting_key, skip_duplicates=True)
+
+    sorting = si.NumpySorting.from_times_labels(
+        times_list=np.concatenate(spike_frames),
+        labels_list=np.repeat(
+            np.arange(len(spike_frames)), [len(f) for f in spike_frames]
+        ),
+        sampling_frequency=session_size.sampling_rate,
+    )
+    sorting_path = str(Path(sorting_dir) / "benchmark_ground_truth")
+    if os.path.exists(sorting_path):
+        shutil.rmtree(sorting_path)
+    sorting.save(folder=sorting_path)
+    SpikeSorting.insert1(
+        {
+            **sorting_key,
+            "sorting_path": sorting_path,
+            "time_of_sort": int(time.time()),
+        },
+        skip_duplicates=True,
+        allow_direct_insert=True,
+    )
+
+    return Curation.insert_curation(sorting_key)
+
+
+@pytest.fixture(scope="session")
+def waveforms_key(curation_key):
+    """Populated Waveforms key, not whitened."""
+    from spyglass.spikesorting import (
+        WaveformParameters,
+        Waveforms,
+        WaveformSelection,
+    )
+
+    WaveformParameters().insert_default()
+    key = {**curation_key, "waveform_params_name": "default_not_whitened"}
+    WaveformSelection.insert1(key, skip_duplicates=True)
+    Waveforms.populate(key)
+
+    return (Waveforms & key).fetch1("KEY")
@@ -0,0 +1,271 @@
+"""Synthetic sessions of configurable size for the benchmark suite.
+
+Data are generated with a fixed seed, so that runs with the same
+`SessionSize` time the same work and can be compared.
+"""
+import datetime
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import pynwb
+
+SESSION_START_TIME = datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc)
+START_TIME = 1_000.0  # s, time of the first sample
+CHANNELS_PER_GROUP = 4  # tetrodes
+GROUP_SPACING_UM = 300.0
+SPIKE_RATE = 10.0  # Hz, mean firing rate of each unit
+SPIKE_WIDTH = 32  # samples
+NOISE_STD = 20.0  # uV
+
+
+@dataclass(frozen=True)
+class SessionSize:
+    """Size of a synthetic session.
+
+    Attributes
+    ----------
+    n_channels : int
+        Number of electrodes, grouped in tetrodes.
+    duration : float
+        Duration of the recording in seconds.
+    n_intervals : int
+        Number of intervals in the synthetic interval lists.
+    n_units : int
+        Number of units in the ground-truth sorting.
+    n_frames : int
+        Number of video frames of pose estimation output.
+    sampling_rate : float
+        Sampling rate of the recording in Hz.
+    """
+
+    n_channels: int = 32
+    duration: float = 30.0
+    n_intervals: int = 100
+    n_units: int = 20
+    n_frames: int = 18_000
+    sampling_rate: float = 30_000.0
+
+    @property
+    def n_samples(self):
+        return int(self.duration * self.sampling_rate)
+
+    @property
+    def n_groups(self):
+        return int(np.ceil(self.n_channels / CHANNELS_PER_GROUP))
+
+
+def make_intervals(n_intervals, start, stop, seed=0):
+    """Disjoint, sorted intervals between start and stop.
+
+    Returns
+    -------
+    intervals : np.ndarray, shape (n_intervals, 2)
+    """
+    rng = np.random.default_rng(seed)
+    bounds = np.sort(rng.uniform(start, stop, size=2 * n_intervals))
+    return bounds.reshape(n_intervals, 2)
+
+
+def make_timestamps(size):
+    """Timestamps of the recording samples."""
+    return START_TIME + np.arange(size.n_samples) / size.sampling_rate
+
+
+def make_spike_frames(size, seed=0):
+    """Sample indices of the spikes of each unit.
+
+    Returns
+    -------
+    spike_frames : list of np.ndarray
+        Sorted, unique sample indices for each unit.
+    """
+    rng = np.random.default_rng(seed)
+    margin = SPIKE_WIDTH
+    spike_frames = []
+    for _ in range(size.n_units):
+        n_spikes = rng.poisson(SPIKE_RATE * size.duration)
+        frames = rng.integers(margin, size.n_samples - margin, size=n_spikes)
+        spike_frames.append(np.unique(frames))
+    return spike_frames
+
+
+def get_unit_channels(size, unit_id):
+    """Channels of the tetrode on which a unit is recorded."""
+    group = unit_id % size.n_groups
+    return np.arange(
+        group * CHANNELS_PER_GROUP,
+        min((group + 1) * CHANNELS_PER_GROUP, size.n_channels),
+    )
+
+
+def make_ephys_data(size, spike_frames, seed=0):
+    """Noisy int16 recording with spike waveforms added at spike_frames.
+
+    Returns
+    -------
+    data : np.ndarray, shape (n_samples, n_channels)
+    """
+    rng = np.random.default_rng(seed)
+    data = rng.normal(0.0, NOISE_STD, size=(size.n_samples, size.n_channels))
+    data = data.astype(np.float32)
+
+    offsets = np.arange(SPIKE_WIDTH) - SPIKE_WIDTH // 2
+    template = -np.exp(-0.5 * (offsets / 3.0) ** 2)
+    for unit_id, frames in enumerate(spike_frames):
+        channels = get_unit_channels(size, unit_id)
+        gains = rng.uniform(100.0, 400.0, size=len(channels))
+        for offset, value in zip(offsets, template):
+            data[np.ix_(frames + offset, channels)] += value * gains
+
+    return data.astype(np.int16)
+
+
+def write_nwb_session(nwb_file_path, size, seed=0):
+    """Write a synthetic NWB session with tetrodes and raw ephys.
+
+    Parameters
+    ----------
+    nwb_file_path : str
+    size : SessionSize
+    seed : int, optional
+
+    Returns
+    -------
+    spike_frames : list of np.ndarray
+        Sample indices of the spikes added to the recording, per unit.
+    """
+    nwbfile = pynwb.NWBFile(
+        session_description="synthetic benchmark session",
+        identifier="benchmark",
+        session_start_time=SESSION_START_TIME,
+    )
+    device = nwbfile.create_device(name="benchmark probe")
+    nwbfile.add_electrode_column(name="rel_x", description="x position (um)")
+    nwbfile.add_electrode_column(name="rel_y", description="y position (um)")
+    nwbfile.add_electrode_column(name="rel_z", description="z position (um)")
+
+    for group in range(size.n_groups):
+        electrode_group = nwbfile.create_electrode_group(
+            name=str(group),
+            description="synthetic tetrode",
+            location="CA1",
+            device=device,
+        )
+        for channel in range(CHANNELS_PER_GROUP):
+            electrode_id = group * CHANNELS_PER_GROUP + channel
+            if electrode_id >= size.n_channels:
+                break
+            nwbfile.add_electrode(
+                id=electrode_id,
+                x=0.0,
+                y=0.0,
+                z=0.0,
+                imp=-1.0,
+                location="CA1",
+                filtering="none",
+                group=electrode_group,
+                rel_x=group * GROUP_SPACING_UM + 12.5 * (channel % 2),
+                rel_y=12.5 * (channel // 2),
+                rel_z=0.0,
+            )
+
+    spike_frames = make_spike_frames(size, seed=seed)
+    electrodes = nwbfile.create_electrode_table_region(
+        region=list(range(size.n_channels)), description="all electrodes"
+    )
+    nwbfile.add_acquisition(
+        pynwb.ecephys.ElectricalSeries(
+            name="e-series",
+            data=make_ephys_data(size, spike_frames, seed=seed),
+            timestamps=make_timestamps(size),
+            electrodes=electrodes,
+            conversion=1e-6,
+        )
+    )
+
+    with pynwb.NWBHDF5IO(path=nwb_file_path, mode="w") as io:
+        io.write(nwbfile)
+
+    return spike_frames
+
+
+def make_pose_dataframe(size, seed=0):
+    """Pose estimation output of one bodypart, as in DLCPoseEstimation.
+
+    The path is a random walk with jumps and runs of low likelihood.
+
+    Returns
+    -------
+    dlc_df : pd.DataFrame
+        Columns x, y (cm) and likelihood, indexed by time.
+    """
+    rng = np.random.default_rng(seed)
+    n_frames = size.n_frames
+    time = START_TIME + np.arange(n_frames) * size.duration / n_frames
+
+    position = 50.0 + np.cumsum(rng.normal(0.0, 0.3, size=(n_frames, 2)), 0)
+    is_jump = rng.random(n_frames) < 0.01
+    position[is_jump] += rng.normal(0.0, 40.0, size=(is_jump.sum(), 2))
+
+    likelihood = rng.uniform(0.9, 1.0, size=n_frames)
+    n_runs = max(n_frames // 500, 1)
+    run_starts = rng.integers(0, n_frames, size=n_runs)
+    for run_start, run_length in zip(
+        run_starts, rng.integers(1, 60, size=n_runs)
+    ):
+        likelihood[run_start : run_start + run_length] = 0.1
+
+    return pd.DataFrame(
+        {"x": position[:, 0], "y": position[:, 1], "likelihood": likelihood},
+        index=pd.Index(time, name="time"),
+    )
+
+
+def make_ripple_inputs(size, sampling_frequency=1_000.0, seed=0):
+    """Ripple band LFPs and speed, as passed to the ripple detectors.
+
+    Returns
+    -------
+    time : np.ndarray, shape (n_time,)
+    filtered_lfps : np.ndarray, shape (n_time, n_lfps)
+    speed : np.ndarray, shape (n_time,)
+    sampling_frequency : float
+    """
+    rng = np.random.default_rng(seed)
+    n_time = int(size.duration * sampling_frequency)
+    n_lfps = min(size.n_groups, 8)
+    time = START_TIME + np.arange(n_time) / sampling_frequency
+
+    filtered_lfps = rng.normal(0.0, 10.0, size=(n_time, n_lfps))
+    ripple_carrier = np.sin(2 * np.pi * 200.0 * time)
+    n_ripples = max(int(size.duration), 1)
+    for start in rng.integers(0, max(n_time - 100, 1), size=n_ripples):
+        window = np.s_[start : start + 50]
+        filtered_lfps[window] += 60.0 * ripple_carrier[window, np.newaxis]
+
+    speed = np.abs(rng.normal(0.0, 10.0, size=n_time))
+    speed[rng.random(n_time) < 0.5] = 0.0
+
+    return time, filtered_lfps, speed, sampling_frequency
+
+
+def make_marks_dataframe(size, spike_frames, seed=0):
+    """Spike times and amplitude features, as in UnitMarks.
+
+    Returns
+    -------
+    marks_df : pd.DataFrame
+        One amplitude column per channel of a tetrode, indexed by time.
+    """
+    rng = np.random.default_rng(seed)
+    timestamps = make_timestamps(size)
+    spike_times = np.sort(timestamps[np.concatenate(spike_frames)])
+    marks = rng.normal(
+        -200.0, 50.0, size=(len(spike_times), CHANNELS_PER_GROUP)
+    )
+    return pd.DataFrame(
+        marks,
+        index=pd.Index(spike_times, name="time"),
+        columns=[f"amplitude_{ind:04d}" for ind in range(CHANNELS_PER_GROUP)],
+    )
@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+
+from spyglass.common import AnalysisNwbfile, FirFilterParameters, Nwbfile
+from spyglass.common.common_nwbfile import NWB_KEEP_FIELDS
+from spyglass.common.common_interval import (
+    consolidate_intervals,
+    interval_list_contains_ind,
+    interval_list_intersect,
+    interval_list_union,
+)
+from spyglass.utils.nwb_helper_fn import (
+    export_pruned_nwb_file,
+    get_nwb_file,
+    write_minimal_nwb_file,
+)
+
+from .synthetic import START_TIME, make_intervals, make_timestamps
+
+LFP_FILTER_NAME = "LFP 0-400 Hz"
+LFP_DECIMATION = 30
+
+
+@pytest.fixture(scope="module")
+def interval_lists(session_size):
+    stop = START_TIME + session_size.duration
+    return (
+        make_intervals(session_size.n_intervals, START_TIME, stop, seed=1),
+        make_intervals(session_size.n_intervals, START_TIME, stop, seed=2),
+    )
+
+
+@pytest.fixture(scope="module")
+def overlapping_intervals(session_size):
+    stop = START_TIME + session_size.duration
+    rng = np.random.default_rng(3)
+    starts = rng.uniform(START_TIME, stop, size=session_size.n_intervals)
+    lengths = rng.exponential(
+        session_size.duration / session_size.n_intervals,
+        size=session_size.n_intervals,
+    )
+    return np.stack((starts, starts + lengths), axis=1)
+
+
+def test_interval_list_intersect(benchmark, interval_lists):
+    benchmark(interval_list_intersect, *interval_lists)
+
+
+def test_interval_list_union(benchmark, interval_lists):
+    benchmark(interval_list_union, *interval_lists)
+
+
+def test_consolidate_intervals(benchmark, overlapping_intervals):
+    benchmark(consolidate_intervals, overlapping_intervals)
+
+
+def test_interval_list_contains_ind(benchmark, interval_lists, session_size):
+    benchmark(
+        interval_list_contains_ind,
+        interval_lists[0],
+        make_timestamps(session_size),
+    )
+
+
+def test_filter_data_nwb(benchmark, synthetic_session, session_size):
+    nwb_file_name, _ = synthetic_session
+    fs = int(session_size.sampling_rate)
+    filter_table = FirFilterParameters()
+    filter_table.add_filter(LFP_FILTER_NAME, fs, "lowpass", [400, 425])
+    filter_coeff = filter_table._filter_restrict(LFP_FILTER_NAME, fs)[
+        "filter_coeff"
+    ]
+
+    eseries = get_nwb_file(Nwbfile.get_abs_path(nwb_file_name)).acquisition[
+        "e-series"
+    ]
+    valid_times = make_intervals(
+        session_size.n_intervals,
+        START_TIME,
+        START_TIME + session_size.duration,
+        seed=1,
+    )
+    electrode_ids = list(range(session_size.n_channels))
+
+    def setup():
+        analysis_file_name = AnalysisNwbfile().create(nwb_file_name)
+        args = (
+            AnalysisNwbfile.get_abs_path(analysis_file_name),
+            eseries,
+            filter_coeff,
+            valid_times,
+            electrode_ids,
+            LFP_DECIMATION,
+        )
+        return args, {}
+
+    benchmark.extra_info["n_samples"] = session_size.n_samples
+    benchmark.pedantic(
+        filter_table.filter_data_nwb, setup=setup, rounds=3, iterations=1
+    )
+
+
+@pytest.mark.parametrize(
+    "write",
+    [
+        write_minimal_nwb_file,
+        lambda path, new_path: export_pruned_nwb_file(
+            path, new_path, NWB_KEEP_FIELDS
+        ),
+    ],
+    ids=["minimal", "export"],
+)
+def test_analysis_nwb_file(benchmark, synthetic_session, tmp_path, write):
+    """Writing the base of an analysis NWB file, as AnalysisNwbfile.create
+    does by default, compared with exporting the whole file."""
+    nwb_file_name, _ = synthetic_session
+    new_path = tmp_path / "analysis.nwb"
+
+    def setup():
+        new_path.unlink(missing_ok=True)
+        return (Nwbfile.get_abs_path(nwb_file_name), str(new_path)), {}
+
+    benchmark.pedantic(write, setup=setup, rounds=3, iterations=1)
+    benchmark.extra_info["file_size"] = new_path.stat().st_size
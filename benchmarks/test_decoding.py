@@ -0,0 +1,17 @@
+from spyglass.decoding.clusterless import UnitMarksIndicator
+
+from .synthetic import make_marks_dataframe, make_timestamps
+
+SAMPLING_RATE = 500  # Hz, UnitMarksIndicatorSelection default
+
+
+def test_unit_marks_indicator(benchmark, synthetic_session, session_size):
+    _, spike_frames = synthetic_session
+    marks_df = make_marks_dataframe(session_size, spike_frames)
+    timestamps = make_timestamps(session_size)
+    time = UnitMarksIndicator.get_time_bins_from_interval(
+        [[timestamps[0], timestamps[-1]]], SAMPLING_RATE
+    )
+
+    benchmark.extra_info["n_spikes"] = len(marks_df)
+    benchmark(UnitMarksIndicator.get_marks_indicator, marks_df, time)
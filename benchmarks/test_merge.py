@@ -0,0 +1,64 @@
+import datajoint as dj
+import pytest
+
+from spyglass.utils.dj_merge_tables import _Merge
+
+schema = dj.schema("benchmark_merge")
+
+N_ROWS = 1_000  # rows merge-inserted per round
+ROUNDS = 5
+
+
+@schema
+class BenchmarkSource(dj.Manual):
+    definition = """
+    source_id: int
+    ---
+    value: float
+    """
+
+
+@schema
+class BenchmarkOutput(_Merge):
+    definition = """
+    merge_id: uuid
+    ---
+    source: varchar(32)
+    """
+
+    class BenchmarkSource(dj.Part):  # noqa: F811
+        definition = """
+        -> master
+        ---
+        -> BenchmarkSource
+        """
+
+
+@pytest.fixture(scope="module")
+def source_rows():
+    """Source rows, each used by one round of the benchmark."""
+    BenchmarkSource.insert(
+        [
+            {"source_id": source_id, "value": float(source_id)}
+            for source_id in range(N_ROWS * ROUNDS)
+        ],
+        skip_duplicates=True,
+    )
+    return BenchmarkSource.fetch("KEY", order_by="source_id")
+
+
+def test_merge_insert(benchmark, source_rows):
+    batches = iter(
+        [
+            source_rows[start : start + N_ROWS]
+            for start in range(0, len(source_rows), N_ROWS)
+        ]
+    )
+
+    def setup():
+        return (next(batches),), {}
+
+    benchmark.extra_info["n_rows"] = N_ROWS
+    benchmark.pedantic(
+        BenchmarkOutput._merge_insert, setup=setup, rounds=ROUNDS, iterations=1
+    )
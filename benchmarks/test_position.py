@@ -0,0 +1,49 @@
+import numpy as np
+
+from spyglass.position.v1.dlc_utils import (
+    _key_to_smooth_func_dict,
+    get_span_start_stop,
+    interp_pos,
+)
+from spyglass.position.v1.position_dlc_position import (
+    DLCSmoothInterpParams,
+    nan_inds,
+)
+
+from .synthetic import make_pose_dataframe
+
+
+def _smooth_interp(dlc_df, params):
+    """The processing steps of DLCSmoothInterp.make, without the database."""
+    df_w_nans, bad_inds = nan_inds(
+        dlc_df.copy(),
+        params["max_cm_between_pts"],
+        likelihood_thresh=params["likelihood_thresh"],
+        inds_to_span=params["num_inds_to_span"],
+    )
+    nan_spans = get_span_start_stop(np.where(bad_inds)[0])
+    interp_df = interp_pos(
+        df_w_nans.copy(), nan_spans, **params["interp_params"]
+    )
+
+    smoothing_params = dict(params["smoothing_params"])
+    smoothing_duration = smoothing_params.pop("smoothing_duration")
+    sampling_rate = 1 / np.median(np.diff(dlc_df.index.to_numpy()))
+    smooth_func = _key_to_smooth_func_dict[smoothing_params["smooth_method"]]
+    return smooth_func(
+        interp_df,
+        smoothing_duration=smoothing_duration,
+        sampling_rate=sampling_rate,
+        **smoothing_params,
+    )
+
+
+def test_dlc_smooth_interp(benchmark, session_size):
+    DLCSmoothInterpParams.insert_default(skip_duplicates=True)
+    params = (DLCSmoothInterpParams & {"dlc_si_params_name": "default"}).fetch1(
+        "params"
+    )
+    dlc_df = make_pose_dataframe(session_size)
+
+    benchmark.extra_info["n_frames"] = len(dlc_df)
+    benchmark(_smooth_interp, dlc_df, params)
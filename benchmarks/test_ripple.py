@@ -0,0 +1,28 @@
+import pytest
+
+from spyglass.ripple.v1.ripple import (
+    RIPPLE_DETECTION_ALGORITHMS,
+    RippleParameters,
+)
+
+from .synthetic import make_ripple_inputs
+
+
+@pytest.mark.parametrize("algorithm", sorted(RIPPLE_DETECTION_ALGORITHMS))
+def test_ripple_detection(benchmark, session_size, algorithm):
+    RippleParameters().insert_default()
+    ripple_params = (
+        RippleParameters & {"ripple_param_name": "default"}
+    ).fetch1("ripple_param_dict")
+    time, filtered_lfps, speed, sampling_frequency = make_ripple_inputs(
+        session_size
+    )
+
+    benchmark(
+        RIPPLE_DETECTION_ALGORITHMS[algorithm],
+        time=time,
+        filtered_lfps=filtered_lfps,
+        speed=speed,
+        sampling_frequency=sampling_frequency,
+        **ripple_params["ripple_detection_params"],
+    )
@@ -0,0 +1,68 @@
+import pytest
+
+from spyglass.spikesorting import (
+    ArtifactDetection,
+    ArtifactDetectionParameters,
+    ArtifactDetectionSelection,
+    MetricParameters,
+    MetricSelection,
+    QualityMetrics,
+    SpikeSortingPreprocessingParameters,
+    SpikeSortingRecording,
+    SpikeSortingRecordingSelection,
+    Waveforms,
+    WaveformSelection,
+)
+
+ROUNDS = 3
+
+
+def _bench_make(benchmark, table, key):
+    """Times table.make(key), deleting the entry made by the previous round."""
+
+    def setup():
+        (table & key).delete_quick()
+        return (dict(key),), {}
+
+    benchmark.pedantic(table().make, setup=setup, rounds=ROUNDS, iterations=1)
+
+
+@pytest.fixture(scope="module")
+def benchmark_recording_key(sort_group_key):
+    """Selection with the default parameters under another name, so that
+    recomputing it does not touch the recording used downstream."""
+    SpikeSortingPreprocessingParameters().insert_default()
+    default_params = (
+        SpikeSortingPreprocessingParameters & {"preproc_params_name": "default"}
+    ).fetch1("preproc_params")
+    SpikeSortingPreprocessingParameters.insert1(
+        {"preproc_params_name": "benchmark", "preproc_params": default_params},
+        skip_duplicates=True,
+    )
+    key = {**sort_group_key, "preproc_params_name": "benchmark"}
+    SpikeSortingRecordingSelection.insert1(key, skip_duplicates=True)
+    return (SpikeSortingRecordingSelection & key).fetch1("KEY")
+
+
+def test_spike_sorting_recording(benchmark, benchmark_recording_key):
+    _bench_make(benchmark, SpikeSortingRecording, benchmark_recording_key)
+
+
+def test_artifact_detection(benchmark, recording_key):
+    ArtifactDetectionParameters().insert_default()
+    key = {**recording_key, "artifact_params_name": "default"}
+    ArtifactDetectionSelection.insert1(key, skip_duplicates=True)
+    _bench_make(benchmark, ArtifactDetection, key)
+
+
+def test_waveforms(benchmark, waveforms_key):
+    key = {**waveforms_key, "waveform_params_name": "default_whitened"}
+    WaveformSelection.insert1(key, skip_duplicates=True)
+    _bench_make(benchmark, Waveforms, key)
+
+
+def test_quality_metrics(benchmark, waveforms_key):
+    MetricParameters().insert_default()
+    key = {**waveforms_key, "metric_params_name": "franklab_default3"}
+    MetricSelection.insert1(key, skip_duplicates=True)
+    _bench_make(benchmark, QualityMetrics, key)
@@ -8,6 +8,7 @@ from ..utils.nwb_helper_fn import (
     get_nwb_file,
     get_raw_eseries,
     get_valid_intervals,
+    open_nwb_file,
 )
 from .common_behav import (
     PositionIntervalMap,
@@ -12,7 +12,7 @@ from ..utils.dj_mixin import SpyglassMixin
 from ..utils.nwb_helper_fn import (
     get_all_spatial_series,
     get_data_interface,
-    get_nwb_file,
+    open_nwb_file,
 )
 from .common_device import CameraDevice
 from .common_ephys import Raw  # noqa: F401
@@ -55,47 +55,49 @@ class PositionSource(dj.Manual):
         nwb_file_name : str
             The name of the NWB file.
         """
-        nwbf = get_nwb_file(nwb_file_name)
-        all_pos = get_all_spatial_series(nwbf, verbose=True)
-        sess_key = Nwbfile.get_file_key(nwb_file_name)
-        src_key = dict(**sess_key, source="trodes", import_file_name="")
+        with open_nwb_file(nwb_file_name) as nwbf:
+            all_pos = get_all_spatial_series(nwbf, verbose=True)
+            sess_key = Nwbfile.get_file_key(nwb_file_name)
+            src_key = dict(**sess_key, source="trodes", import_file_name="")
 
-        if all_pos is None:
-            return
-
-        sources = []
-        intervals = []
-        spat_series = []
+            if all_pos is None:
+                return
 
-        for epoch, epoch_list in all_pos.items():
-            ind_key = dict(interval_list_name=cls.get_pos_interval_name(epoch))
+            sources = []
+            intervals = []
+            spat_series = []
 
-            sources.append(dict(**src_key, **ind_key))
-            intervals.append(
-                dict(
-                    **sess_key,
-                    **ind_key,
-                    valid_times=epoch_list[0]["valid_times"],
+            for epoch, epoch_list in all_pos.items():
+                ind_key = dict(
+                    interval_list_name=cls.get_pos_interval_name(epoch)
                 )
-            )
 
-            for index, pdict in enumerate(epoch_list):
-                spat_series.append(
+                sources.append(dict(**src_key, **ind_key))
+                intervals.append(
                     dict(
                         **sess_key,
                         **ind_key,
-                        id=index,
-                        name=pdict.get("name"),
+                        valid_times=epoch_list[0]["valid_times"],
                     )
                 )
 
-        with cls.connection.transaction:
-            IntervalList.insert(intervals)
-            cls.insert(sources)
-            cls.SpatialSeries.insert(spat_series)
+                for index, pdict in enumerate(epoch_list):
+                    spat_series.append(
+                        dict(
+                            **sess_key,
+                            **ind_key,
+                            id=index,
+                            name=pdict.get("name"),
+                        )
+                    )
+
+            with cls.connection.transaction:
+                IntervalList.insert(intervals)
+                cls.insert(sources)
+                cls.SpatialSeries.insert(spat_series)
 
-        # make map from epoch intervals to position intervals
-        populate_position_interval_map_session(nwb_file_name)
+            # make map from epoch intervals to position intervals
+            populate_position_interval_map_session(nwb_file_name)
 
     @staticmethod
     def get_pos_interval_name(epoch_num: int) -> str:
@@ -197,27 +199,27 @@ class RawPosition(dj.Imported):
         nwb_file_name = key["nwb_file_name"]
         interval_list_name = key["interval_list_name"]
 
-        nwbf = get_nwb_file(nwb_file_name)
-        indices = (PositionSource.SpatialSeries & key).fetch("id")
-
-        # incl_times = False -> don't do extra processing for valid_times
-        spat_objs = get_all_spatial_series(nwbf, incl_times=False)[
-            PositionSource.get_epoch_num(interval_list_name)
-        ]
+        with open_nwb_file(nwb_file_name) as nwbf:
+            indices = (PositionSource.SpatialSeries & key).fetch("id")
 
-        self.insert1(key)
-        self.PosObject.insert(
-            [
-                dict(
-                    nwb_file_name=nwb_file_name,
-                    interval_list_name=interval_list_name,
-                    id=index,
-                    raw_position_object_id=obj["raw_position_object_id"],
-                )
-                for index, obj in enumerate(spat_objs)
-                if index in indices
+            # incl_times = False -> don't do extra processing for valid_times
+            spat_objs = get_all_spatial_series(nwbf, incl_times=False)[
+                PositionSource.get_epoch_num(interval_list_name)
             ]
-        )
+
+            self.insert1(key)
+            self.PosObject.insert(
+                [
+                    dict(
+                        nwb_file_name=nwb_file_name,
+                        interval_list_name=interval_list_name,
+                        id=index,
+                        raw_position_object_id=obj["raw_position_object_id"],
+                    )
+                    for index, obj in enumerate(spat_objs)
+                    if index in indices
+                ]
+            )
 
     def fetch_nwb(self, *attrs, **kwargs) -> list:
         """
@@ -264,49 +266,51 @@ class StateScriptFile(SpyglassMixin, dj.Imported):
         """Add a new row to the StateScriptFile table."""
         nwb_file_name = key["nwb_file_name"]
         nwb_file_abspath = Nwbfile.get_abs_path(nwb_file_name)
-        nwbf = get_nwb_file(nwb_file_abspath)
-
-        associated_files = nwbf.processing.get(
-            "associated_files"
-        ) or nwbf.processing.get("associated files")
-        if associated_files is None:
-            print(
-                "Unable to import StateScriptFile: no processing module named "
-                + '"associated_files" found in {nwb_file_name}.'
-            )
-            return
-
-        for associated_file_obj in associated_files.data_interfaces.values():
-            if not isinstance(
-                associated_file_obj, ndx_franklab_novela.AssociatedFiles
-            ):
+        with open_nwb_file(nwb_file_abspath) as nwbf:
+            associated_files = nwbf.processing.get(
+                "associated_files"
+            ) or nwbf.processing.get("associated files")
+            if associated_files is None:
                 print(
-                    f"Data interface {associated_file_obj.name} within "
-                    + '"associated_files" processing module is not '
-                    + "of expected type ndx_franklab_novela.AssociatedFiles\n"
+                    "Unable to import StateScriptFile: no processing module named "
+                    + '"associated_files" found in {nwb_file_name}.'
                 )
                 return
 
-            # parse the task_epochs string
-            # TODO: update associated_file_obj.task_epochs to be an array of
-            # 1-based ints, not a comma-separated string of ints
-
-            epoch_list = associated_file_obj.task_epochs.split(",")
-            # only insert if this is the statescript file
-            print(associated_file_obj.description)
-            if (
-                "statescript".upper() in associated_file_obj.description.upper()
-                or "state_script".upper()
-                in associated_file_obj.description.upper()
-                or "state script".upper()
-                in associated_file_obj.description.upper()
-            ):
-                # find the file associated with this epoch
-                if str(key["epoch"]) in epoch_list:
-                    key["file_object_id"] = associated_file_obj.object_id
-                    self.insert1(key)
-            else:
-                print("not a statescript file")
+            for (
+                associated_file_obj
+            ) in associated_files.data_interfaces.values():
+                if not isinstance(
+                    associated_file_obj, ndx_franklab_novela.AssociatedFiles
+                ):
+                    print(
+                        f"Data interface {associated_file_obj.name} within "
+                        + '"associated_files" processing module is not '
+                        + "of expected type ndx_franklab_novela.AssociatedFiles\n"
+                    )
+                    return
+
+                # parse the task_epochs string
+                # TODO: update associated_file_obj.task_epochs to be an array of
+                # 1-based ints, not a comma-separated string of ints
+
+                epoch_list = associated_file_obj.task_epochs.split(",")
+                # only insert if this is the statescript file
+                print(associated_file_obj.description)
+                if (
+                    "statescript".upper()
+                    in associated_file_obj.description.upper()
+                    or "state_script".upper()
+                    in associated_file_obj.description.upper()
+                    or "state script".upper()
+                    in associated_file_obj.description.upper()
+                ):
+                    # find the file associated with this epoch
+                    if str(key["epoch"]) in epoch_list:
+                        key["file_object_id"] = associated_file_obj.object_id
+                        self.insert1(key)
+                else:
+                    print("not a statescript file")
 
 
 @schema
@@ -341,57 +345,61 @@ class VideoFile(SpyglassMixin, dj.Imported):
 
         nwb_file_name = key["nwb_file_name"]
         nwb_file_abspath = Nwbfile.get_abs_path(nwb_file_name)
-        nwbf = get_nwb_file(nwb_file_abspath)
-        videos = get_data_interface(
-            nwbf, "video", pynwb.behavior.BehavioralEvents
-        )
+        with open_nwb_file(nwb_file_abspath) as nwbf:
+            videos = get_data_interface(
+                nwbf, "video", pynwb.behavior.BehavioralEvents
+            )
 
-        if videos is None:
-            print(f"No video data interface found in {nwb_file_name}\n")
-            return
-        else:
-            videos = videos.time_series
-
-        # get the interval for the current TaskEpoch
-        interval_list_name = (TaskEpoch() & key).fetch1("interval_list_name")
-        valid_times = (
-            IntervalList
-            & {
-                "nwb_file_name": key["nwb_file_name"],
-                "interval_list_name": interval_list_name,
-            }
-        ).fetch1("valid_times")
-
-        is_found = False
-        for ind, video in enumerate(videos.values()):
-            if isinstance(video, pynwb.image.ImageSeries):
-                video = [video]
-            for video_obj in video:
-                # check to see if the times for this video_object are largely
-                # overlapping with the task epoch times
-
-                if len(
-                    interval_list_contains(valid_times, video_obj.timestamps)
-                    > 0.9 * len(video_obj.timestamps)
-                ):
-                    key["video_file_num"] = ind
-                    camera_name = video_obj.device.camera_name
-                    if CameraDevice & {"camera_name": camera_name}:
-                        key["camera_name"] = video_obj.device.camera_name
-                    else:
-                        raise KeyError(
-                            f"No camera with camera_name: {camera_name} found "
-                            + "in CameraDevice table."
-                        )
-                    key["video_file_object_id"] = video_obj.object_id
-                    self.insert1(key)
-                    is_found = True
+            if videos is None:
+                print(f"No video data interface found in {nwb_file_name}\n")
+                return
+            else:
+                videos = videos.time_series
 
-        if not is_found and verbose:
-            print(
-                f"No video found corresponding to file {nwb_file_name}, "
-                + f"epoch {interval_list_name}"
+            # get the interval for the current TaskEpoch
+            interval_list_name = (TaskEpoch() & key).fetch1(
+                "interval_list_name"
             )
+            valid_times = (
+                IntervalList
+                & {
+                    "nwb_file_name": key["nwb_file_name"],
+                    "interval_list_name": interval_list_name,
+                }
+            ).fetch1("valid_times")
+
+            is_found = False
+            for ind, video in enumerate(videos.values()):
+                if isinstance(video, pynwb.image.ImageSeries):
+                    video = [video]
+                for video_obj in video:
+                    # check to see if the times for this video_object are largely
+                    # overlapping with the task epoch times
+
+                    if len(
+                        interval_list_contains(
+                            valid_times, video_obj.timestamps
+                        )
+                        > 0.9 * len(video_obj.timestamps)
+                    ):
+                        key["video_file_num"] = ind
+                        camera_name = video_obj.device.camera_name
+                        if CameraDevice & {"camera_name": camera_name}:
+                            key["camera_name"] = video_obj.device.camera_name
+                        else:
+                            raise KeyError(
+                                f"No camera with camera_name: {camera_name} found "
+                                + "in CameraDevice table."
+                            )
+                        key["video_file_object_id"] = video_obj.object_id
+                        self.insert1(key)
+                        is_found = True
+
+            if not is_found and verbose:
+                print(
+                    f"No video found corresponding to file {nwb_file_name}, "
+                    + f"epoch {interval_list_name}"
+                )
 
     @classmethod
     def update_entries(cls, restrict={}):
@@ -430,20 +438,20 @@ class VideoFile(SpyglassMixin, dj.Imported):
             raise OSError("SPYGLASS_VIDEO_DIR does not exist")
         video_info = (cls & key).fetch1()
         nwb_path = Nwbfile.get_abs_path(key["nwb_file_name"])
-        nwbf = get_nwb_file(nwb_path)
-        nwb_video = nwbf.objects[video_info["video_file_object_id"]]
-        video_filename = nwb_video.name
-        # see if the file exists and is stored in the base analysis dir
-        nwb_video_file_abspath = pathlib.Path(
-            f"{video_dir}/{pathlib.Path(video_filename)}"
-        )
-        if nwb_video_file_abspath.exists():
-            return nwb_video_file_abspath.as_posix()
-        else:
-            raise FileNotFoundError(
-                f"video file with filename: {video_filename} "
-                f"does not exist in {video_dir}/"
+        with open_nwb_file(nwb_path) as nwbf:
+            nwb_video = nwbf.objects[video_info["video_file_object_id"]]
+            video_filename = nwb_video.name
+            # see if the file exists and is stored in the base analysis dir
+            nwb_video_file_abspath = pathlib.Path(
+                f"{video_dir}/{pathlib.Path(video_filename)}"
             )
+            if nwb_video_file_abspath.exists():
+                return nwb_video_file_abspath.as_posix()
+            else:
+                raise FileNotFoundError(
+                    f"video file with filename: {video_filename} "
+                    f"does not exist in {video_dir}/"
+                )
 
 
 @schema
@@ -1,7 +1,7 @@
 import datajoint as dj
 import ndx_franklab_novela
 
-from ..utils.nwb_helper_fn import get_nwb_file
+from ..utils.nwb_helper_fn import open_nwb_file
 from .errors import PopulateException
 
 schema = dj.schema("common_device")
@@ -657,84 +657,83 @@ class Probe(dj.Manual):
         from .common_nwbfile import Nwbfile
 
         nwb_file_path = Nwbfile.get_abs_path(nwb_file_name)
-        nwbfile = get_nwb_file(nwb_file_path)
+        with open_nwb_file(nwb_file_path) as nwbfile:
+            query = ProbeType & {"probe_type": probe_type}
+            if len(query) == 0:
+                print(
+                    f"No ProbeType found with probe_type '{probe_type}'. Aborting."
+                )
+                return
 
-        query = ProbeType & {"probe_type": probe_type}
-        if len(query) == 0:
-            print(
-                f"No ProbeType found with probe_type '{probe_type}'. Aborting."
-            )
-            return
-
-        new_probe_dict = {
-            "probe_id": probe_id,
-            "probe_type": probe_type,
-            "contact_side_numbering": (
-                "True" if contact_side_numbering else "False"
-            ),
-        }
-        shank_dict = {}
-        elect_dict = {}
-
-        # iterate through the electrodes table in the NWB file
-        # and use the group column (ElectrodeGroup) to create shanks
-        # and use the device attribute of each ElectrodeGroup to create a probe
-        created_shanks = {}  # map device name to shank_index (int)
-        device_found = False
-        for elec_index in range(len(nwbfile.electrodes)):
-            electrode_group = nwbfile.electrodes[elec_index, "group"]
-            eg_device_name = electrode_group.device.name
-
-            # only look at electrodes where the associated device is the one
-            # specified
-            if eg_device_name == nwb_device_name:
-                device_found = True
-
-                # if a Shank has not yet been created from the electrode group,
-                # then create it
-                if electrode_group.name not in created_shanks:
-                    shank_index = len(created_shanks)
-                    created_shanks[electrode_group.name] = shank_index
-
-                    # build the dictionary of Probe.Shank data
-                    shank_dict[shank_index] = {
+            new_probe_dict = {
+                "probe_id": probe_id,
+                "probe_type": probe_type,
+                "contact_side_numbering": (
+                    "True" if contact_side_numbering else "False"
+                ),
+            }
+            shank_dict = {}
+            elect_dict = {}
+
+            # iterate through the electrodes table in the NWB file
+            # and use the group column (ElectrodeGroup) to create shanks
+            # and use the device attribute of each ElectrodeGroup to create a probe
+            created_shanks = {}  # map device name to shank_index (int)
+            device_found = False
+            for elec_index in range(len(nwbfile.electrodes)):
+                electrode_group = nwbfile.electrodes[elec_index, "group"]
+                eg_device_name = electrode_group.device.name
+
+                # only look at electrodes where the associated device is the one
+                # specified
+                if eg_device_name == nwb_device_name:
+                    device_found = True
+
+                    # if a Shank has not yet been created from the electrode group,
+                    # then create it
+                    if electrode_group.name not in created_shanks:
+                        shank_index = len(created_shanks)
+                        created_shanks[electrode_group.name] = shank_index
+
+                        # build the dictionary of Probe.Shank data
+                        shank_dict[shank_index] = {
+                            "probe_id": new_probe_dict["probe_id"],
+                            "probe_shank": shank_index,
+                        }
+
+                    # get the probe shank index associated with this Electrode
+                    probe_shank = created_shanks[electrode_group.name]
+
+                    # build the dictionary of Probe.Electrode data
+                    elect_dict[elec_index] = {
                         "probe_id": new_probe_dict["probe_id"],
-                        "probe_shank": shank_index,
+                        "probe_shank": probe_shank,
+                        "probe_electrode": elec_index,
                     }
+                    if "rel_x" in nwbfile.electrodes[elec_index]:
+                        elect_dict[elec_index]["rel_x"] = nwbfile.electrodes[
+                            elec_index, "rel_x"
+                        ]
+                    if "rel_y" in nwbfile.electrodes[elec_index]:
+                        elect_dict[elec_index]["rel_y"] = nwbfile.electrodes[
+                            elec_index, "rel_y"
+                        ]
+                    if "rel_z" in nwbfile.electrodes[elec_index]:
+                        elect_dict[elec_index]["rel_z"] = nwbfile.electrodes[
+                            elec_index, "rel_z"
+                        ]
+
+            if not device_found:
+                print(
+                    "No electrodes in the NWB file were associated with a device "
+                    + f"named '{nwb_device_name}'."
+                )
+                return
 
-                # get the probe shank index associated with this Electrode
-                probe_shank = created_shanks[electrode_group.name]
-
-                # build the dictionary of Probe.Electrode data
-                elect_dict[elec_index] = {
-                    "probe_id": new_probe_dict["probe_id"],
-                    "probe_shank": probe_shank,
-                    "probe_electrode": elec_index,
-                }
-                if "rel_x" in nwbfile.electrodes[elec_index]:
-                    elect_dict[elec_index]["rel_x"] = nwbfile.electrodes[
-                        elec_index, "rel_x"
-                    ]
-                if "rel_y" in nwbfile.electrodes[elec_index]:
-                    elect_dict[elec_index]["rel_y"] = nwbfile.electrodes[
-                        elec_index, "rel_y"
-                    ]
-                if "rel_z" in nwbfile.electrodes[elec_index]:
-                    elect_dict[elec_index]["rel_z"] = nwbfile.electrodes[
-                        elec_index, "rel_z"
-                    ]
-
-        if not device_found:
-            print(
-                "No electrodes in the NWB file were associated with a device "
-                + f"named '{nwb_device_name}'."
-            )
-            return
-
-        # insert the Probe, then the Shank parts, and then the Electrode parts
-        cls.insert1(new_probe_dict, skip_duplicates=True)
+            # insert the Probe, then the Shank parts, and then the Electrode parts
+            cls.insert1(new_probe_dict, skip_duplicates=True)
 
-        for shank in shank_dict.values():
-            cls.Shank.insert1(shank, skip_duplicates=True)
-        for electrode in elect_dict.values():
-            cls.Electrode.insert1(electrode, skip_duplicates=True)
+            for shank in shank_dict.values():
+                cls.Shank.insert1(shank, skip_duplicates=True)
+            for electrode in elect_dict.values():
+                cls.Electrode.insert1(electrode, skip_duplicates=True)
@@ -5,7 +5,7 @@ import pandas as pd
 import pynwb
 
 from ..utils.dj_mixin import SpyglassMixin
-from ..utils.nwb_helper_fn import get_data_interface, get_nwb_file
+from ..utils.nwb_helper_fn import get_data_interface, open_nwb_file
 from .common_ephys import Raw
 from .common_interval import IntervalList
 from .common_nwbfile import Nwbfile
@@ -29,26 +29,32 @@ class DIOEvents(SpyglassMixin, dj.Imported):
     def make(self, key):
         nwb_file_name = key["nwb_file_name"]
         nwb_file_abspath = Nwbfile.get_abs_path(nwb_file_name)
-        nwbf = get_nwb_file(nwb_file_abspath)
-
-        behav_events = get_data_interface(
-            nwbf, "behavioral_events", pynwb.behavior.BehavioralEvents
-        )
-        if behav_events is None:
-            print(
-                "No conforming behavioral events data interface found in "
-                + f"{nwb_file_name}\n"
+        with open_nwb_file(nwb_file_abspath) as nwbf:
+            behav_events = get_data_interface(
+                nwbf, "behavioral_events", pynwb.behavior.BehavioralEvents
             )
-            return
+            if behav_events is None:
+                print(
+                    "No conforming behavioral events data interface found in "
+                    + f"{nwb_file_name}\n"
+                )
+                return
 
-        # Times for these events correspond to the valid times for the raw data
-        key["interval_list_name"] = (
-            Raw() & {"nwb_file_name": nwb_file_name}
-        ).fetch1("interval_list_name")
-        for event_series in behav_events.time_series.values():
-            key["dio_event_name"] = event_series.name
-            key["dio_object_id"] = event_series.object_id
-            self.insert1(key, skip_duplicates=True)
+            # Times for these events correspond to the valid times for the raw data
+            key["interval_list_name"] = (
+                Raw() & {"nwb_file_name": nwb_file_name}
+            ).fetch1("interval_list_name")
+            self.insert(
+                [
+                    {
+                        **key,
+                        "dio_event_name": event_series.name,
+                        "dio_object_id": event_series.object_id,
+                    }
+                    for event_series in behav_events.time_series.values()
+                ],
+                skip_duplicates=True,
+            )
 
     def plot_all_dio_events(self):
         """Plot all DIO events in the session.
@@ -15,6 +15,7 @@ from ..utils.nwb_helper_fn import (
     get_electrode_indices,
     get_nwb_file,
     get_valid_intervals,
+    open_nwb_file,
 )
 from .common_device import Probe  # noqa: F401
 from .common_filter import FirFilterParameters
@@ -47,29 +48,32 @@ class ElectrodeGroup(dj.Imported):
     def make(self, key):
         nwb_file_name = key["nwb_file_name"]
         nwb_file_abspath = Nwbfile.get_abs_path(nwb_file_name)
-        nwbf = get_nwb_file(nwb_file_abspath)
-        for electrode_group in nwbf.electrode_groups.values():
-            key["electrode_group_name"] = electrode_group.name
-            # add electrode group location if it does not exist, and fetch the row
-            key["region_id"] = BrainRegion.fetch_add(
-                region_name=electrode_group.location
-            )
-            if isinstance(electrode_group.device, ndx_franklab_novela.Probe):
-                key["probe_id"] = electrode_group.device.probe_type
-            key["description"] = electrode_group.description
-            if isinstance(
-                electrode_group, ndx_franklab_novela.NwbElectrodeGroup
-            ):
-                # Define target_hemisphere based on targeted x coordinate
-                if (
-                    electrode_group.targeted_x >= 0
-                ):  # if positive or zero x coordinate
-                    # define target location as right hemisphere
-                    key["target_hemisphere"] = "Right"
-                else:  # if negative x coordinate
-                    # define target location as left hemisphere
-                    key["target_hemisphere"] = "Left"
-            self.insert1(key, skip_duplicates=True)
+        with open_nwb_file(nwb_file_abspath) as nwbf:
+            region_ids = _RegionIdCache()
+            electrode_group_keys = []
+            for electrode_group in nwbf.electrode_groups.values():
+                key["electrode_group_name"] = electrode_group.name
+                # add electrode group location if it does not exist, and fetch the row
+                key["region_id"] = region_ids[electrode_group.location]
+                if isinstance(
+                    electrode_group.device, ndx_franklab_novela.Probe
+                ):
+                    key["probe_id"] = electrode_group.device.probe_type
+                key["description"] = electrode_group.description
+                if isinstance(
+                    electrode_group, ndx_franklab_novela.NwbElectrodeGroup
+                ):
+                    # Define target_hemisphere based on targeted x coordinate
+                    if (
+                        electrode_group.targeted_x >= 0
+                    ):  # if positive or zero x coordinate
+                        # define target location as right hemisphere
+                        key["target_hemisphere"] = "Right"
+                    else:  # if negative x coordinate
+                        # define target location as left hemisphere
+                        key["target_hemisphere"] = "Left"
+                electrode_group_keys.append(dict(key))
+            self.insert(electrode_group_keys, skip_duplicates=True)
 
 
 @schema
@@ -97,66 +101,76 @@ class Electrode(dj.Imported):
     def make(self, key):
         nwb_file_name = key["nwb_file_name"]
         nwb_file_abspath = Nwbfile.get_abs_path(nwb_file_name)
-        nwbf = get_nwb_file(nwb_file_abspath)
-        config = get_config(nwb_file_abspath)
+        with open_nwb_file(nwb_file_abspath) as nwbf:
+            config = get_config(nwb_file_abspath)
 
-        if "Electrode" in config:
-            electrode_config_dicts = {
-                electrode_dict["electrode_id"]: electrode_dict
-                for electrode_dict in config["Electrode"]
-            }
-        else:
-            electrode_config_dicts = dict()
-
-        electrodes = nwbf.electrodes.to_dataframe()
-        for elect_id, elect_data in electrodes.iterrows():
-            key["electrode_id"] = elect_id
-            key["name"] = str(elect_id)
-            key["electrode_group_name"] = elect_data.group_name
-            key["region_id"] = BrainRegion.fetch_add(
-                region_name=elect_data.group.location
+            if "Electrode" in config:
+                electrode_config_dicts = {
+                    electrode_dict["electrode_id"]: electrode_dict
+                    for electrode_dict in config["Electrode"]
+                }
+            else:
+                electrode_config_dicts = dict()
+
+            region_ids = _RegionIdCache()
+            probe_electrode_exists = _ProbeElectrodeCache(
+                electrode_config_dicts.values()
             )
-            key["x"] = elect_data.x
-            key["y"] = elect_data.y
-            key["z"] = elect_data.z
-            key["x_warped"] = 0
-            key["y_warped"] = 0
-            key["z_warped"] = 0
-            key["contacts"] = ""
-            key["filtering"] = elect_data.filtering
-            key["impedance"] = elect_data.get("imp")
-
-            # rough check of whether the electrodes table was created by rec_to_nwb and has
-            # the appropriate custom columns used by rec_to_nwb
-            # TODO this could be better resolved by making an extension for the electrodes table
-            if (
-                isinstance(elect_data.group.device, ndx_franklab_novela.Probe)
-                and "probe_shank" in elect_data
-                and "probe_electrode" in elect_data
-                and "bad_channel" in elect_data
-                and "ref_elect_id" in elect_data
-            ):
-                key["probe_id"] = elect_data.group.device.probe_type
-                key["probe_shank"] = elect_data.probe_shank
-                key["probe_electrode"] = elect_data.probe_electrode
-                key["bad_channel"] = (
-                    "True" if elect_data.bad_channel else "False"
-                )
-                key["original_reference_electrode"] = elect_data.ref_elect_id
+            electrode_keys = []
+            electrodes = nwbf.electrodes.to_dataframe()
+            for elect_id, elect_data in electrodes.iterrows():
+                key["electrode_id"] = elect_id
+                key["name"] = str(elect_id)
+                key["electrode_group_name"] = elect_data.group_name
+                key["region_id"] = region_ids[elect_data.group.location]
+                key["x"] = elect_data.x
+                key["y"] = elect_data.y
+                key["z"] = elect_data.z
+                key["x_warped"] = 0
+                key["y_warped"] = 0
+                key["z_warped"] = 0
+                key["contacts"] = ""
+                key["filtering"] = elect_data.filtering
+                key["impedance"] = elect_data.get("imp")
 
-            # override with information from the config YAML based on primary key (electrode id)
-            if elect_id in electrode_config_dicts:
-                # check whether the Probe.Electrode being referenced exists
-                query = Probe.Electrode & electrode_config_dicts[elect_id]
-                if len(query) == 0:
-                    warnings.warn(
-                        f"No Probe.Electrode exists that matches the data: {electrode_config_dicts[elect_id]}. "
-                        f"The config YAML for Electrode with electrode_id {elect_id} will be ignored."
+                # rough check of whether the electrodes table was created by rec_to_nwb and has
+                # the appropriate custom columns used by rec_to_nwb
+                # TODO this could be better resolved by making an extension for the electrodes table
+                if (
+                    isinstance(
+                        elect_data.group.device, ndx_franklab_novela.Probe
                     )
-                else:
-                    key.update(electrode_config_dicts[elect_id])
-
-            self.insert1(key, skip_duplicates=True)
+                    and "probe_shank" in elect_data
+                    and "probe_electrode" in elect_data
+                    and "bad_channel" in elect_data
+                    and "ref_elect_id" in elect_data
+                ):
+                    key["probe_id"] = elect_data.group.device.probe_type
+                    key["probe_shank"] = elect_data.probe_shank
+                    key["probe_electrode"] = elect_data.probe_electrode
+                    key["bad_channel"] = (
+                        "True" if elect_data.bad_channel else "False"
+                    )
+                    key[
+                        "original_reference_electrode"
+                    ] = elect_data.ref_elect_id
+
+                # override with information from the config YAML based on primary key (electrode id)
+                if elect_id in electrode_config_dicts:
+                    # check whether the Probe.Electrode being referenced exists
+                    if not probe_electrode_exists(
+                        electrode_config_dicts[elect_id]
+                    ):
+                        warnings.warn(
+                            f"No Probe.Electrode exists that matches the data: {electrode_config_dicts[elect_id]}. "
+                            f"The config YAML for Electrode with electrode_id {elect_id} will be ignored."
+                        )
+                    else:
+                        key.update(electrode_config_dicts[elect_id])
+
+                electrode_keys.append(dict(key))
+
+            self.insert(electrode_keys, skip_duplicates=True)
 
     @classmethod
     def create_from_config(cls, nwb_file_name: str):
@@ -168,53 +182,54 @@ class Electrode(dj.Imported):
             The name of the NWB file.
         """
         nwb_file_abspath = Nwbfile.get_abs_path(nwb_file_name)
-        nwbf = get_nwb_file(nwb_file_abspath)
-        config = get_config(nwb_file_abspath)
-        if "Electrode" not in config:
-            return
-
-        # map electrode id to dictionary of electrode information from config YAML
-        electrode_dicts = {
-            electrode_dict["electrode_id"]: electrode_dict
-            for electrode_dict in config["Electrode"]
-        }
+        with open_nwb_file(nwb_file_abspath) as nwbf:
+            config = get_config(nwb_file_abspath)
+            if "Electrode" not in config:
+                return
 
-        electrodes = nwbf.electrodes.to_dataframe()
-        for nwbfile_elect_id, elect_data in electrodes.iterrows():
-            if nwbfile_elect_id in electrode_dicts:
-                # use the information in the electrodes table to start and then add (or overwrite) values from the
-                # config YAML
-                key = dict()
-                key["nwb_file_name"] = nwb_file_name
-                key["name"] = str(nwbfile_elect_id)
-                key["electrode_group_name"] = elect_data.group_name
-                key["region_id"] = BrainRegion.fetch_add(
-                    region_name=elect_data.group.location
-                )
-                key["x"] = elect_data.x
-                key["y"] = elect_data.y
-                key["z"] = elect_data.z
-                key["x_warped"] = 0
-                key["y_warped"] = 0
-                key["z_warped"] = 0
-                key["contacts"] = ""
-                key["filtering"] = elect_data.filtering
-                key["impedance"] = elect_data.get("imp")
-                key.update(electrode_dicts[nwbfile_elect_id])
-                query = Electrode & {"electrode_id": nwbfile_elect_id}
-                if len(query):
-                    cls.update1(key)
-                    print(f"Updated Electrode with ID {nwbfile_elect_id}.")
+            # map electrode id to dictionary of electrode information from config YAML
+            electrode_dicts = {
+                electrode_dict["electrode_id"]: electrode_dict
+                for electrode_dict in config["Electrode"]
+            }
+
+            region_ids = _RegionIdCache()
+            existing_ids = set(
+                (cls & {"nwb_file_name": nwb_file_name}).fetch("electrode_id")
+            )
+            new_keys = []
+            electrodes = nwbf.electrodes.to_dataframe()
+            for nwbfile_elect_id, elect_data in electrodes.iterrows():
+                if nwbfile_elect_id in electrode_dicts:
+                    # use the information in the electrodes table to start and then add (or overwrite) values from the
+                    # config YAML
+                    key = dict()
+                    key["nwb_file_name"] = nwb_file_name
+                    key["name"] = str(nwbfile_elect_id)
+                    key["electrode_group_name"] = elect_data.group_name
+                    key["region_id"] = region_ids[elect_data.group.location]
+                    key["x"] = elect_data.x
+                    key["y"] = elect_data.y
+                    key["z"] = elect_data.z
+                    key["x_warped"] = 0
+                    key["y_warped"] = 0
+                    key["z_warped"] = 0
+                    key["contacts"] = ""
+                    key["filtering"] = elect_data.filtering
+                    key["impedance"] = elect_data.get("imp")
+                    key.update(electrode_dicts[nwbfile_elect_id])
+                    if nwbfile_elect_id in existing_ids:
+                        cls.update1(key)
+                        print(f"Updated Electrode with ID {nwbfile_elect_id}.")
+                    else:
+                        new_keys.append(key)
+                        print(f"Inserted Electrode with ID {nwbfile_elect_id}.")
                 else:
-                    cls.insert1(
-                        key, skip_duplicates=True, allow_direct_insert=True
+                    warnings.warn(
+                        f"Electrode ID {nwbfile_elect_id} exists in the NWB file but has no corresponding "
+                        "config YAML entry."
                     )
-                    print(f"Inserted Electrode with ID {nwbfile_elect_id}.")
-            else:
-                warnings.warn(
-                    f"Electrode ID {nwbfile_elect_id} exists in the NWB file but has no corresponding "
-                    "config YAML entry."
-                )
+            cls.insert(new_keys, skip_duplicates=True, allow_direct_insert=True)
 
 
 @schema
@@ -235,57 +250,61 @@ class Raw(SpyglassMixin, dj.Imported):
     def make(self, key):
         nwb_file_name = key["nwb_file_name"]
         nwb_file_abspath = Nwbfile.get_abs_path(nwb_file_name)
-        nwbf = get_nwb_file(nwb_file_abspath)
-        raw_interval_name = "raw data valid times"
-        # get the acquisition object
-        try:
-            # TODO this assumes there is a single item in NWBFile.acquisition
-            rawdata = nwbf.get_acquisition()
-            assert isinstance(rawdata, pynwb.ecephys.ElectricalSeries)
-        except (ValueError, AssertionError):
-            warnings.warn(
-                f"Unable to get acquisition object in: {nwb_file_abspath}\n\t"
-                + f"Skipping entry in {self.full_table_name}"
-            )
-            return
-        if rawdata.rate is not None:
-            sampling_rate = rawdata.rate
-        else:
-            print("Estimating sampling rate...")
-            # NOTE: Only use first 1e6 timepoints to save time
-            sampling_rate = estimate_sampling_rate(
-                np.asarray(rawdata.timestamps[: int(1e6)]), 1.5, verbose=True
-            )
-        key["sampling_rate"] = sampling_rate
-
-        interval_dict = dict()
-        interval_dict["nwb_file_name"] = key["nwb_file_name"]
-        interval_dict["interval_list_name"] = raw_interval_name
-        if rawdata.rate is not None:
-            interval_dict["valid_times"] = np.array(
-                [[0, len(rawdata.data) / rawdata.rate]]
+        with open_nwb_file(nwb_file_abspath) as nwbf:
+            raw_interval_name = "raw data valid times"
+            # get the acquisition object
+            try:
+                # TODO this assumes there is a single item in NWBFile.acquisition
+                rawdata = nwbf.get_acquisition()
+                assert isinstance(rawdata, pynwb.ecephys.ElectricalSeries)
+            except (ValueError, AssertionError):
+                warnings.warn(
+                    f"Unable to get acquisition object in: {nwb_file_abspath}\n\t"
+                    + f"Skipping entry in {self.full_table_name}"
+                )
+                return
+            if rawdata.rate is not None:
+                sampling_rate = rawdata.rate
+            else:
+                print("Estimating sampling rate...")
+                # NOTE: Only use first 1e6 timepoints to save time
+                sampling_rate = estimate_sampling_rate(
+                    np.asarray(rawdata.timestamps[: int(1e6)]),
+                    1.5,
+                    verbose=True,
+                )
+            key["sampling_rate"] = sampling_rate
+
+            interval_dict = dict()
+            interval_dict["nwb_file_name"] = key["nwb_file_name"]
+            interval_dict["interval_list_name"] = raw_interval_name
+            if rawdata.rate is not None:
+                interval_dict["valid_times"] = np.array(
+                    [[0, len(rawdata.data) / rawdata.rate]]
+                )
+            else:
+                # get the list of valid times given the specified sampling rate.
+                interval_dict["valid_times"] = get_valid_intervals(
+                    timestamps=np.asarray(rawdata.timestamps),
+                    sampling_rate=key["sampling_rate"],
+                    gap_proportion=1.75,
+                    min_valid_len=0,
+                )
+            IntervalList().insert1(interval_dict, skip_duplicates=True)
+
+            # now insert each of the electrodes as an individual row, but with the same nwb_object_id
+            key["raw_object_id"] = rawdata.object_id
+            key["sampling_rate"] = sampling_rate
+            print(
+                f'Importing raw data: Sampling rate:\t{key["sampling_rate"]} Hz'
             )
-        else:
-            # get the list of valid times given the specified sampling rate.
-            interval_dict["valid_times"] = get_valid_intervals(
-                timestamps=np.asarray(rawdata.timestamps),
-                sampling_rate=key["sampling_rate"],
-                gap_proportion=1.75,
-                min_valid_len=0,
+            print(
+                f'Number of valid intervals:\t{len(interval_dict["valid_times"])}'
             )
-        IntervalList().insert1(interval_dict, skip_duplicates=True)
-
-        # now insert each of the electrodes as an individual row, but with the same nwb_object_id
-        key["raw_object_id"] = rawdata.object_id
-        key["sampling_rate"] = sampling_rate
-        print(f'Importing raw data: Sampling rate:\t{key["sampling_rate"]} Hz')
-        print(
-            f'Number of valid intervals:\t{len(interval_dict["valid_times"])}'
-        )
-        key["interval_list_name"] = raw_interval_name
-        key["comments"] = rawdata.comments
-        key["description"] = rawdata.description
-        self.insert1(key, skip_duplicates=True)
+            key["interval_list_name"] = raw_interval_name
+            key["comments"] = rawdata.comments
+            key["description"] = rawdata.description
+            self.insert1(key, skip_duplicates=True)
 
     def nwb_object(self, key):
         # TODO return the nwb_object; FIX: this should be replaced with a fetch call. Note that we're using the raw file
@@ -313,17 +332,17 @@ class SampleCount(SpyglassMixin, dj.Imported):
     def make(self, key):
         nwb_file_name = key["nwb_file_name"]
         nwb_file_abspath = Nwbfile.get_abs_path(nwb_file_name)
-        nwbf = get_nwb_file(nwb_file_abspath)
-        # get the sample count object
-        # TODO: change name when nwb file is changed
-        sample_count = get_data_interface(nwbf, "sample_count")
-        if sample_count is None:
-            print(
-                f'Unable to import SampleCount: no data interface named "sample_count" found in {nwb_file_name}.'
-            )
-            return
-        key["sample_count_object_id"] = sample_count.object_id
-        self.insert1(key)
+        with open_nwb_file(nwb_file_abspath) as nwbf:
+            # get the sample count object
+            # TODO: change name when nwb file is changed
+            sample_count = get_data_interface(nwbf, "sample_count")
+            if sample_count is None:
+                print(
+                    f'Unable to import SampleCount: no data interface named "sample_count" found in {nwb_file_name}.'
+                )
+                return
+            key["sample_count_object_id"] = sample_count.object_id
+            self.insert1(key)
 
 
 @schema
@@ -363,15 +382,14 @@ class LFPSelection(dj.Manual):
                 Electrode() & {"nwb_file_name": nwb_file_name}
             ).fetch(as_dict=True)
             primary_key = Electrode.primary_key
-            for e in all_electrodes:
-                # create a dictionary so we can insert new elects
-                if e["electrode_id"] in electrode_list:
-                    lfpelectdict = {
-                        k: v for k, v in e.items() if k in primary_key
-                    }
-                    LFPSelection().LFPElectrode.insert1(
-                        lfpelectdict, replace=True
-                    )
+            LFPSelection().LFPElectrode.insert(
+                [
+                    {k: v for k, v in e.items() if k in primary_key}
+                    for e in all_electrodes
+                    if e["electrode_id"] in electrode_list
+                ],
+                replace=True,
+            )
 
 
 @schema
@@ -437,7 +455,9 @@ class LFP(SpyglassMixin, dj.Imported):
         electrode_id_list = list(k["electrode_id"] for k in electrode_keys)
         electrode_id_list.sort()
 
-        lfp_file_name = AnalysisNwbfile().create(key["nwb_file_name"])
+        lfp_file_name = AnalysisNwbfile().create(
+            key["nwb_file_name"], minimal=True
+        )
 
         lfp_file_abspath = AnalysisNwbfile().get_abs_path(lfp_file_name)
         (
@@ -744,7 +764,9 @@ class LFPBand(SpyglassMixin, dj.Computed):
             return None
 
         # create the analysis nwb file to store the results.
-        lfp_band_file_name = AnalysisNwbfile().create(key["nwb_file_name"])
+        lfp_band_file_name = AnalysisNwbfile().create(
+            key["nwb_file_name"], minimal=True
+        )
         lfp_band_file_abspath = AnalysisNwbfile().get_abs_path(
             lfp_band_file_name
         )
@@ -766,7 +788,7 @@ class LFPBand(SpyglassMixin, dj.Computed):
             # get the indices of the electrodes in the electrode table of the file to get the right values
             elect_index = get_electrode_indices(nwbf, lfp_band_elect_id)
             electrode_table_region = nwbf.create_electrode_table_region(
-                elect_index, "filtered electrode table"
+                np.asarray(elect_index).tolist(), "filtered electrode table"
             )
             eseries_name = "filtered data"
             # TODO: use datatype of data
@@ -841,3 +863,66 @@ class ElectrodeBrainRegion(dj.Manual):
     ---
     -> BrainRegion
     """
+
+
+class _RegionIdCache(dict):
+    """BrainRegion.fetch_add region IDs, keyed by region name."""
+
+    def __missing__(self, region_name):
+        self[region_name] = BrainRegion.fetch_add(region_name=region_name)
+        return self[region_name]
+
+
+class _ProbeElectrodeCache:
+    """Whether `Probe.Electrode & restriction` is not empty, for restrictions
+    from the config YAML.
+
+    Restrictions on the primary key of Probe.Electrode, as in the config YAML,
+    are looked up in the electrodes of their probes, fetched in one query.
+    Others are queried once each.
+
+    Parameters
+    ----------
+    restrictions : iterable of dict
+        Restrictions that will be looked up, used to prefetch the probes.
+    """
+
+    def __init__(self, restrictions):
+        probe_electrode = Probe.Electrode()
+        self._primary_key = probe_electrode.primary_key
+        self._attributes = set(probe_electrode.heading.names)
+        self._queried = dict()
+
+        probe_ids = {
+            restriction["probe_id"]
+            for restriction in restrictions
+            if "probe_id" in restriction
+        }
+        self._existing = set()
+        if probe_ids:
+            self._existing = {
+                self._as_key(probe_key)
+                for probe_key in (
+                    probe_electrode
+                    & [{"probe_id": probe_id} for probe_id in probe_ids]
+                ).fetch("KEY")
+            }
+
+    def _as_key(self, restriction):
+        return tuple(str(restriction[name]) for name in self._primary_key)
+
+    def __call__(self, restriction):
+        restriction = {
+            name: value
+            for name, value in restriction.items()
+            if name in self._attributes
+        }
+        if set(restriction) == set(self._primary_key) and not any(
+            isinstance(value, float) for value in restriction.values()
+        ):
+            return self._as_key(restriction) in self._existing
+
+        cache_key = tuple(sorted((k, str(v)) for k, v in restriction.items()))
+        if cache_key not in self._queried:
+            self._queried[cache_key] = bool(Probe.Electrode & restriction)
+        return self._queried[cache_key]
@@ -1,13 +1,17 @@
 # code to define filters that can be applied to continuous time data
+import itertools
+import os
 import warnings
-from typing import Union
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import NamedTuple, Union
 
 import datajoint as dj
+import h5py
 import matplotlib.pyplot as plt
 import numpy as np
-import psutil
 import pynwb
 import scipy.signal as signal
+from hdmf.backends.hdf5 import H5DataIO
 
 from ..utils.nwb_helper_fn import get_electrode_indices
 
@@ -226,11 +230,22 @@ class FirFilterParameters(dj.Manual):
         decimation: int,
         description: str = "filtered data",
         data_type: Union[None, str] = None,
+        n_jobs: int = 1,
+        chunk_samples: int = 1_000_000,
+        electrodes_per_chunk: int = 32,
+        reference_ids: Union[None, list] = None,
     ):
         """
         Filter data from an NWB electrical series using the ghostipy package,
         and save the result as a new electrical series in the analysis NWB file.
 
+        The valid intervals are split into chunks of at most `chunk_samples`
+        input samples and `electrodes_per_chunk` electrodes. Each chunk is
+        read from the source file and filtered in a pool of `n_jobs` worker
+        processes, and the result is written into the output electrical
+        series, which is preallocated on disk. Peak memory therefore depends
+        on the chunk size and number of workers, not on interval length.
+
         Parameters
         ----------
         analysis_file_abs_path : str
@@ -249,6 +264,19 @@ class FirFilterParameters(dj.Manual):
             Description of the filtered data.
         data_type : Union[None, str]
             Type of data (e.g., "LFP").
+        n_jobs : int, optional
+            Number of worker processes. Default 1 filters the chunks in this
+            process, as does any value if the data is not stored in an HDF5
+            file. Callers that are not already running in parallel, e.g.
+            inside a populate with multiple processes, can raise it.
+        chunk_samples : int, optional
+            Maximum number of input samples per chunk. Default 1,000,000.
+        electrodes_per_chunk : int, optional
+            Maximum number of electrodes per chunk. Default 32.
+        reference_ids : Union[None, list], optional
+            Reference electrode ID for each of electrode_ids, or -1 for no
+            reference. The references are read with each chunk and subtracted
+            before filtering. Default None, no referencing.
 
         Returns
         -------
@@ -260,10 +288,6 @@ class FirFilterParameters(dj.Manual):
         # All existing refs to this func use positional args, so no need to
         # adjust elsewhere, but low probability of issues with custom scripts
 
-        MEM_USE_LIMIT = 0.9  # % of RAM use permitted
-
-        gsp = _import_ghostipy()
-
         data_on_disk = eseries.data
         timestamps_on_disk = eseries.timestamps
 
@@ -271,42 +295,39 @@ class FirFilterParameters(dj.Manual):
         time_axis = 0 if data_on_disk.shape[0] == n_samples else 1
         electrode_axis = 1 - time_axis
 
-        n_electrodes = data_on_disk.shape[electrode_axis]
-        input_dim_restrictions = [None] * len(data_on_disk.shape)
-
-        # Get input dimension restrictions
-        input_dim_restrictions[electrode_axis] = np.s_[
+        electrode_inds = np.asarray(
             get_electrode_indices(eseries, electrode_ids)
-        ]
-
-        indices = []
-        output_shape_list = [0] * len(data_on_disk.shape)
-        output_shape_list[electrode_axis] = len(electrode_ids)
-        data_dtype = data_on_disk[0][0].dtype
+        )
+        reference_inds = None
+        if reference_ids is not None:
+            reference_ids = np.asarray(reference_ids)
+            reference_inds = np.full(len(reference_ids), -1)
+            is_referenced = reference_ids != -1
+            reference_inds[is_referenced] = get_electrode_indices(
+                eseries, reference_ids[is_referenced]
+            )
+        data_dtype = data_on_disk.dtype
 
         filter_delay = self.calc_filter_delay(filter_coeff)
 
-        output_offsets = [0]
-
-        for a_start, a_stop in valid_times:
-            frm, to = self._time_bound_check(
+        indices = [
+            self._time_bound_check(
                 a_start, a_stop, timestamps_on_disk, n_samples
             )
+            for a_start, a_stop in valid_times
+        ]
+        chunks, n_output_samples = _plan_filter_chunks(
+            indices,
+            n_samples=n_samples,
+            n_taps=len(filter_coeff),
+            filter_delay=filter_delay,
+            decimation=decimation,
+            chunk_samples=chunk_samples,
+        )
 
-            indices.append((frm, to))
-
-            shape, _ = gsp.filter_data_fir(
-                data_on_disk,
-                filter_coeff,
-                axis=time_axis,
-                input_index_bounds=[frm, to - 1],
-                output_index_bounds=[filter_delay, filter_delay + to - frm],
-                describe_dims=True,
-                ds=decimation,
-                input_dim_restrictions=input_dim_restrictions,
-            )
-            output_offsets.append(output_offsets[-1] + shape[time_axis])
-            output_shape_list[time_axis] += shape[time_axis]
+        output_shape_list = [0] * len(data_on_disk.shape)
+        output_shape_list[electrode_axis] = len(electrode_ids)
+        output_shape_list[time_axis] = n_output_samples
 
         # Create dynamic table region and electrode series, write/close file
         with pynwb.NWBHDF5IO(
@@ -317,14 +338,19 @@ class FirFilterParameters(dj.Manual):
             # get the indices of the electrodes in the electrode table
             elect_ind = get_electrode_indices(nwbf, electrode_ids)
 
+            # create_electrode_table_region takes a list, not an array
             electrode_table_region = nwbf.create_electrode_table_region(
-                elect_ind, "filtered electrode table"
+                np.asarray(elect_ind).tolist(), "filtered electrode table"
             )
+            # allocate the datasets on disk without holding them in memory
             es = pynwb.ecephys.ElectricalSeries(
                 name="filtered data",
-                data=np.empty(tuple(output_shape_list), dtype=data_dtype),
+                data=H5DataIO(shape=tuple(output_shape_list), dtype=data_dtype),
                 electrodes=electrode_table_region,
-                timestamps=np.empty(output_shape_list[time_axis]),
+                timestamps=H5DataIO(
+                    shape=(n_output_samples,),
+                    dtype=timestamps_on_disk.dtype,
+                ),
                 description=description,
             )
             if data_type == "LFP":
@@ -346,65 +372,45 @@ class FirFilterParameters(dj.Manual):
             es = nwbf.objects[es.object_id]
             filtered_data = es.data
             new_timestamps = es.timestamps
-            indices = np.array(indices, ndmin=2)
-            # Filter and write the output dataset
-            ts_offset = 0
-
-            print("Filtering data")
-            for ii, (start, stop) in enumerate(indices):
-                # Calc size of timestamps + data, check if < 90% of RAM
-                interval_samples = stop - start
-                req_mem = interval_samples * (
-                    timestamps_on_disk[0].itemsize
-                    + n_electrodes * data_on_disk[0][0].itemsize
-                )
-                if req_mem < MEM_USE_LIMIT * psutil.virtual_memory().available:
-                    print(f"Interval {ii}: loading data into memory")
-                    timestamps = np.asarray(
-                        timestamps_on_disk[start:stop],
-                        dtype=timestamps_on_disk[0].dtype,
-                    )
-                    if time_axis == 0:
-                        data = np.asarray(
-                            data_on_disk[start:stop, :], dtype=data_dtype
-                        )
-                    else:
-                        data = np.asarray(
-                            data_on_disk[:, start:stop], dtype=data_dtype
-                        )
-                    extracted_ts = timestamps[0::decimation]
-                    new_timestamps[
-                        ts_offset : ts_offset + len(extracted_ts)
-                    ] = extracted_ts
-                    ts_offset += len(extracted_ts)
-                    input_index_bounds = [0, interval_samples - 1]
-
-                else:
-                    print(f"Interval {ii}: leaving data on disk")
-                    data = data_on_disk
-                    timestamps = timestamps_on_disk
-                    extracted_ts = timestamps[start:stop:decimation]
-                    new_timestamps[
-                        ts_offset : ts_offset + len(extracted_ts)
-                    ] = extracted_ts
-                    ts_offset += len(extracted_ts)
-                    input_index_bounds = [start, stop]
-
-                # filter the data
-                gsp.filter_data_fir(
-                    data,
-                    filter_coeff,
-                    axis=time_axis,
-                    input_index_bounds=input_index_bounds,
-                    output_index_bounds=[
-                        filter_delay,
-                        filter_delay + stop - start,
-                    ],
-                    ds=decimation,
-                    input_dim_restrictions=input_dim_restrictions,
-                    outarray=filtered_data,
-                    output_offset=output_offsets[ii],
+
+            for chunk in chunks:
+                new_timestamps[
+                    chunk.output_start : chunk.output_stop
+                ] = timestamps_on_disk[
+                    chunk.sample_start : chunk.sample_stop : decimation
+                ]
+
+            electrode_blocks = [
+                np.s_[block_start : block_start + electrodes_per_chunk]
+                for block_start in range(
+                    0, len(electrode_inds), electrodes_per_chunk
                 )
+            ]
+            tasks = [
+                (chunk, block) for chunk in chunks for block in electrode_blocks
+            ]
+
+            print(
+                f"Filtering data: {len(chunks)} chunks x "
+                + f"{len(electrode_blocks)} electrode blocks"
+            )
+            for (chunk, block), filtered in _run_filter_tasks(
+                tasks,
+                data_on_disk,
+                filter_coeff=filter_coeff,
+                filter_delay=filter_delay,
+                electrode_inds=electrode_inds,
+                reference_inds=reference_inds,
+                time_axis=time_axis,
+                decimation=decimation,
+                n_jobs=n_jobs,
+            ):
+                output_slices = [None, None]
+                output_slices[time_axis] = np.s_[
+                    chunk.output_start : chunk.output_stop
+                ]
+                output_slices[electrode_axis] = block
+                filtered_data[tuple(output_slices)] = filtered
 
             start_end = [new_timestamps[0], new_timestamps[-1]]
 
@@ -544,3 +550,187 @@ class FirFilterParameters(dj.Manual):
             [400, 425],
             "standard LFP filter for 30 KHz data",
         )
+
+
+class _FilterChunk(NamedTuple):
+    """A block of consecutive output samples of one filtered interval.
+
+    `sample_start`/`sample_stop` are the input samples represented by the
+    output samples `output_start`/`output_stop`; `read_start`/`read_stop` are
+    the input samples needed to compute them, i.e. widened by the filter
+    length. As when filtering a whole interval with ghostipy, samples outside
+    the interval are read and only the ends of the data are zero-padded.
+    """
+
+    sample_start: int
+    sample_stop: int
+    read_start: int
+    read_stop: int
+    output_start: int
+    output_stop: int
+
+
+def _plan_filter_chunks(
+    indices, n_samples, n_taps, filter_delay, decimation, chunk_samples
+):
+    """Split intervals of input sample indices into chunks for filtering.
+
+    Parameters
+    ----------
+    indices : list of tuple
+        (start, stop) input sample indices of each interval, stop exclusive.
+    n_samples : int
+        Number of samples in the data.
+    n_taps : int
+        Number of filter coefficients.
+    filter_delay : int
+        Delay of the filter, in samples.
+    decimation : int
+        Decimation factor.
+    chunk_samples : int
+        Maximum number of input samples per chunk. Rounded down to a multiple
+        of the decimation factor.
+
+    Returns
+    -------
+    chunks : list of _FilterChunk
+    n_output_samples : int
+        Total number of output samples across all intervals.
+    """
+    chunk_samples = max(decimation, chunk_samples // decimation * decimation)
+
+    chunks = []
+    output_offset = 0
+    for interval_start, interval_stop in indices:
+        n_interval_samples = interval_stop - interval_start
+        for offset in range(0, n_interval_samples, chunk_samples):
+            stop = min(offset + chunk_samples, n_interval_samples)
+            n_out = -(-(stop - offset) // decimation)  # ceil division
+            sample_start = interval_start + offset
+            last_sample = sample_start + (n_out - 1) * decimation
+            chunks.append(
+                _FilterChunk(
+                    sample_start=sample_start,
+                    sample_stop=interval_start + stop,
+                    read_start=max(0, sample_start + filter_delay - n_taps + 1),
+                    read_stop=min(n_samples, last_sample + filter_delay + 1),
+                    output_start=output_offset,
+                    output_stop=output_offset + n_out,
+                )
+            )
+            output_offset += n_out
+
+    return chunks, output_offset
+
+
+def _run_filter_tasks(tasks, data, n_jobs=1, **filter_kwargs):
+    """Filter (chunk, electrode block) tasks, yielding (task, result).
+
+    Results are yielded in completion order. At most two tasks per worker are
+    in flight, so finished chunks do not pile up in memory while the caller
+    writes them out.
+    """
+    n_jobs = min(n_jobs, len(tasks))
+    if n_jobs <= 1 or not isinstance(data, h5py.Dataset):
+        for task in tasks:
+            yield task, _filter_chunk(
+                task, data, threads=os.cpu_count(), **filter_kwargs
+            )
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=n_jobs,
+        initializer=_init_filter_worker,
+        initargs=(data.file.filename, data.name, filter_kwargs),
+    ) as executor:
+        tasks = iter(tasks)
+        pending = {
+            executor.submit(_filter_chunk_worker, task)
+            for task in itertools.islice(tasks, 2 * n_jobs)
+        }
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+            pending |= {
+                executor.submit(_filter_chunk_worker, task)
+                for task in itertools.islice(tasks, len(done))
+            }
+
+
+_filter_worker_ctx = {}
+
+
+def _init_filter_worker(file_path, dataset_name, filter_kwargs):
+    """Open the source dataset once per worker process."""
+    _filter_worker_ctx["data"] = h5py.File(file_path, "r")[dataset_name]
+    _filter_worker_ctx.update(filter_kwargs)
+
+
+def _filter_chunk_worker(task):
+    return task, _filter_chunk(task, **_filter_worker_ctx)
+
+
+def _filter_chunk(
+    task,
+    data,
+    filter_coeff,
+    filter_delay,
+    electrode_inds,
+    time_axis,
+    decimation,
+    reference_inds=None,
+    threads=1,
+):
+    """Read and filter one chunk of one electrode block.
+
+    If reference_inds is given, the reference of each electrode (-1 for none)
+    is read with the chunk and subtracted in the data type of the source.
+
+    Returns the filtered, decimated samples for that chunk as float64.
+    """
+    gsp = _import_ghostipy()
+    chunk, block = task
+    electrode_axis = 1 - time_axis
+
+    block_inds = electrode_inds[block]
+    if reference_inds is None:
+        is_referenced = np.zeros(len(block_inds), dtype=bool)
+    else:
+        is_referenced = reference_inds[block] != -1
+        block_inds = np.concatenate(
+            (block_inds, reference_inds[block][is_referenced])
+        )
+
+    # h5py fancy indexing requires increasing indices
+    read_inds, reorder = np.unique(block_inds, return_inverse=True)
+    input_slices = [None, None]
+    input_slices[time_axis] = np.s_[chunk.read_start : chunk.read_stop]
+    input_slices[electrode_axis] = read_inds
+    read_samples = np.asarray(data[tuple(input_slices)])
+    n_electrodes = len(is_referenced)
+    samples = np.take(read_samples, reorder[:n_electrodes], axis=electrode_axis)
+    if np.any(is_referenced):
+        referenced = [slice(None), slice(None)]
+        referenced[electrode_axis] = is_referenced
+        samples[tuple(referenced)] -= np.take(
+            read_samples, reorder[n_electrodes:], axis=electrode_axis
+        )
+
+    # output index n of the full convolution depends on input samples
+    # n - n_taps + 1 ... n, so these bounds select the chunk's samples
+    n_chunk_samples = chunk.sample_stop - chunk.sample_start
+    first_output = chunk.sample_start - chunk.read_start + filter_delay
+    last_output = (
+        first_output
+        + n_chunk_samples
+        - (n_chunk_samples - 1) % decimation  # last decimated sample
+    )
+    return gsp.filter_data_fir(
+        samples,
+        filter_coeff,
+        axis=time_axis,
+        output_index_bounds=[first_output, last_output],
+        ds=decimation,
+        threads=threads,
+    )
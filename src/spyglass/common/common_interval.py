@@ -1,4 +1,3 @@
-import itertools
 from functools import reduce
 
 import datajoint as dj
@@ -165,22 +164,27 @@ def intervals_by_length(interval_list, min_length=0.0, max_length=1e10):
 def interval_list_contains_ind(interval_list, timestamps):
     """Find indices of list of timestamps contained in an interval list.
 
+    Indices are grouped by interval, in the order the intervals are given, so
+    a timestamp contained in two overlapping intervals is returned twice.
+
     Parameters
     ----------
     interval_list : array_like
         Each element is (start time, stop time), i.e. an interval in seconds.
     timestamps : array_like
     """
-    ind = []
-    for interval in interval_list:
-        ind += np.ravel(
-            np.argwhere(
-                np.logical_and(
-                    timestamps >= interval[0], timestamps <= interval[1]
-                )
-            )
-        ).tolist()
-    return np.asarray(ind)
+    timestamps = np.asarray(timestamps)
+    if timestamps.ndim != 1 or not _is_sorted(timestamps):
+        return _interval_list_contains_ind_loop(interval_list, timestamps)
+
+    interval_list = np.asarray(interval_list).reshape(-1, 2)
+    starts, stops = interval_list[:, 0], interval_list[:, 1]
+    first = np.searchsorted(timestamps, starts, side="left")
+    last = np.searchsorted(timestamps, stops, side="right")
+    # intervals with start > stop (or nan bounds) contain nothing
+    counts = np.where(starts <= stops, last - first, 0).clip(min=0)
+
+    return _concatenate_ranges(first, counts)
 
 
 def interval_list_contains(interval_list, timestamps):
@@ -192,16 +196,8 @@ def interval_list_contains(interval_list, timestamps):
         Each element is (start time, stop time), i.e. an interval in seconds.
     timestamps : array_like
     """
-    ind = []
-    for interval in interval_list:
-        ind += np.ravel(
-            np.argwhere(
-                np.logical_and(
-                    timestamps >= interval[0], timestamps <= interval[1]
-                )
-            )
-        ).tolist()
-    return timestamps[ind]
+    timestamps = np.asarray(timestamps)
+    return timestamps[interval_list_contains_ind(interval_list, timestamps)]
 
 
 def interval_list_excludes_ind(interval_list, timestamps):
@@ -232,16 +228,42 @@ def interval_list_excludes(interval_list, timestamps):
 
 
 def consolidate_intervals(interval_list):
+    """Sort an interval list by start time and union overlapping intervals.
+
+    Intervals that only touch (stop of one equals start of the next) are not
+    merged.
+
+    Parameters
+    ----------
+    interval_list : np.array, (N,2) or (2,)
+        Each element is (start time, stop time).
+
+    Returns
+    -------
+    interval_list : np.array, (M,2)
+    """
     if interval_list.ndim == 1:
-        interval_list = np.expand_dims(interval_list, 0)
-    else:
-        interval_list = interval_list[np.argsort(interval_list[:, 0])]
-        interval_list = reduce(_union_concat, interval_list)
-        # the following check is needed in the case where the interval list is a
-        # single element (behavior of reduce)
-        if interval_list.ndim == 1:
-            interval_list = np.expand_dims(interval_list, 0)
-    return interval_list
+        return np.expand_dims(interval_list, 0)
+
+    # Zero-length, reversed and nan intervals never overlap anything, which
+    # the sequential union handles in an order-dependent way. Keep it for them.
+    if len(interval_list) == 0 or not np.all(
+        interval_list[:, 1] > interval_list[:, 0]
+    ):
+        return _consolidate_intervals_reduce(interval_list)
+
+    interval_list = interval_list[np.argsort(interval_list[:, 0])]
+    starts, stops = interval_list[:, 0], interval_list[:, 1]
+
+    # Sweep: an interval opens a new group unless it starts before the
+    # furthest stop seen so far.
+    running_stop = np.maximum.accumulate(stops)
+    new_group = np.ones(len(interval_list), dtype=bool)
+    new_group[1:] = starts[1:] >= running_stop[:-1]
+    group_first = np.flatnonzero(new_group)
+    group_last = np.append(group_first[1:], len(interval_list)) - 1
+
+    return np.stack((starts[group_first], running_stop[group_last]), axis=1)
 
 
 def interval_list_intersect(interval_list1, interval_list2, min_length=0):
@@ -265,23 +287,142 @@ def interval_list_intersect(interval_list1, interval_list2, min_length=0):
     interval_list1 = consolidate_intervals(interval_list1)
     interval_list2 = consolidate_intervals(interval_list2)
 
-    # then do pairwise comparison and collect intersections
+    if not (_is_disjoint(interval_list1) and _is_disjoint(interval_list2)):
+        intersecting_intervals = _pairwise_intersections(
+            interval_list1, interval_list2
+        )
+    else:
+        intersecting_intervals = _sweep_intersections(
+            interval_list1, interval_list2
+        )
+
+    # if no intersection, then return an empty list
+    if len(intersecting_intervals) == 0:
+        return []
+
+    intersecting_intervals = intersecting_intervals[
+        np.argsort(intersecting_intervals[:, 0])
+    ]
+
+    return intervals_by_length(intersecting_intervals, min_length=min_length)
+
+
+def _is_sorted(values):
+    """True if a 1D array is non-decreasing (and therefore has no nans)."""
+    return bool(np.all(values[1:] >= values[:-1]))
+
+
+def _is_disjoint(interval_list):
+    """True if a consolidated interval list has positive-length intervals,
+    each ending no later than the next begins."""
+    starts, stops = interval_list[:, 0], interval_list[:, 1]
+    return bool(np.all(stops > starts) and np.all(starts[1:] >= stops[:-1]))
+
+
+def _concatenate_ranges(first, counts):
+    """Concatenate `np.arange(f, f + c)` for each pair in (first, counts)."""
+    total = int(counts.sum())
+    if total == 0:
+        return np.array([], dtype=np.intp)
+    # offset of each output element from the start of its own range
+    range_offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(first, counts) + (np.arange(total) - range_offsets)
+
+
+def _sweep_intersections(interval_list1, interval_list2):
+    """Intersections of two disjoint, sorted interval lists.
+
+    Pairs are emitted in the same order as `_pairwise_intersections`: for each
+    interval of the second list, every overlapping interval of the first.
+    Runs in O((N+M) log(N+M) + K) for K overlapping pairs.
+    """
+    starts1, stops1 = interval_list1[:, 0], interval_list1[:, 1]
+    starts2, stops2 = interval_list2[:, 0], interval_list2[:, 1]
+
+    # for each interval in list 2, the overlapping slice of list 1 is
+    # [first interval stopping after its start, first starting at its stop)
+    first = np.searchsorted(stops1, starts2, side="right")
+    last = np.searchsorted(starts1, stops2, side="left")
+    counts = (last - first).clip(min=0)
+
+    ind1 = _concatenate_ranges(first, counts)
+    ind2 = np.repeat(np.arange(len(interval_list2)), counts)
+
+    intersections = np.stack(
+        (
+            np.maximum(starts2[ind2], starts1[ind1]),
+            np.minimum(stops2[ind2], stops1[ind1]),
+        ),
+        axis=1,
+    )
+    return intersections[intersections[:, 1] > intersections[:, 0]]
+
+
+def _pairwise_intersections(interval_list1, interval_list2):
+    """Intersections of every pair of intervals from two interval lists."""
     intersecting_intervals = [
-        _intersection(interval2, interval1)
+        intersection
         for interval2 in interval_list2
         for interval1 in interval_list1
-        if _intersection(interval2, interval1) is not None
+        if (intersection := _intersection(interval2, interval1)) is not None
     ]
+    return np.asarray(intersecting_intervals)
 
-    # if no intersection, then return an empty list
-    if not intersecting_intervals:
+
+def _interval_list_contains_ind_loop(interval_list, timestamps):
+    """Reference implementation of `interval_list_contains_ind`.
+
+    Used for timestamps that are not sorted.
+    """
+    ind = []
+    for interval in interval_list:
+        ind += np.ravel(
+            np.argwhere(
+                np.logical_and(
+                    timestamps >= interval[0], timestamps <= interval[1]
+                )
+            )
+        ).tolist()
+    return np.asarray(ind, dtype=np.intp)
+
+
+def _consolidate_intervals_reduce(interval_list):
+    """Reference implementation of `consolidate_intervals`.
+
+    Sequentially unions each interval of the start-sorted list with the last
+    one kept. Used for lists with zero-length, reversed or nan intervals.
+    """
+    if interval_list.ndim == 1:
+        interval_list = np.expand_dims(interval_list, 0)
+    else:
+        interval_list = interval_list[np.argsort(interval_list[:, 0])]
+        interval_list = reduce(_union_concat, interval_list)
+        # the following check is needed in the case where the interval list is a
+        # single element (behavior of reduce)
+        if interval_list.ndim == 1:
+            interval_list = np.expand_dims(interval_list, 0)
+    return interval_list
+
+
+def _interval_list_intersect_pairwise(
+    interval_list1, interval_list2, min_length=0
+):
+    """Reference implementation of `interval_list_intersect`.
+
+    Compares every pair of intervals, O(N*M).
+    """
+    interval_list1 = _consolidate_intervals_reduce(interval_list1)
+    interval_list2 = _consolidate_intervals_reduce(interval_list2)
+
+    intersecting_intervals = _pairwise_intersections(
+        interval_list1, interval_list2
+    )
+    if len(intersecting_intervals) == 0:
         return []
 
-    intersecting_intervals = np.asarray(intersecting_intervals)
     intersecting_intervals = intersecting_intervals[
         np.argsort(intersecting_intervals[:, 0])
     ]
-
     return intervals_by_length(intersecting_intervals, min_length=min_length)
 
 
@@ -441,13 +582,18 @@ def interval_from_inds(list_frames):
     list_frames : array_like of int
     """
     list_frames = np.unique(list_frames)
-    interval_list = []
-    for key, group in itertools.groupby(
-        enumerate(list_frames), lambda t: t[1] - t[0]
-    ):
-        group = list(group)
-        interval_list.append([group[0][1], group[-1][1]])
-    return np.asarray(interval_list)
+    if len(list_frames) == 0:
+        return np.asarray([])
+
+    # a new interval starts wherever consecutive frames are not adjacent
+    breaks = np.flatnonzero(np.diff(list_frames) != 1) + 1
+    return np.stack(
+        (
+            list_frames[np.insert(breaks, 0, 0)],
+            list_frames[np.append(breaks - 1, len(list_frames) - 1)],
+        ),
+        axis=1,
+    )
 
 
 def interval_set_difference_inds(intervals1, intervals2):
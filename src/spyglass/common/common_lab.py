@@ -1,7 +1,7 @@
 """Schema for institution, lab team/name/members. Session-independent."""
 import datajoint as dj
 
-from ..utils.nwb_helper_fn import get_nwb_file
+from ..utils.nwb_helper_fn import open_nwb_file
 from .common_nwbfile import Nwbfile
 
 schema = dj.schema("common_lab")
@@ -40,7 +40,9 @@ class LabMember(dj.Manual):
         """
         if isinstance(nwbf, str):
             nwb_file_abspath = Nwbfile.get_abs_path(nwbf, new_file=True)
-            nwbf = get_nwb_file(nwb_file_abspath)
+            with open_nwb_file(nwb_file_abspath) as nwbf:
+                cls.insert_from_nwbfile(nwbf)
+            return
 
         if nwbf.experimenter is None:
             print("No experimenter metadata found.\n")
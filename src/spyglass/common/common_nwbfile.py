@@ -13,7 +13,12 @@ from pathlib import Path
 
 from ..settings import raw_dir
 from ..utils.dj_helper_fn import get_child_tables
-from ..utils.nwb_helper_fn import get_electrode_indices, get_nwb_file
+from ..utils.nwb_helper_fn import (
+    export_pruned_nwb_file,
+    get_electrode_indices,
+    open_nwb_file,
+    write_minimal_nwb_file,
+)
 
 schema = dj.schema("common_nwbfile")
 
@@ -164,7 +169,7 @@ class AnalysisNwbfile(dj.Manual):
 
     # See #630, #664. Excessive key length.
 
-    def create(self, nwb_file_name):
+    def create(self, nwb_file_name, minimal=False):
         """Open the NWB file, create a copy, write the copy to disk and return the name of the new file.
 
         Note that this does NOT add the file to the schema; that needs to be done after data are written to it.
@@ -173,6 +178,14 @@ class AnalysisNwbfile(dj.Manual):
         ----------
         nwb_file_name : str
             The name of an NWB file to be copied.
+        minimal : bool, optional
+            If True, copy only the session metadata, subject, devices,
+            electrode groups and electrodes table of the NWB file, without
+            reading the rest of it. The copy then has no intervals (epochs,
+            trials, invalid times) and no units table. Use it when the
+            analysis file only stores new objects. If False (default), read
+            the whole file and export it, keeping the fields in
+            NWB_KEEP_FIELDS and any units table.
 
         Returns
         -------
@@ -180,30 +193,18 @@ class AnalysisNwbfile(dj.Manual):
             The name of the new NWB file.
         """
         nwb_file_abspath = Nwbfile.get_abs_path(nwb_file_name)
-        with pynwb.NWBHDF5IO(
-            path=nwb_file_abspath, mode="r", load_namespaces=True
-        ) as io:
-            nwbf = io.read()
-            # pop off the unnecessary elements to save space
-            nwb_fields = nwbf.fields
-            for field in nwb_fields:
-                if field not in NWB_KEEP_FIELDS:
-                    nwb_object = getattr(nwbf, field)
-                    if isinstance(nwb_object, pynwb.core.LabelledDict):
-                        for module in list(nwb_object.keys()):
-                            nwb_object.pop(module)
-
-            analysis_file_name = self.__get_new_file_name(nwb_file_name)
-            # write the new file
-            print(f"Writing new NWB file {analysis_file_name}")
-            analysis_file_abs_path = AnalysisNwbfile.get_abs_path(
-                analysis_file_name
+        analysis_file_name = self.__get_new_file_name(nwb_file_name)
+        # write the new file
+        print(f"Writing new NWB file {analysis_file_name}")
+        analysis_file_abs_path = AnalysisNwbfile.get_abs_path(
+            analysis_file_name
+        )
+        if minimal:
+            write_minimal_nwb_file(nwb_file_abspath, analysis_file_abs_path)
+        else:
+            export_pruned_nwb_file(
+                nwb_file_abspath, analysis_file_abs_path, NWB_KEEP_FIELDS
             )
-            # export the new NWB file
-            with pynwb.NWBHDF5IO(
-                path=analysis_file_abs_path, mode="w", manager=io.manager
-            ) as export_io:
-                export_io.export(io, nwbf)
 
         # change the permissions to only allow owner to write
         permissions = stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP | stat.S_IROTH
@@ -616,11 +617,12 @@ class AnalysisNwbfile(dj.Manual):
 
         Returns
         -------
-        electrode_indices : numpy array
-            Array of indices in the electrodes table for the given electrode IDs.
+        electrode_indices : numpy array or list
+            Indices in the electrodes table for the given electrode IDs, as an
+            array if electrode_ids is an array and as a list otherwise.
         """
-        nwbf = get_nwb_file(cls.get_abs_path(analysis_file_name))
-        return get_electrode_indices(nwbf.electrodes, electrode_ids)
+        with open_nwb_file(cls.get_abs_path(analysis_file_name)) as nwbf:
+            return get_electrode_indices(nwbf.electrodes, electrode_ids)
 
     @staticmethod
     def cleanup(delete_files=False):
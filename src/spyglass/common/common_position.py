@@ -86,7 +86,9 @@ class IntervalPositionInfo(SpyglassMixin, dj.Computed):
     def make(self, key):
         print(f"Computing position for: {key}")
 
-        analysis_file_name = AnalysisNwbfile().create(key["nwb_file_name"])
+        analysis_file_name = AnalysisNwbfile().create(
+            key["nwb_file_name"], minimal=True
+        )
 
         raw_position = RawPosition.PosObject & key
         spatial_series = raw_position.fetch_nwb()[0]["raw_position"]
@@ -607,7 +609,7 @@ class IntervalLinearizedPosition(SpyglassMixin, dj.Computed):
         print(f"Computing linear position for: {key}")
 
         key["analysis_file_name"] = AnalysisNwbfile().create(
-            key["nwb_file_name"]
+            key["nwb_file_name"], minimal=True
         )
 
         position_nwb = (
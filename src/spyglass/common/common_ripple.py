@@ -163,7 +163,7 @@ class RippleTimes(SpyglassMixin, dj.Computed):
         # Insert into analysis nwb file
         nwb_analysis_file = AnalysisNwbfile()
         key["analysis_file_name"] = nwb_analysis_file.create(
-            key["nwb_file_name"]
+            key["nwb_file_name"], minimal=True
         )
         key["ripple_times_object_id"] = nwb_analysis_file.add_nwb_object(
             analysis_file_name=key["analysis_file_name"],
@@ -4,7 +4,7 @@ import datajoint as dj
 import pynwb
 
 from ..utils.dj_mixin import SpyglassMixin
-from ..utils.nwb_helper_fn import get_data_interface, get_nwb_file
+from ..utils.nwb_helper_fn import get_data_interface, open_nwb_file
 from .common_ephys import Raw
 from .common_interval import IntervalList  # noqa: F401
 from .common_nwbfile import Nwbfile
@@ -27,18 +27,19 @@ class SensorData(SpyglassMixin, dj.Imported):
     def make(self, key):
         nwb_file_name = key["nwb_file_name"]
         nwb_file_abspath = Nwbfile().get_abs_path(nwb_file_name)
-        nwbf = get_nwb_file(nwb_file_abspath)
-
-        sensor = get_data_interface(
-            nwbf, "analog", pynwb.behavior.BehavioralEvents
-        )
-        if sensor is None:
-            print(f"No conforming sensor data found in {nwb_file_name}\n")
-            return
-
-        key["sensor_data_object_id"] = sensor.time_series["analog"].object_id
-        # the valid times for these data are the same as the valid times for the raw ephys data
-        key["interval_list_name"] = (
-            Raw & {"nwb_file_name": nwb_file_name}
-        ).fetch1("interval_list_name")
-        self.insert1(key)
+        with open_nwb_file(nwb_file_abspath) as nwbf:
+            sensor = get_data_interface(
+                nwbf, "analog", pynwb.behavior.BehavioralEvents
+            )
+            if sensor is None:
+                print(f"No conforming sensor data found in {nwb_file_name}\n")
+                return
+
+            key["sensor_data_object_id"] = sensor.time_series[
+                "analog"
+            ].object_id
+            # the valid times for these data are the same as the valid times for the raw ephys data
+            key["interval_list_name"] = (
+                Raw & {"nwb_file_name": nwb_file_name}
+            ).fetch1("interval_list_name")
+            self.insert1(key)
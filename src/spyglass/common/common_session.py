@@ -1,7 +1,7 @@
 import datajoint as dj
 
 from ..settings import config, debug_mode
-from ..utils.nwb_helper_fn import get_config, get_nwb_file
+from ..utils.nwb_helper_fn import get_config, open_nwb_file
 from .common_device import CameraDevice, DataAcquisitionDevice, Probe
 from .common_lab import Institution, Lab, LabMember
 from .common_nwbfile import Nwbfile
@@ -55,18 +55,70 @@ class Session(dj.Imported):
 
         nwb_file_name = key["nwb_file_name"]
         nwb_file_abspath = Nwbfile.get_abs_path(nwb_file_name)
-        nwbf = get_nwb_file(nwb_file_abspath)
-        config = get_config(nwb_file_abspath)
-
-        # certain data are not associated with a single NWB file / session because they may apply to
-        # multiple sessions. these data go into dj.Manual tables.
-        # e.g., a lab member may be associated with multiple experiments, so the lab member table should not
-        # be dependent on (contain a primary key for) a session.
-
-        # here, we create new entries in these dj.Manual tables based on the values read from the NWB file
-        # then, they are linked to the session via fields of Session (e.g., Subject, Institution, Lab) or part
-        # tables (e.g., Experimenter, DataAcquisitionDevice).
+        with open_nwb_file(nwb_file_abspath) as nwbf:
+            config = get_config(nwb_file_abspath)
+
+            # certain data are not associated with a single NWB file / session because they may apply to
+            # multiple sessions. these data go into dj.Manual tables.
+            # e.g., a lab member may be associated with multiple experiments, so the lab member table should not
+            # be dependent on (contain a primary key for) a session.
+
+            # here, we create new entries in these dj.Manual tables based on the values read from the NWB file
+            # then, they are linked to the session via fields of Session (e.g., Subject, Institution, Lab) or part
+            # tables (e.g., Experimenter, DataAcquisitionDevice).
+            self.insert_shared_from_nwbfile(nwbf, config)
+
+            if nwbf.subject is not None:
+                subject_id = nwbf.subject.subject_id
+            else:
+                subject_id = None
+
+            Session().insert1(
+                {
+                    "nwb_file_name": nwb_file_name,
+                    "subject_id": subject_id,
+                    "institution_name": nwbf.institution,
+                    "lab_name": nwbf.lab,
+                    "session_id": nwbf.session_id,
+                    "session_description": nwbf.session_description,
+                    "session_start_time": nwbf.session_start_time,
+                    "timestamps_reference_time": nwbf.timestamps_reference_time,
+                    "experiment_description": nwbf.experiment_description,
+                },
+                skip_duplicates=True,
+            )
+
+            print("Skipping Apparatus for now...")
+            # Apparatus().insert_from_nwbfile(nwbf)
+
+            # interval lists depend on Session (as a primary key) but users may want to add these manually so this is
+            # a manual table that is also populated from NWB files
+
+            print("IntervalList...")
+            IntervalList().insert_from_nwbfile(
+                nwbf, nwb_file_name=nwb_file_name
+            )
+
+            # print('Unit...')
+            # Unit().insert_from_nwbfile(nwbf, nwb_file_name=nwb_file_name)
+
+            self._add_data_acquisition_device_part(nwb_file_name, nwbf, config)
+            self._add_experimenter_part(nwb_file_name, nwbf)
 
+    @staticmethod
+    def insert_shared_from_nwbfile(nwbf, config):
+        """Insert the entries of an NWB file that sessions may share.
+
+        These are the institution, lab, lab members, subject, devices and
+        probes referenced by Session and its part tables.
+
+        Parameters
+        ----------
+        nwbf : pynwb.NWBFile
+            The NWB file of the session.
+        config : dict
+            The config settings of the NWB file, from get_config.
+        """
         print("Institution...")
         Institution().insert_from_nwbfile(nwbf)
 
@@ -92,41 +144,6 @@ class Session(dj.Imported):
         Probe.insert_from_nwbfile(nwbf, config)
         print()
 
-        if nwbf.subject is not None:
-            subject_id = nwbf.subject.subject_id
-        else:
-            subject_id = None
-
-        Session().insert1(
-            {
-                "nwb_file_name": nwb_file_name,
-                "subject_id": subject_id,
-                "institution_name": nwbf.institution,
-                "lab_name": nwbf.lab,
-                "session_id": nwbf.session_id,
-                "session_description": nwbf.session_description,
-                "session_start_time": nwbf.session_start_time,
-                "timestamps_reference_time": nwbf.timestamps_reference_time,
-                "experiment_description": nwbf.experiment_description,
-            },
-            skip_duplicates=True,
-        )
-
-        print("Skipping Apparatus for now...")
-        # Apparatus().insert_from_nwbfile(nwbf)
-
-        # interval lists depend on Session (as a primary key) but users may want to add these manually so this is
-        # a manual table that is also populated from NWB files
-
-        print("IntervalList...")
-        IntervalList().insert_from_nwbfile(nwbf, nwb_file_name=nwb_file_name)
-
-        # print('Unit...')
-        # Unit().insert_from_nwbfile(nwbf, nwb_file_name=nwb_file_name)
-
-        self._add_data_acquisition_device_part(nwb_file_name, nwbf, config)
-        self._add_experimenter_part(nwb_file_name, nwbf)
-
     def _add_data_acquisition_device_part(self, nwb_file_name, nwbf, config):
         # get device names from both the NWB file and the associated config file
         device_names, _, _ = DataAcquisitionDevice.get_all_device_names(
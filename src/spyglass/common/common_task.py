@@ -6,7 +6,7 @@ from .common_device import CameraDevice
 from .common_interval import IntervalList
 from .common_nwbfile import Nwbfile
 from .common_session import Session  # noqa: F401
-from ..utils.nwb_helper_fn import get_nwb_file
+from ..utils.nwb_helper_fn import open_nwb_file
 
 schema = dj.schema("common_task")
 
@@ -98,68 +98,68 @@ class TaskEpoch(dj.Imported):
     def make(self, key):
         nwb_file_name = key["nwb_file_name"]
         nwb_file_abspath = Nwbfile().get_abs_path(nwb_file_name)
-        nwbf = get_nwb_file(nwb_file_abspath)
-        camera_names = dict()
-        # the tasks refer to the camera_id which is unique for the NWB file but not for CameraDevice schema, so we
-        # need to look up the right camera
-        # map camera ID (in camera name) to camera_name
-        for device in nwbf.devices.values():
-            if isinstance(device, ndx_franklab_novela.CameraDevice):
-                # get the camera ID
-                camera_id = int(str.split(device.name)[1])
-                camera_names[camera_id] = device.camera_name
-
-        # find the task modules and for each one, add the task to the Task schema if it isn't there
-        # and then add an entry for each epoch
-        tasks_mod = nwbf.processing.get("tasks")
-        if tasks_mod is None:
-            print(f"No tasks processing module found in {nwbf}\n")
-            return
-
-        for task in tasks_mod.data_interfaces.values():
-            if self.check_task_table(task):
-                # check if the task is in the Task table and if not, add it
-                Task.insert_from_task_table(task)
-                key["task_name"] = task.task_name[0]
-
-                # get the CameraDevice used for this task (primary key is camera name so we need
-                # to map from ID to name)
-                camera_ids = task.camera_id[0]
-                valid_camera_ids = [
-                    camera_id
-                    for camera_id in camera_ids
-                    if camera_id in camera_names.keys()
-                ]
-                if valid_camera_ids:
-                    key["camera_names"] = [
-                        {"camera_name": camera_names[camera_id]}
-                        for camera_id in valid_camera_ids
+        with open_nwb_file(nwb_file_abspath) as nwbf:
+            camera_names = dict()
+            # the tasks refer to the camera_id which is unique for the NWB file but not for CameraDevice schema, so we
+            # need to look up the right camera
+            # map camera ID (in camera name) to camera_name
+            for device in nwbf.devices.values():
+                if isinstance(device, ndx_franklab_novela.CameraDevice):
+                    # get the camera ID
+                    camera_id = int(str.split(device.name)[1])
+                    camera_names[camera_id] = device.camera_name
+
+            # find the task modules and for each one, add the task to the Task schema if it isn't there
+            # and then add an entry for each epoch
+            tasks_mod = nwbf.processing.get("tasks")
+            if tasks_mod is None:
+                print(f"No tasks processing module found in {nwbf}\n")
+                return
+
+            for task in tasks_mod.data_interfaces.values():
+                if self.check_task_table(task):
+                    # check if the task is in the Task table and if not, add it
+                    Task.insert_from_task_table(task)
+                    key["task_name"] = task.task_name[0]
+
+                    # get the CameraDevice used for this task (primary key is camera name so we need
+                    # to map from ID to name)
+                    camera_ids = task.camera_id[0]
+                    valid_camera_ids = [
+                        camera_id
+                        for camera_id in camera_ids
+                        if camera_id in camera_names.keys()
                     ]
-                else:
-                    print(
-                        f"No camera device found with ID {camera_ids} in NWB file {nwbf}\n"
-                    )
-                # Add task environment
-                if hasattr(task, "task_environment"):
-                    key["task_environment"] = task.task_environment[0]
-
-                # get the interval list for this task, which corresponds to the matching epoch for the raw data.
-                # Users should define more restrictive intervals as required for analyses
-                session_intervals = (
-                    IntervalList() & {"nwb_file_name": nwb_file_name}
-                ).fetch("interval_list_name")
-                for epoch in task.task_epochs[0]:
-                    # TODO in beans file, task_epochs[0] is 1x2 dset of ints, so epoch would be an int
-                    key["epoch"] = epoch
-                    target_interval = str(epoch).zfill(2)
-                    for interval in session_intervals:
-                        if (
-                            target_interval in interval
-                        ):  # TODO this is not true for the beans file
-                            break
-                    # TODO case when interval is not found is not handled
-                    key["interval_list_name"] = interval
-                    self.insert1(key)
+                    if valid_camera_ids:
+                        key["camera_names"] = [
+                            {"camera_name": camera_names[camera_id]}
+                            for camera_id in valid_camera_ids
+                        ]
+                    else:
+                        print(
+                            f"No camera device found with ID {camera_ids} in NWB file {nwbf}\n"
+                        )
+                    # Add task environment
+                    if hasattr(task, "task_environment"):
+                        key["task_environment"] = task.task_environment[0]
+
+                    # get the interval list for this task, which corresponds to the matching epoch for the raw data.
+                    # Users should define more restrictive intervals as required for analyses
+                    session_intervals = (
+                        IntervalList() & {"nwb_file_name": nwb_file_name}
+                    ).fetch("interval_list_name")
+                    for epoch in task.task_epochs[0]:
+                        # TODO in beans file, task_epochs[0] is 1x2 dset of ints, so epoch would be an int
+                        key["epoch"] = epoch
+                        target_interval = str(epoch).zfill(2)
+                        for interval in session_intervals:
+                            if (
+                                target_interval in interval
+                            ):  # TODO this is not true for the beans file
+                                break
+                        # TODO case when interval is not found is not handled
+                        key["interval_list_name"] = interval
+                        self.insert1(key)
 
     @classmethod
     def update_entries(cls, restrict={}):
@@ -1,3 +1,8 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import datajoint as dj
+
+from ..utils.nwb_helper_fn import close_nwb_files, get_nwb_file
 from .common_behav import (
     PositionSource,
     RawPosition,
@@ -10,8 +15,47 @@ from .common_nwbfile import Nwbfile
 from .common_session import Session
 from .common_task import TaskEpoch
 
+# tables populated after Session, in the order they are populated one after
+# another, with the steps each one depends on
+_COMMON_STEPS = {
+    "ElectrodeGroup": ((ElectrodeGroup, Electrode), ()),
+    "Raw": ((Raw,), ()),
+    "SampleCount": ((SampleCount,), ()),
+    # the events take the valid times of Raw
+    "DIOEvents": ((DIOEvents,), ("Raw",)),
+    # sensor data (from analog ProcessingModule) is temporarily removed from
+    # NWBFile to reduce file size while it is not being used. add it back in
+    # by commenting out the removal code in
+    # spyglass/data_import/insert_sessions.py when ready
+    # "SensorData": ((SensorData,), ()),
+    "TaskEpoch": ((TaskEpoch,), ()),
+    "StateScriptFile": ((StateScriptFile,), ("TaskEpoch",)),
+    "VideoFile": ((VideoFile,), ("TaskEpoch",)),
+    # the position intervals are mapped to the epochs of TaskEpoch
+    "RawPosition": ((PositionSource, RawPosition), ("TaskEpoch",)),
+}
+
+
+def populate_all_common(nwb_file_name, n_workers=1):
+    """Populate the common tables of a session.
 
-def populate_all_common(nwb_file_name):
+    Session is populated first, then the imported tables that depend on it.
+    With n_workers > 1, those that do not depend on each other are populated
+    concurrently in a pool of processes, each of which keeps a single handle
+    on the NWB file open.
+
+    A table that fails to populate does not stop the others, only the tables
+    that depend on it. A RuntimeError naming the failed tables is raised once
+    the others are done.
+
+    Parameters
+    ----------
+    nwb_file_name : str
+        The name of the NWB file, already inserted in Nwbfile.
+    n_workers : int, optional
+        Number of processes populating tables at the same time. Default 1
+        populates them one after another in this process.
+    """
     # Insert session one by one
     fp = [(Nwbfile & {"nwb_file_name": nwb_file_name}).proj()]
     print("Populate Session...")
@@ -21,33 +65,104 @@ def populate_all_common(nwb_file_name):
     # print('Populate NwbfileKachery...')
     # NwbfileKachery.populate()
 
-    print("Populate ElectrodeGroup...")
-    ElectrodeGroup.populate(fp)
+    failed = _populate_common_steps(nwb_file_name, n_workers=n_workers)
+    if failed:
+        raise RuntimeError(
+            f"Failed to populate common tables of {nwb_file_name}: "
+            + ", ".join(f"{step} ({error!r})" for step, error in failed.items())
+        )
+
+
+def _populate_common_step(step, nwb_file_name):
+    """Populate the tables of one step of populate_all_common."""
+    fp = [(Nwbfile & {"nwb_file_name": nwb_file_name}).proj()]
+    tables, _ = _COMMON_STEPS[step]
+    for table in tables:
+        print(f"Populate {table.__name__}...")
+        if table is PositionSource:
+            table.insert_from_nwbfile(nwb_file_name)
+        else:
+            table.populate(fp)
+
+
+def _init_common_worker(nwb_file_name=None):
+    """Give each worker process its own connection to the database and its
+    own handle on the NWB file, instead of those inherited from the parent.
+    """
+    close_nwb_files()
+    dj.conn().connect()
+    if nwb_file_name is not None:
+        get_nwb_file(nwb_file_name)
+
+
+def _populate_common_steps(nwb_file_name, n_workers=1):
+    """Run the steps of _COMMON_STEPS, each once those it depends on are done.
+
+    Parameters
+    ----------
+    nwb_file_name : str
+    n_workers : int, optional
+        Number of steps running at the same time, in a pool of processes if
+        greater than 1.
 
-    print("Populate Electrode...")
-    Electrode.populate(fp)
+    Returns
+    -------
+    failed : dict
+        The exception raised by each failed step, and of the steps skipped
+        because one they depend on failed.
+    """
+    upstream = {step: set(steps) for step, (_, steps) in _COMMON_STEPS.items()}
+    done, failed = set(), dict()
 
-    print("Populate Raw...")
-    Raw.populate(fp)
+    def take_ready_steps():
+        ready = [step for step, steps in upstream.items() if steps <= done]
+        for step in ready:
+            del upstream[step]
+        return ready
 
-    print("Populate SampleCount...")
-    SampleCount.populate(fp)
+    def record(step, error):
+        if error is None:
+            done.add(step)
+            return
+        print(f"Populating {step} of {nwb_file_name} failed: {error!r}")
+        failed[step] = error
+        # skip the steps that depend on it, directly or not
+        skipped = [step]
+        while skipped:
+            failed_step = skipped.pop()
+            for later_step, steps in list(upstream.items()):
+                if failed_step in steps:
+                    del upstream[later_step]
+                    failed[later_step] = RuntimeError(
+                        f"skipped because {failed_step} failed"
+                    )
+                    skipped.append(later_step)
 
-    print("Populate DIOEvents...")
-    DIOEvents.populate(fp)
+    if n_workers <= 1:
+        while upstream:
+            for step in take_ready_steps():
+                try:
+                    _populate_common_step(step, nwb_file_name)
+                except Exception as error:
+                    record(step, error)
+                else:
+                    record(step, None)
+        return failed
 
-    # sensor data (from analog ProcessingModule) is temporarily removed from NWBFile
-    # to reduce file size while it is not being used. add it back in by commenting out
-    # the removal code in spyglass/data_import/insert_sessions.py when ready
-    # print('Populate SensorData')
-    # SensorData.populate(fp)
+    with ProcessPoolExecutor(
+        max_workers=n_workers,
+        initializer=_init_common_worker,
+        initargs=(nwb_file_name,),
+    ) as executor:
+        running = dict()
+        while upstream or running:
+            for step in take_ready_steps():
+                future = executor.submit(
+                    _populate_common_step, step, nwb_file_name
+                )
+                running[future] = step
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                record(running.pop(future), future.exception())
 
-    print("Populate TaskEpochs")
-    TaskEpoch.populate(fp)
-    print("Populate StateScriptFile")
-    StateScriptFile.populate(fp)
-    print("Populate VideoFile")
-    VideoFile.populate(fp)
-    print("RawPosition...")
-    PositionSource.insert_from_nwbfile(nwb_file_name)
-    RawPosition.populate(fp)
+    return failed
@@ -1,17 +1,26 @@
 import os
 import stat
 import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 from typing import List, Union
 
+import datajoint as dj
 import pynwb
 
-from ..common import Nwbfile, get_raw_eseries, populate_all_common
+from ..common import (
+    BrainRegion,
+    Nwbfile,
+    Session,
+    close_nwb_files,
+    get_raw_eseries,
+    populate_all_common,
+)
 from ..settings import debug_mode, raw_dir
-from ..utils.nwb_helper_fn import get_nwb_copy_filename
+from ..utils.nwb_helper_fn import get_config, get_nwb_copy_filename
 
 
-def insert_sessions(nwb_file_names: Union[str, List[str]]):
+def insert_sessions(nwb_file_names: Union[str, List[str]], n_workers: int = 1):
     """
     Populate the dj database with new sessions.
 
@@ -22,50 +31,141 @@ def insert_sessions(nwb_file_names: Union[str, List[str]]):
         existing .nwb files. Each file represents a session. Also accepts
         strings with glob wildcards (e.g., *) so long as the wildcard specifies
         exactly one file.
+    n_workers : int, optional
+        Number of sessions inserted at the same time, in a pool of processes
+        if greater than 1. Default 1. A session that fails to insert does not
+        stop the others, and a RuntimeError naming the failed sessions is
+        raised once they are done.
     """
 
     if not isinstance(nwb_file_names, list):
         nwb_file_names = [nwb_file_names]
 
-    for nwb_file_name in nwb_file_names:
-        if "/" in nwb_file_name:
-            nwb_file_name = nwb_file_name.split("/")[-1]
-
-        nwb_file_abs_path = Path(
-            Nwbfile.get_abs_path(nwb_file_name, new_file=True)
+    # find all files first, so that a missing one fails before any insert
+    nwb_file_names = [
+        _find_nwb_file(nwb_file_name) for nwb_file_name in nwb_file_names
+    ]
+
+    failed = dict()
+    if n_workers <= 1:
+        for nwb_file_name in nwb_file_names:
+            try:
+                _insert_session(nwb_file_name)
+            except Exception as error:
+                print(f"Inserting {nwb_file_name} failed: {error!r}")
+                failed[nwb_file_name] = error
+    else:
+        # the entries that sessions may share are inserted here one file after
+        # another, as workers inserting the same ones at the same time could
+        # duplicate the auto-incremented brain regions, and prompt for new
+        # devices without a terminal
+        for nwb_file_name in nwb_file_names:
+            try:
+                _insert_shared_entries(nwb_file_name)
+            except Exception as error:
+                print(f"Inserting {nwb_file_name} failed: {error!r}")
+                failed[nwb_file_name] = error
+
+        with ProcessPoolExecutor(
+            max_workers=n_workers, initializer=_init_session_worker
+        ) as executor:
+            futures = {
+                executor.submit(_insert_session, nwb_file_name): nwb_file_name
+                for nwb_file_name in nwb_file_names
+                if nwb_file_name not in failed
+            }
+            for future in as_completed(futures):
+                if future.exception() is not None:
+                    print(
+                        f"Inserting {futures[future]} failed: "
+                        + f"{future.exception()!r}"
+                    )
+                    failed[futures[future]] = future.exception()
+
+    if failed:
+        raise RuntimeError(
+            f"Failed to insert {len(failed)} of {len(nwb_file_names)} "
+            + "sessions: "
+            + ", ".join(
+                f"{nwb_file_name} ({error!r})"
+                for nwb_file_name, error in failed.items()
+            )
         )
 
-        if not nwb_file_abs_path.exists():
-            possible_matches = sorted(Path(raw_dir).glob(f"*{nwb_file_name}*"))
 
-            if len(possible_matches) == 1:
-                nwb_file_abs_path = possible_matches[0]
-                nwb_file_name = nwb_file_abs_path.name
+def _find_nwb_file(nwb_file_name):
+    """Return the name of the file in the raw directory matching the given
+    name or wildcard."""
+    if "/" in nwb_file_name:
+        nwb_file_name = nwb_file_name.split("/")[-1]
 
-            else:
-                raise FileNotFoundError(
-                    f"File not found: {nwb_file_abs_path}\n\t"
-                    + f"{len(possible_matches)} possible matches:"
-                    + f"{possible_matches}"
-                )
+    nwb_file_abs_path = Path(Nwbfile.get_abs_path(nwb_file_name, new_file=True))
 
-        # file name for the copied raw data
-        out_nwb_file_name = get_nwb_copy_filename(nwb_file_abs_path.name)
+    if not nwb_file_abs_path.exists():
+        possible_matches = sorted(Path(raw_dir).glob(f"*{nwb_file_name}*"))
 
-        # Check whether the file already exists in the Nwbfile table
-        if len(Nwbfile() & {"nwb_file_name": out_nwb_file_name}):
-            warnings.warn(
-                f"Cannot insert data from {nwb_file_name}: {out_nwb_file_name}"
-                + " is already in Nwbfile table."
+        if len(possible_matches) == 1:
+            nwb_file_abs_path = possible_matches[0]
+
+        else:
+            raise FileNotFoundError(
+                f"File not found: {nwb_file_abs_path}\n\t"
+                + f"{len(possible_matches)} possible matches:"
+                + f"{possible_matches}"
             )
-            continue
-
-        # Make a copy of the NWB file that ends with '_'.
-        # This has everything except the raw data but has a link to
-        # the raw data in the original file
-        copy_nwb_link_raw_ephys(nwb_file_name, out_nwb_file_name)
-        Nwbfile().insert_from_relative_file_name(out_nwb_file_name)
-        populate_all_common(out_nwb_file_name)
+
+    return nwb_file_abs_path.name
+
+
+def _insert_session(nwb_file_name):
+    """Copy the NWB file of a session and populate its common tables."""
+    # file name for the copied raw data
+    out_nwb_file_name = get_nwb_copy_filename(nwb_file_name)
+
+    # Check whether the file already exists in the Nwbfile table
+    if len(Nwbfile() & {"nwb_file_name": out_nwb_file_name}):
+        warnings.warn(
+            f"Cannot insert data from {nwb_file_name}: {out_nwb_file_name}"
+            + " is already in Nwbfile table."
+        )
+        return
+
+    # Make a copy of the NWB file that ends with '_'.
+    # This has everything except the raw data but has a link to
+    # the raw data in the original file
+    copy_nwb_link_raw_ephys(nwb_file_name, out_nwb_file_name)
+    Nwbfile().insert_from_relative_file_name(out_nwb_file_name)
+    populate_all_common(out_nwb_file_name)
+
+
+def _insert_shared_entries(nwb_file_name):
+    """Insert the entries of a session that other sessions may share: those
+    of Session.insert_shared_from_nwbfile and the brain regions of its
+    electrode groups."""
+    out_nwb_file_name = get_nwb_copy_filename(nwb_file_name)
+    if len(Nwbfile() & {"nwb_file_name": out_nwb_file_name}):
+        return
+
+    nwb_file_abs_path = Nwbfile.get_abs_path(nwb_file_name, new_file=True)
+    # the config file is found from the name of the copy
+    config = get_config(Nwbfile.get_abs_path(out_nwb_file_name, new_file=True))
+    with pynwb.NWBHDF5IO(
+        path=nwb_file_abs_path, mode="r", load_namespaces=True
+    ) as io:
+        nwbf = io.read()
+        Session.insert_shared_from_nwbfile(nwbf, config)
+        for location in {
+            electrode_group.location
+            for electrode_group in nwbf.electrode_groups.values()
+        }:
+            BrainRegion.fetch_add(region_name=location)
+
+
+def _init_session_worker():
+    """Give each worker process its own connection to the database, and no
+    NWB files open in the parent."""
+    close_nwb_files()
+    dj.conn().connect()
 
 
 def copy_nwb_link_raw_ephys(nwb_file_name, out_nwb_file_name):
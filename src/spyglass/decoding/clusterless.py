@@ -7,11 +7,7 @@ References
 speeds. eLife 10, e64505 (2021).
 """
 
-import os
-import shutil
-import uuid
 from copy import deepcopy
-from pathlib import Path
 
 import datajoint as dj
 import matplotlib.pyplot as plt
@@ -41,6 +37,7 @@ from spyglass.common.common_interval import IntervalList
 from spyglass.common.common_nwbfile import AnalysisNwbfile
 from spyglass.common.common_position import IntervalPositionInfo
 from spyglass.decoding.core import (
+    convert_time_slices_to_bin_slices,
     convert_valid_times_to_slice,
     get_valid_ephys_position_times_by_epoch,
 )
@@ -147,53 +144,34 @@ class UnitMarks(SpyglassMixin, dj.Computed):
         if recording.get_num_segments() > 1:
             recording = si.concatenate_recordings([recording])
         sorting = Curation.get_curated_sorting(key)
-        waveform_extractor_name = (
-            f'{key["nwb_file_name"]}_{str(uuid.uuid4())[0:8]}_'
-            f'{key["curation_id"]}_clusterless_waveforms'
-        )
-        waveform_extractor_path = str(
-            Path(os.environ["SPYGLASS_WAVEFORMS_DIR"])
-            / Path(waveform_extractor_name)
-        )
-        if os.path.exists(waveform_extractor_path):
-            shutil.rmtree(waveform_extractor_path)
-
-        WAVEFORM_PARAMS = {
-            "ms_before": 0.5,
-            "ms_after": 0.5,
-            "max_spikes_per_unit": None,
-            "n_jobs": 5,
-            "total_memory": "5G",
-        }
-        waveform_extractor = si.extract_waveforms(
-            recording=recording,
-            sorting=sorting,
-            folder=waveform_extractor_path,
-            **WAVEFORM_PARAMS,
-        )
 
         if mark_param["mark_type"] == "amplitude":
             sorter = (CuratedSpikeSorting() & key).fetch1("sorter")
             if sorter == "clusterless_thresholder":
                 estimate_peak_time = False
+                # amplitudes read by the thresholder as it detected spikes
+                saved_frames, saved_marks = SpikeSorting.get_clusterless_marks(
+                    key
+                )
             else:
                 estimate_peak_time = True
+                saved_frames, saved_marks = None, None
 
             try:
                 peak_sign = mark_param["mark_param_dict"]["peak_sign"]
             except KeyError:
                 peak_sign = "neg"
 
-            marks = np.concatenate(
+            marks = UnitMarks._get_spike_peak_amplitudes(
+                recording,
                 [
-                    UnitMarks._get_peak_amplitude(
-                        waveform=waveform_extractor.get_waveforms(unit_id),
-                        peak_sign=peak_sign,
-                        estimate_peak_time=estimate_peak_time,
-                    )
+                    sorting.get_unit_spike_train(unit_id)
                     for unit_id in nwb_units.index
                 ],
-                axis=0,
+                peak_sign=peak_sign,
+                estimate_peak_time=estimate_peak_time,
+                saved_frames=saved_frames,
+                saved_marks=saved_marks,
             )
 
             timestamps = np.concatenate(np.asarray(nwb_units["spike_times"]))
@@ -208,7 +186,7 @@ class UnitMarks(SpyglassMixin, dj.Computed):
 
         # create a new AnalysisNwbfile and a timeseries for the marks and save
         key["analysis_file_name"] = AnalysisNwbfile().create(
-            key["nwb_file_name"]
+            key["nwb_file_name"], minimal=True
         )
         nwb_object = pynwb.TimeSeries(
             name="marks",
@@ -241,41 +219,135 @@ class UnitMarks(SpyglassMixin, dj.Computed):
         )
 
     @staticmethod
-    def _get_peak_amplitude(
-        waveform, peak_sign="neg", estimate_peak_time=False
+    def _get_spike_peak_amplitudes(
+        recording,
+        spike_trains,
+        peak_sign="neg",
+        estimate_peak_time=False,
+        ms_before=0.5,
+        ms_after=0.5,
+        chunk_duration=10.0,
+        saved_frames=None,
+        saved_marks=None,
     ):
         """Returns the amplitudes of all channels at the time of the peak
-        amplitude across channels.
+        amplitude across channels, for each spike.
+
+        Same as taking the peak amplitude of the waveforms of
+        `si.extract_waveforms` with max_spikes_per_unit=None, but only the
+        samples at the peak of each spike are kept. The recording is read in
+        chunks, once to find the peak time of each unit if estimate_peak_time,
+        and once to read the amplitudes.
 
         Parameters
         ----------
-        waveform : array-like, shape (n_spikes, n_time, n_channels)
+        recording : si.BaseRecording
+            Recording with one segment.
+        spike_trains : list of array-like
+            Spike frames of each unit.
         peak_sign : ('pos', 'neg', 'both'), optional
             Direction of the peak in the waveform
         estimate_peak_time : bool, optional
-            Find the peak times for each spike because some spikesorters do not
-            align the spike time (at index n_time // 2) to the peak
+            Find the peak time of each unit from the mode of the peak times of
+            its spikes, because some spikesorters do not align the spike time
+            to the peak
+        ms_before, ms_after : float, optional
+            Extent of the spike waveforms around the spike times
+        chunk_duration : float, optional
+            Duration in seconds of the chunks of recording read at once
+        saved_frames : np.ndarray, shape (n_saved,), optional
+            Sorted frames at which the amplitudes of all channels were already
+            read, e.g. by the clusterless thresholder of SpikeSorting
+        saved_marks : np.ndarray, shape (n_saved, n_channels), optional
+            Amplitudes at saved_frames. Used instead of reading the recording
+            if they cover the peak frames of all spikes
 
         Returns
         -------
-        peak_amplitudes : array-like, shape (n_spikes, n_channels)
+        peak_amplitudes : np.ndarray, shape (n_spikes, n_channels)
+            Amplitudes of the spikes of each unit, in the order of
+            spike_trains. Spikes whose waveform extends past the recording are
+            left as zeros, as in `si.extract_waveforms`.
 
         """
+        sampling_frequency = recording.get_sampling_frequency()
+        nbefore = int(ms_before * sampling_frequency / 1000.0)
+        nafter = int(ms_after * sampling_frequency / 1000.0)
+        chunk_size = int(chunk_duration * sampling_frequency)
+        # same scaling and dtype as the waveforms of si.extract_waveforms
+        return_scaled = recording.has_scaled()
+        dtype = recording.get_dtype()
+        if return_scaled and np.issubdtype(dtype, np.integer):
+            dtype = np.dtype("float32")
+
+        n_spikes = np.array([len(train) for train in spike_trains], dtype=int)
+        unit_offsets = np.concatenate(([0], np.cumsum(n_spikes)))
+        frames = np.concatenate(
+            [np.asarray(train, dtype=np.int64) for train in spike_trains]
+            + [np.array([], dtype=np.int64)]
+        )
+        unit_inds = np.repeat(np.arange(len(spike_trains)), n_spikes)
+        valid_inds = np.flatnonzero(
+            (frames - nbefore >= 0)
+            & (frames + nafter <= recording.get_num_samples())
+        )
+
+        peak_offsets = np.full(
+            len(spike_trains), (nbefore + nafter) // 2 - nbefore
+        )
         if estimate_peak_time:
-            if peak_sign == "neg":
-                peak_inds = np.argmin(np.min(waveform, axis=2), axis=1)
-            elif peak_sign == "pos":
-                peak_inds = np.argmax(np.max(waveform, axis=2), axis=1)
-            elif peak_sign == "both":
-                peak_inds = np.argmax(np.max(np.abs(waveform), axis=2), axis=1)
+            # the zero waveforms of invalid spikes peak at the first sample
+            peak_inds = np.zeros(len(frames), dtype=int)
+            for spike_inds, waveforms in _iter_spike_samples(
+                recording,
+                frames[valid_inds],
+                np.arange(-nbefore, nafter),
+                return_scaled=return_scaled,
+                dtype=dtype,
+                chunk_size=chunk_size,
+            ):
+                if peak_sign == "neg":
+                    inds = np.argmin(np.min(waveforms, axis=2), axis=1)
+                elif peak_sign == "pos":
+                    inds = np.argmax(np.max(waveforms, axis=2), axis=1)
+                elif peak_sign == "both":
+                    inds = np.argmax(np.max(np.abs(waveforms), axis=2), axis=1)
+                peak_inds[valid_inds[spike_inds]] = inds
 
             # Get mode of peaks to find the peak time
-            values, counts = np.unique(peak_inds, return_counts=True)
-            spike_peak_ind = values[counts.argmax()]
-        else:
-            spike_peak_ind = waveform.shape[1] // 2
+            for unit_ind, (start, stop) in enumerate(
+                zip(unit_offsets[:-1], unit_offsets[1:])
+            ):
+                if stop > start:
+                    values, counts = np.unique(
+                        peak_inds[start:stop], return_counts=True
+                    )
+                    peak_offsets[unit_ind] = values[counts.argmax()] - nbefore
 
-        return waveform[:, spike_peak_ind]
+        peak_amplitudes = np.zeros(
+            (len(frames), recording.get_num_channels()), dtype=dtype
+        )
+        peak_frames = frames[valid_inds] + peak_offsets[unit_inds[valid_inds]]
+        if (
+            saved_frames is not None
+            and np.isin(peak_frames, saved_frames).all()
+        ):
+            peak_amplitudes[valid_inds] = saved_marks[
+                np.searchsorted(saved_frames, peak_frames)
+            ]
+            return peak_amplitudes
+
+        for spike_inds, amplitudes in _iter_spike_samples(
+            recording,
+            peak_frames,
+            np.array([0]),
+            return_scaled=return_scaled,
+            dtype=dtype,
+            chunk_size=chunk_size,
+        ):
+            peak_amplitudes[valid_inds[spike_inds]] = amplitudes[:, 0]
+
+        return peak_amplitudes
 
     @staticmethod
     def _threshold(timestamps, marks, mark_param_dict):
@@ -304,6 +376,60 @@ class UnitMarks(SpyglassMixin, dj.Computed):
         return timestamps[include], marks[include]
 
 
+def _iter_spike_samples(
+    recording, frames, offsets, return_scaled=False, dtype=None, chunk_size=None
+):
+    """Yields the samples of a recording at offsets from spike frames.
+
+    Spikes are read in order of their frames, with one read of the recording
+    per chunk of chunk_size frames that contains spikes.
+
+    Parameters
+    ----------
+    recording : si.BaseRecording
+        Recording with one segment.
+    frames : np.ndarray, shape (n_spikes,)
+    offsets : np.ndarray, shape (n_offsets,)
+        Sorted offsets from the spike frames, all within the recording.
+    return_scaled : bool, optional
+    dtype : np.dtype, optional
+        dtype of the samples, by default that of the recording
+    chunk_size : int, optional
+        By default, all spikes are read at once.
+
+    Yields
+    ------
+    spike_inds : np.ndarray, shape (n_chunk_spikes,)
+        Indices in frames of the spikes of a chunk.
+    samples : np.ndarray, shape (n_chunk_spikes, n_offsets, n_channels)
+    """
+    if len(frames) == 0:
+        return
+    order = np.argsort(frames, kind="stable")
+    sorted_frames = frames[order]
+    chunk_ids = (
+        sorted_frames // chunk_size
+        if chunk_size
+        else np.zeros_like(sorted_frames)
+    )
+    chunk_bounds = np.concatenate(
+        ([0], np.flatnonzero(np.diff(chunk_ids)) + 1, [len(frames)])
+    )
+    for start_ind, stop_ind in zip(chunk_bounds[:-1], chunk_bounds[1:]):
+        chunk_frames = sorted_frames[start_ind:stop_ind]
+        start_frame = chunk_frames[0] + offsets[0]
+        traces = recording.get_traces(
+            start_frame=start_frame,
+            end_frame=chunk_frames[-1] + offsets[-1] + 1,
+            return_scaled=return_scaled,
+        )
+        if dtype is not None:
+            traces = traces.astype(dtype, copy=False)
+        yield order[start_ind:stop_ind], traces[
+            chunk_frames[:, np.newaxis] - start_frame + offsets
+        ]
+
+
 @schema
 class UnitMarksIndicatorSelection(dj.Lookup):
     """Bins the spike times and associated spike waveform features for a given
@@ -343,20 +469,12 @@ class UnitMarksIndicator(SpyglassMixin, dj.Computed):
         marks_df = (UnitMarks & key).fetch1_dataframe()
 
         time = self.get_time_bins_from_interval(interval_times, sampling_rate)
-
-        # Bin marks into time bins. No spike bins will have NaN
-        marks_df = marks_df.loc[time.min() : time.max()]
-        time_index = np.digitize(marks_df.index, time[1:-1])
-        marks_indicator_df = (
-            marks_df.groupby(time[time_index])
-            .mean()
-            .reindex(index=pd.Index(time, name="time"))
-        )
+        marks_indicator_df = self.get_marks_indicator(marks_df, time)
 
         # Insert into analysis nwb file
         nwb_analysis_file = AnalysisNwbfile()
         key["analysis_file_name"] = nwb_analysis_file.create(
-            key["nwb_file_name"]
+            key["nwb_file_name"], minimal=True
         )
 
         key["marks_indicator_object_id"] = nwb_analysis_file.add_nwb_object(
@@ -371,6 +489,39 @@ class UnitMarksIndicator(SpyglassMixin, dj.Computed):
 
         self.insert1(key)
 
+    @staticmethod
+    def get_marks_indicator(marks_df, time):
+        """Averages the marks in each time bin.
+
+        Only the bins with spikes are returned, and the first and last bins,
+        with NaN marks if they have none, so that the time bins can be
+        rebuilt from the stored entry. The time bins without spikes are NaN
+        in `fetch_dataframe`.
+
+        Parameters
+        ----------
+        marks_df : pd.DataFrame
+            Marks indexed by spike time, as in UnitMarks.
+        time : np.ndarray, shape (n_time,)
+            Time bins.
+
+        Returns
+        -------
+        marks_indicator_df : pd.DataFrame
+            Mean marks, indexed by the time of the bins, with the index of
+            each bin into `time` in the "time_index" column.
+        """
+        marks_df = marks_df.loc[time.min() : time.max()]
+        time_index = np.digitize(marks_df.index, time[1:-1])
+        marks_indicator_df = marks_df.groupby(time_index).mean()
+        marks_indicator_df = marks_indicator_df.reindex(
+            np.union1d(marks_indicator_df.index, [0, len(time) - 1])
+        )
+        marks_indicator_df.insert(0, "time_index", marks_indicator_df.index)
+        return marks_indicator_df.set_index(
+            pd.Index(time[marks_indicator_df.index], name="time")
+        )
+
     @staticmethod
     def get_time_bins_from_interval(interval_times, sampling_rate):
         """Picks the superset of the interval"""
@@ -433,13 +584,81 @@ class UnitMarksIndicator(SpyglassMixin, dj.Computed):
     def fetch1_dataframe(self):
         return self.fetch_dataframe()[0]
 
-    def fetch_dataframe(self):
-        return [
-            data["marks_indicator"].set_index("time")
-            for data in self.fetch_nwb()
-        ]
+    def fetch_dataframe(self, time_slices: list[slice] = None):
+        """Marks in each time bin, NaN for bins without spikes.
+
+        Parameters
+        ----------
+        time_slices : list[slice], optional
+            Only build the time bins within these slices, concatenated in
+            order. All bins if None.
+
+        Returns
+        -------
+        marks_indicators : list[pd.DataFrame], shape (n_time, n_marks) each
+        """
+        marks_indicators = []
+        for time, marks_indicator in self.fetch_sparse(return_time=True):
+            time = np.concatenate(
+                [
+                    time[bin_slice]
+                    for bin_slice in convert_time_slices_to_bin_slices(
+                        time, time_slices
+                    )
+                ]
+            )
+            marks_indicators.append(
+                marks_indicator.reindex(index=pd.Index(time, name="time"))
+            )
+        return marks_indicators
 
-    def fetch_xarray(self):
+    def fetch_sparse(self, return_time: bool = False) -> list:
+        """Marks in the time bins with spikes.
+
+        Parameters
+        ----------
+        return_time : bool, optional
+            Also return all of the time bins. Default False.
+
+        Returns
+        -------
+        marks_indicators : list[pd.DataFrame], shape (n_spike_time, n_marks) each
+            If return_time, a list of tuples of the time bins, shape
+            (n_time,), and the marks.
+        """
+        marks_indicators = []
+        for data in self.fetch_nwb():
+            marks_indicator = data["marks_indicator"].set_index("time")
+            if "time_index" in marks_indicator:
+                # the first and last time bins are always stored
+                time_index = marks_indicator.pop("time_index").to_numpy()
+                time = np.linspace(
+                    marks_indicator.index[0],
+                    marks_indicator.index[-1],
+                    time_index[-1] + 1,
+                )
+            else:  # stored as dense marks, with all of the time bins
+                time = marks_indicator.index.to_numpy()
+            # rows of NaN are bins without spikes
+            marks_indicator = marks_indicator.dropna(how="all")
+            marks_indicators.append(
+                (time, marks_indicator) if return_time else marks_indicator
+            )
+        return marks_indicators
+
+    def fetch_xarray(self, time_slices: list[slice] = None):
+        """Marks in each time bin for all entries, NaN for bins without spikes.
+
+        Parameters
+        ----------
+        time_slices : list[slice], optional
+            Only build the time bins within these slices, concatenated in
+            order. All bins if None.
+
+        Returns
+        -------
+        marks_indicators : xr.DataArray, shape (n_time, n_marks, n_electrodes)
+        """
         # sort_group_electrodes = (
         #     SortGroup.SortGroupElectrode() &
         #     pd.DataFrame(self).to_dict('records'))
@@ -450,7 +669,7 @@ class UnitMarksIndicator(SpyglassMixin, dj.Computed):
             xr.concat(
                 [
                     df.to_xarray().to_array("marks")
-                    for df in self.fetch_dataframe()
+                    for df in self.fetch_dataframe(time_slices=time_slices)
                 ],
                 dim="electrodes",
             )
@@ -598,7 +817,7 @@ class MultiunitFiringRate(SpyglassMixin, dj.Computed):
         # Insert into analysis nwb file
         nwb_analysis_file = AnalysisNwbfile()
         key["analysis_file_name"] = nwb_analysis_file.create(
-            key["nwb_file_name"]
+            key["nwb_file_name"], minimal=True
         )
 
         key[
@@ -710,11 +929,7 @@ def get_decoding_data_for_epoch(
                 **additional_mark_keys,
             }
         )
-    ).fetch_xarray()
-
-    marks = xr.concat(
-        [marks.sel(time=times) for times in valid_slices], dim="time"
-    )
+    ).fetch_xarray(time_slices=valid_slices)
 
     return position_info, marks, valid_slices
 
@@ -140,6 +140,63 @@ def convert_valid_times_to_slice(valid_times: np.ndarray) -> list[slice]:
     return [slice(times[0], times[1]) for times in valid_times]
 
 
+def get_time_bin_indices(
+    event_times: np.ndarray, time: np.ndarray
+) -> np.ndarray:
+    """Finds the time bin of each event, dropping events outside of the bins.
+
+    Parameters
+    ----------
+    event_times : np.ndarray, shape (n_events,)
+    time : np.ndarray, shape (n_time,)
+        Time bins. Events in (time[0], time[-1]] are kept.
+
+    Returns
+    -------
+    bin_indices : np.ndarray, shape (n_kept_events,)
+        Index into `time` of the bin of each kept event.
+
+    """
+    event_times = np.asarray(event_times)
+    event_times = event_times[
+        (event_times > time[0]) & (event_times <= time[-1])
+    ]
+    return np.digitize(event_times, time[1:-1])
+
+
+def convert_time_slices_to_bin_slices(
+    time: np.ndarray, time_slices: list[slice] = None
+) -> list[slice]:
+    """Converts slices of times to slices of indices into the time bins.
+
+    Each slice selects the same bins as `.loc[time_slice]` on a dataframe
+    indexed by `time`, including both ends.
+
+    Parameters
+    ----------
+    time : np.ndarray, shape (n_time,)
+        Sorted time bins.
+    time_slices : list[slice], optional
+        If None, a single slice over all bins is returned.
+
+    Returns
+    -------
+    bin_slices : list[slice]
+
+    """
+    if time_slices is None:
+        return [slice(0, len(time))]
+    bin_slices = []
+    for time_slice in time_slices:
+        start, stop = 0, len(time)
+        if time_slice.start is not None:
+            start = np.searchsorted(time, time_slice.start, side="left")
+        if time_slice.stop is not None:
+            stop = np.searchsorted(time, time_slice.stop, side="right")
+        bin_slices.append(slice(start, stop))
+    return bin_slices
+
+
 def create_model_for_multiple_epochs(
     epoch_names: list[str], env_kwargs: dict
 ) -> tuple[list[ObservationModel], list[Environment], list[list[object]]]:
@@ -32,7 +32,9 @@ from spyglass.common.common_behav import (
     convert_epoch_interval_name_to_position_interval_name,
 )
 from spyglass.decoding.core import (
+    convert_time_slices_to_bin_slices,
     convert_valid_times_to_slice,
+    get_time_bin_indices,
     get_valid_ephys_position_times_by_epoch,
 )
 from spyglass.decoding.dj_decoder_conversion import (
@@ -94,19 +96,6 @@ class SortedSpikesIndicator(SpyglassMixin, dj.Computed):
         if len(spike_times_list) > 0:  # if units
             spikes = np.concatenate(spike_times_list)
 
-            # Bin spikes into time bins
-            spike_indicator = []
-            for spike_times in spikes:
-                spike_times = spike_times[
-                    (spike_times > time[0]) & (spike_times <= time[-1])
-                ]
-                spike_indicator.append(
-                    np.bincount(
-                        np.digitize(spike_times, time[1:-1]),
-                        minlength=time.shape[0],
-                    )
-                )
-
             column_names = np.concatenate(
                 [
                     [
@@ -116,21 +105,31 @@ class SortedSpikesIndicator(SpyglassMixin, dj.Computed):
                     for n_trode in spikes_nwb
                 ]
             )
+            # Store the time bin of each spike, one row per unit, instead of
+            # the dense (n_time, n_units) spike counts, with the first and
+            # last time bins and their number to rebuild the time bins
             spike_indicator = pd.DataFrame(
-                np.stack(spike_indicator, axis=1),
-                index=pd.Index(time, name="time"),
-                columns=column_names,
+                {
+                    "unit_name": column_names,
+                    "time_index": [
+                        get_time_bin_indices(spike_times, time)
+                        for spike_times in spikes
+                    ],
+                    "start_time": time[0],
+                    "end_time": time[-1],
+                    "n_time": len(time),
+                }
             )
 
             # Insert into analysis nwb file
             nwb_analysis_file = AnalysisNwbfile()
             key["analysis_file_name"] = nwb_analysis_file.create(
-                key["nwb_file_name"]
+                key["nwb_file_name"], minimal=True
             )
 
             key["spike_indicator_object_id"] = nwb_analysis_file.add_nwb_object(
                 analysis_file_name=key["analysis_file_name"],
-                nwb_object=spike_indicator.reset_index(),
+                nwb_object=spike_indicator,
             )
 
             nwb_analysis_file.add(
@@ -151,15 +150,64 @@ class SortedSpikesIndicator(SpyglassMixin, dj.Computed):
     def fetch1_dataframe(self):
         return self.fetch_dataframe()[0]
 
-    def fetch_dataframe(self):
+    def fetch_dataframe(self, time_slices: list[slice] = None):
+        """Spike counts in each time bin, one column per unit.
+
+        Parameters
+        ----------
+        time_slices : list[slice], optional
+            Only build the time bins within these slices. All bins if None.
+
+        Returns
+        -------
+        spike_indicator : pd.DataFrame, shape (n_time, n_units)
+        """
         return pd.concat(
             [
-                data["spike_indicator"].set_index("time")
-                for data in self.fetch_nwb()
+                get_spike_indicator_from_bin_indices(
+                    time, spike_bin_indices, time_slices=time_slices
+                )
+                for time, spike_bin_indices in self.fetch_sparse()
             ],
             axis=1,
         )
 
+    def fetch_sparse(self) -> list[tuple[np.ndarray, dict[str, np.ndarray]]]:
+        """Time bins and the time bin of each spike of each unit.
+
+        Returns
+        -------
+        sparse_spike_indicators : list[tuple[np.ndarray, dict[str, np.ndarray]]]
+            For each entry, the time bins, shape (n_time,), and a dictionary of
+            unit names to the index into the time bins of each spike.
+        """
+        sparse_spike_indicators = []
+        for data in self.fetch_nwb():
+            spike_indicator = data["spike_indicator"]
+            if "time" in spike_indicator:  # stored as dense spike counts
+                time = spike_indicator["time"].to_numpy()
+                spike_bin_indices = {
+                    unit_name: np.repeat(np.arange(len(time)), counts)
+                    for unit_name, counts in spike_indicator.drop(
+                        columns="time"
+                    ).items()
+                }
+            else:
+                time = np.linspace(
+                    spike_indicator["start_time"].iloc[0],
+                    spike_indicator["end_time"].iloc[0],
+                    spike_indicator["n_time"].iloc[0],
+                )
+                spike_bin_indices = {
+                    unit_name: np.asarray(time_index, dtype=int)
+                    for unit_name, time_index in zip(
+                        spike_indicator["unit_name"],
+                        spike_indicator["time_index"],
+                    )
+                }
+            sparse_spike_indicators.append((time, spike_bin_indices))
+        return sparse_spike_indicators
+
 
 def make_default_decoding_parameters_cpu():
     classifier_parameters = dict(
@@ -256,8 +304,50 @@ class SortedSpikesClassifierParameters(dj.Manual):
         return restore_classes(super().fetch1(*args, **kwargs))
 
 
+def get_spike_indicator_from_bin_indices(
+    time: np.ndarray,
+    spike_bin_indices: dict[str, np.ndarray],
+    time_slices: list[slice] = None,
+) -> pd.DataFrame:
+    """Counts spikes in each time bin from the time bin of each spike.
+
+    Parameters
+    ----------
+    time : np.ndarray, shape (n_time,)
+        Time bins
+    spike_bin_indices : dict[str, np.ndarray]
+        Unit names and the index into `time` of each spike of the unit.
+    time_slices : list[slice], optional
+        Only count spikes in the time bins within these slices, concatenated
+        in order. All bins if None.
+
+    Returns
+    -------
+    spike_indicator : pd.DataFrame, shape (n_time, n_units)
+    """
+    spike_indicator = []
+    for bin_slice in convert_time_slices_to_bin_slices(time, time_slices):
+        n_bins = max(bin_slice.stop - bin_slice.start, 0)
+        counts = dict()
+        for unit_name, bin_indices in spike_bin_indices.items():
+            bin_indices = bin_indices[
+                (bin_indices >= bin_slice.start)
+                & (bin_indices < bin_slice.stop)
+            ]
+            counts[unit_name] = np.bincount(
+                bin_indices - bin_slice.start, minlength=n_bins
+            )
+        spike_indicator.append(
+            pd.DataFrame(counts, index=pd.Index(time[bin_slice], name="time"))
+        )
+    return pd.concat(spike_indicator)
+
+
 def get_spike_indicator(
-    key: dict, time_range: tuple[float, float], sampling_rate: float = 500.0
+    key: dict,
+    time_range: tuple[float, float],
+    sampling_rate: float = 500.0,
+    time_slices: list[slice] = None,
 ) -> pd.DataFrame:
     """For a given key, returns a dataframe with the spike indicator for each unit
 
@@ -267,6 +357,8 @@ def get_spike_indicator(
     time_range : tuple[float, float]
         Start and end time of the spike indicator
     sampling_rate : float, optional
+    time_slices : list[slice], optional
+        Only return the time bins within these slices, concatenated in order.
 
     Returns
     -------
@@ -277,7 +369,7 @@ def get_spike_indicator(
     n_samples = int(np.ceil((end_time - start_time) * sampling_rate)) + 1
     time = np.linspace(start_time, end_time, n_samples)
 
-    spike_indicator = dict()
+    spike_bin_indices = dict()
     spikes_nwb_table = CuratedSpikeSorting() & key
 
     for n_trode in spikes_nwb_table.fetch_nwb():
@@ -285,21 +377,15 @@ def get_spike_indicator(
             for unit_id, unit_spike_times in n_trode["units"][
                 "spike_times"
             ].items():
-                unit_spike_times = unit_spike_times[
-                    (unit_spike_times > time[0])
-                    & (unit_spike_times <= time[-1])
-                ]
                 unit_name = f'{n_trode["sort_group_id"]:04d}_{unit_id:04d}'
-                spike_indicator[unit_name] = np.bincount(
-                    np.digitize(unit_spike_times, time[1:-1]),
-                    minlength=time.shape[0],
+                spike_bin_indices[unit_name] = get_time_bin_indices(
+                    unit_spike_times, time
                 )
         except KeyError:
             pass
 
-    return pd.DataFrame(
-        spike_indicator,
-        index=pd.Index(time, name="time"),
+    return get_spike_indicator_from_bin_indices(
+        time, spike_bin_indices, time_slices=time_slices
     )
 
 
@@ -357,8 +443,8 @@ def get_decoding_data_for_epoch(
         curated_spikes_key,
         (valid_times.min(), valid_times.max()),
         sampling_rate=500,
+        time_slices=valid_slices,
     )
-    spikes = pd.concat([spikes.loc[times] for times in valid_slices])
 
     # position
     position_info = (
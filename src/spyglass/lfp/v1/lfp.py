@@ -121,7 +121,9 @@ class LFPV1(SpyglassMixin, dj.Computed):
         electrode_id_list = list(k["electrode_id"] for k in electrode_keys)
         electrode_id_list.sort()
 
-        lfp_file_name = AnalysisNwbfile().create(key["nwb_file_name"])
+        lfp_file_name = AnalysisNwbfile().create(
+            key["nwb_file_name"], minimal=True
+        )
 
         lfp_file_abspath = AnalysisNwbfile().get_abs_path(lfp_file_name)
         (
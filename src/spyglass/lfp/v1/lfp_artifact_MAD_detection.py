@@ -1,7 +1,11 @@
+from functools import partial
+from typing import Union
+
 import numpy as np
-from scipy.ndimage import find_objects, label
 from scipy.stats import median_abs_deviation
 
+from spyglass.utils.chunk_helper_fn import run_chunked
+
 
 def mad_artifact_detector(
     recording: None,
@@ -9,6 +13,8 @@ def mad_artifact_detector(
     proportion_above_thresh: float = 0.1,
     removal_window_ms: float = 10.0,
     sampling_frequency: float = 1000.0,
+    chunk_size: Union[int, None] = None,
+    n_jobs: Union[int, None] = 1,
     *args,
     **kwargs,
 ) -> tuple[np.ndarray, np.ndarray]:
@@ -27,6 +33,13 @@ def mad_artifact_detector(
         (window/2 removed on each side of threshold crossing), defaults to 1 ms
     sampling_frequency : float, optional
         Sampling frequency of the recording extractor, defaults to 1000.0
+    chunk_size : int, optional
+        Number of samples thresholded at once. Defaults to None, the whole
+        recording. The median and MAD are always those of the whole recording,
+        which is therefore still loaded into memory at once.
+    n_jobs : int, optional
+        Number of chunks thresholded in parallel. None uses one per CPU.
+        Defaults to 1.
 
     Returns
     -------
@@ -41,8 +54,20 @@ def mad_artifact_detector(
     lfps = np.asarray(recording.data)
 
     mad = median_abs_deviation(lfps, axis=0, nan_policy="omit", scale="normal")
-    is_artifact = _is_above_proportion_thresh(
-        _mad_scale_lfps(lfps, mad), mad_thresh, proportion_above_thresh
+    is_artifact = np.concatenate(
+        run_chunked(
+            partial(
+                _is_artifact_chunk,
+                lfps,
+                np.nanmedian(lfps, axis=0),
+                mad,
+                mad_thresh,
+                proportion_above_thresh,
+            ),
+            len(lfps),
+            chunk_size,
+            n_jobs,
+        )
     )
 
     MILLISECONDS_PER_SECOND = 1000.0
@@ -59,7 +84,34 @@ def mad_artifact_detector(
     return valid_times, artifact_intervals_s
 
 
-def _mad_scale_lfps(lfps: np.ndarray, mad: np.ndarray) -> np.ndarray:
+def _is_artifact_chunk(
+    lfps: np.ndarray,
+    median: np.ndarray,
+    mad: np.ndarray,
+    mad_thresh: float,
+    proportion_above_thresh: float,
+    start: int,
+    stop: int,
+) -> np.ndarray:
+    """Return whether each sample in [start, stop) is an artifact.
+
+    The median and MAD are those of the whole recording, so that chunks can
+    be thresholded independently.
+
+    Returns
+    -------
+    is_artifact : np.ndarray, shape (stop - start,)
+    """
+    return _is_above_proportion_thresh(
+        _mad_scale_lfps(lfps[start:stop], mad, median),
+        mad_thresh,
+        proportion_above_thresh,
+    )
+
+
+def _mad_scale_lfps(
+    lfps: np.ndarray, mad: np.ndarray, median: Union[np.ndarray, None] = None
+) -> np.ndarray:
     """Scale LFPs by median absolute deviation.
 
     Parameters
@@ -68,13 +120,17 @@ def _mad_scale_lfps(lfps: np.ndarray, mad: np.ndarray) -> np.ndarray:
         LFPs to scale
     mad : np.ndarray, shape (n_electrodes,)
         Median absolute deviation of LFPs
+    median : np.ndarray, shape (n_electrodes,), optional
+        Median of LFPs, defaults to the median of `lfps`
 
     Returns
     -------
     mad_scaled_lfps : np.ndarray, shape (n_samples, n_electrodes)
 
     """
-    return np.abs(lfps - np.nanmedian(lfps, axis=0)) / mad
+    if median is None:
+        median = np.nanmedian(lfps, axis=0)
+    return np.abs(lfps - median) / mad
 
 
 def _is_above_proportion_thresh(
@@ -121,13 +177,10 @@ def _get_time_intervals_from_bool_array(
     time_intervals : list[list[float]]
         Time intervals corresponding to the boolean array
     """
-    labels, n_labels = label(bool_array)
+    starts, stops = _get_runs(bool_array)
 
     try:
-        return [
-            timestamps[labels == label_id][[0, -1]]
-            for label_id in range(1, n_labels + 1)
-        ]
+        return list(timestamps[np.stack((starts, stops - 1), axis=1)])
     except IndexError:
         return []
 
@@ -149,23 +202,33 @@ def _extend_array_by_window(
     new_bool_array : np.ndarray, shape (n_samples,)
         Boolean array extended by the window size on each side
     """
-    labels, _ = label(bool_array)
-
     n_samples = len(bool_array)
+    starts, stops = _get_runs(bool_array)
 
-    new_bool_array = np.zeros_like(bool_array)
+    # extend the runs by window_size on each side, within the array
+    starts = np.clip(starts - window_size, 0, n_samples)
+    stops = np.clip(stops + window_size, 0, n_samples)
 
-    for loc in find_objects(labels):
-        start_ind, stop_ind = loc[0].start, loc[0].stop
+    # count the extended runs covering each sample
+    n_runs = np.zeros(n_samples + 1, dtype=np.int64)
+    np.add.at(n_runs, starts, 1)
+    np.add.at(n_runs, stops, -1)
 
-        # extend the interval by window_size on each side
-        start_ind -= window_size
-        stop_ind += window_size
+    return (np.cumsum(n_runs[:-1]) > 0).astype(bool_array.dtype)
 
-        # make sure the interval is within the array
-        start_ind = 0 if start_ind < 0 else start_ind
-        stop_ind = n_samples if stop_ind >= n_samples else stop_ind
 
-        new_bool_array[start_ind:stop_ind] = True
+def _get_runs(bool_array: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Return the start and stop indices of the runs of True.
+
+    Parameters
+    ----------
+    bool_array : np.ndarray, shape (n_samples,)
 
-    return new_bool_array
+    Returns
+    -------
+    starts : np.ndarray, shape (n_runs,)
+    stops : np.ndarray, shape (n_runs,)
+        One past the last index of each run.
+    """
+    edges = np.diff(np.asarray(bool_array, dtype=np.int8), prepend=0, append=0)
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
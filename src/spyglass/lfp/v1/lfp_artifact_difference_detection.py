@@ -1,17 +1,19 @@
 import warnings
-from functools import reduce
+from functools import partial, reduce
 from typing import Union
 
 import numpy as np
-import scipy.signal
 
 from spyglass.common.common_interval import (
     _union_concat,
     interval_from_inds,
     interval_list_intersect,
 )
+from spyglass.utils.chunk_helper_fn import run_chunked
 from spyglass.utils.nwb_helper_fn import get_valid_intervals
 
+WINDOW_BATCH_SIZE = 2**24  # samples of local windows gathered at once
+
 
 def difference_artifact_detector(
     recording: None,
@@ -24,6 +26,8 @@ def difference_artifact_detector(
     local_window_ms: float = 1.0,
     sampling_frequency: float = 1000.0,
     referencing: int = 0,
+    chunk_size: Union[int, None] = None,
+    n_jobs: Union[int, None] = 1,
 ):
     """Detects times during which artifacts do and do not occur.
 
@@ -51,6 +55,12 @@ def difference_artifact_detector(
     removal_window_ms : float, optional
         Width of the window in milliseconds to mask out per artifact (window/2
         removed on each side of threshold crossing), defaults to 1 ms
+    chunk_size : int, optional
+        Number of samples processed at once. Defaults to None, the whole
+        recording. The detected artifacts do not depend on the chunk size.
+    n_jobs : int, optional
+        Number of chunks processed in parallel. None uses one per CPU.
+        Defaults to 1.
 
     Returns
     -------
@@ -69,7 +79,7 @@ def difference_artifact_detector(
         print("referencing activated. may be set to -1")
 
     # valid_timestamps = recording.timestamps
-    valid_timestamps = timestamps
+    valid_timestamps = np.asarray(timestamps)
 
     local_window = int(local_window_ms / 2)
 
@@ -95,75 +105,33 @@ def difference_artifact_detector(
         proportion_above_thresh_2nd,
     )
 
-    # want to detect frames without parallel processing
     # compute the number of electrodes that have to be above threshold
     nelect_above_1st = np.ceil(proportion_above_thresh_1st * recording.shape[1])
     nelect_above_2nd = np.ceil(proportion_above_thresh_2nd * recording.shape[1])
     print("num tets 1", nelect_above_1st, "num tets 2", nelect_above_2nd)
     print("data shape", recording.shape)
 
-    # find the artifact occurrences using one or both thresholds, across
-    # channels
-
-    if amplitude_thresh_1st is not None:
-        # first find times with large amp change: sum diff over several timebins
-
-        diff_array = np.diff(recording, axis=0)
-        window = np.ones((3, 1)) if referencing else np.ones((15, 1))
-
-        # sum differences over bins using convolution for speed
-        width = int((window.size - 1) / 2)
-        diff_array = np.pad(
-            diff_array,
-            pad_width=((width, width), (0, 0)),
-            mode="constant",
-        )
-        diff_array_5 = scipy.signal.convolve(diff_array, window, mode="valid")
-
-        artifact_times_all_5 = np.sum(
-            (np.abs(diff_array_5) > amplitude_thresh_1st), axis=1
-        )
-
-        above_thresh_1st = np.where(artifact_times_all_5 >= nelect_above_1st)[0]
-
-        # second, find artifacts with large baseline change
-        print("thresh", amplitude_thresh_2nd, "window", local_window)
-
-        big_artifacts = np.zeros(
-            (recording.shape[1], above_thresh_1st.shape[0])
-        )
-        for art_count in np.arange(above_thresh_1st.shape[0]):
-            if above_thresh_1st[art_count] <= local_window:
-                local_min = local_max = above_thresh_1st[art_count]
-            else:
-                local_max = np.max(
-                    recording[
-                        above_thresh_1st[art_count]
-                        - local_window : above_thresh_1st[art_count]
-                        + local_window,
-                        :,
-                    ],
-                    axis=0,
-                )
-                local_min = np.min(
-                    recording[
-                        above_thresh_1st[art_count]
-                        - local_window : above_thresh_1st[art_count]
-                        + local_window,
-                        :,
-                    ],
-                    axis=0,
-                )
-            big_artifacts[:, art_count] = (
-                np.abs(local_max - local_min) > amplitude_thresh_2nd
-            )
-
-        # sum columns in big artficat, then compare to nelect_above_2nd
-        above_thresh = above_thresh_1st[
-            np.sum(big_artifacts, axis=0) >= nelect_above_2nd
-        ]
-
-    artifact_frames = above_thresh.copy()
+    # find the artifact occurrences using both thresholds, across channels.
+    # Differences are summed over 3 bins when referenced, 15 otherwise.
+    half_width = 1 if referencing else 7
+    print("thresh", amplitude_thresh_2nd, "window", local_window)
+
+    artifact_frames = run_chunked(
+        partial(
+            _get_artifact_frames,
+            recording,
+            amplitude_thresh_1st=amplitude_thresh_1st,
+            amplitude_thresh_2nd=amplitude_thresh_2nd,
+            nelect_above_1st=nelect_above_1st,
+            nelect_above_2nd=nelect_above_2nd,
+            half_width=half_width,
+            local_window=local_window,
+        ),
+        len(recording) - 1,  # one difference per pair of samples
+        chunk_size,
+        n_jobs,
+    )
+    artifact_frames = np.concatenate(artifact_frames)
     print("detected ", artifact_frames.shape[0], " artifacts")
 
     # Convert to s to remove from either side of each detected artifact
@@ -178,17 +146,14 @@ def difference_artifact_detector(
         return recording_interval, artifact_times_empty
 
     artifact_intervals = interval_from_inds(artifact_frames)
-
-    artifact_intervals_s = np.zeros(
-        (len(artifact_intervals), 2), dtype=np.float64
-    )
-
-    for interval_idx, interval in enumerate(artifact_intervals):
-        artifact_intervals_s[interval_idx] = [
-            valid_timestamps[interval[0]] - half_removal_window_s,
-            valid_timestamps[interval[1]] + half_removal_window_s,
-        ]
-    artifact_intervals_s = reduce(_union_concat, artifact_intervals_s)
+    artifact_intervals_s = np.stack(
+        (
+            valid_timestamps[artifact_intervals[:, 0]] - half_removal_window_s,
+            valid_timestamps[artifact_intervals[:, 1]] + half_removal_window_s,
+        ),
+        axis=1,
+    ).astype(np.float64)
+    artifact_intervals_s = _union_sorted_intervals(artifact_intervals_s)
 
     valid_intervals = get_valid_intervals(
         valid_timestamps, sampling_frequency, 1.5, 0.000001
@@ -199,27 +164,143 @@ def difference_artifact_detector(
         valid_intervals, artifact_intervals_s
     )
 
-    # note: this is a slow step
-    list_triggers = []
-    for interval in artifact_valid_times:
-        list_triggers.append(
-            np.arange(
-                np.searchsorted(valid_timestamps, interval[0]),
-                np.searchsorted(valid_timestamps, interval[1]),
-            )
-        )
-
-    new_array = np.array(np.concatenate(list_triggers))
-
-    new_timestamps = np.delete(valid_timestamps, new_array)
+    # mark the samples in [start, stop) of each artifact interval
+    is_artifact = np.zeros(len(valid_timestamps) + 1, dtype=np.int64)
+    artifact_valid_times = np.asarray(artifact_valid_times).reshape(-1, 2)
+    np.add.at(
+        is_artifact,
+        np.searchsorted(valid_timestamps, artifact_valid_times[:, 0]),
+        1,
+    )
+    np.add.at(
+        is_artifact,
+        np.searchsorted(valid_timestamps, artifact_valid_times[:, 1]),
+        -1,
+    )
+    is_artifact = np.cumsum(is_artifact[:-1]) > 0
 
     artifact_removed_valid_times = get_valid_intervals(
-        new_timestamps, sampling_frequency, 1.5, 0.000001
+        valid_timestamps[~is_artifact], sampling_frequency, 1.5, 0.000001
     )
 
     return artifact_removed_valid_times, artifact_intervals_s
 
 
+def _get_artifact_frames(
+    recording,
+    start,
+    stop,
+    amplitude_thresh_1st,
+    amplitude_thresh_2nd,
+    nelect_above_1st,
+    nelect_above_2nd,
+    half_width,
+    local_window,
+):
+    """Finds the artifact frames in [start, stop) of the recording.
+
+    A frame is an artifact if the change in amplitude summed over
+    2 * half_width + 1 differences around it exceeds amplitude_thresh_1st on
+    nelect_above_1st channels, and the range of the recording over
+    [frame - local_window, frame + local_window) exceeds amplitude_thresh_2nd
+    on nelect_above_2nd channels. The range is 0 for the first local_window
+    frames.
+
+    Only the samples of the chunk and its margins are read, so that chunks
+    can be processed independently.
+
+    Returns
+    -------
+    artifact_frames : np.ndarray, shape (n_artifact_frames,)
+    """
+    n_samples = len(recording)
+    margin = max(half_width + 1, local_window)
+    chunk_start = max(start - margin, 0)
+    chunk = np.asarray(recording[chunk_start : min(stop + margin, n_samples)])
+
+    # differences summed over the window, with zeros past the recording ends.
+    # Differences are taken in the data type of the recording, as np.diff
+    # does on the whole recording.
+    diff_array = np.diff(chunk, axis=0)
+    first = max(start - half_width, 0)
+    last = min(stop + half_width, n_samples - 1)
+    # integer differences are summed exactly with a cumulative sum, others
+    # by adding the shifted differences
+    is_integer = np.issubdtype(diff_array.dtype, np.integer)
+    padded = np.zeros(
+        (stop - start + 2 * half_width + 1, chunk.shape[1]),
+        dtype=np.int64 if is_integer else np.float64,
+    )
+    padded[
+        first - start + half_width + 1 : last - start + half_width + 1
+    ] = diff_array[first - chunk_start : last - chunk_start]
+    if is_integer:
+        np.cumsum(padded, axis=0, out=padded)
+        diff_sum = padded[2 * half_width + 1 :] - padded[: stop - start]
+    else:
+        diff_sum = padded[1 : stop - start + 1].copy()
+        for offset in range(2, 2 * half_width + 2):
+            diff_sum += padded[offset : offset + stop - start]
+
+    n_above_1st = np.sum(np.abs(diff_sum) > amplitude_thresh_1st, axis=1)
+    frames = start + np.flatnonzero(n_above_1st >= nelect_above_1st)
+    if len(frames) == 0:
+        return frames
+
+    # second, find artifacts with large baseline change
+    is_windowed = frames > local_window
+    n_above_2nd = np.full(
+        len(frames), chunk.shape[1] if 0 > amplitude_thresh_2nd else 0
+    )
+    # max and min over [frame - local_window, frame + local_window),
+    # truncated at the end of the recording, for a batch of frames at a time
+    rows = frames[is_windowed] - chunk_start
+    offsets = np.arange(-local_window, local_window)
+    batch_size = max(
+        WINDOW_BATCH_SIZE // max(len(offsets) * chunk.shape[1], 1), 1
+    )
+    n_windowed = np.zeros(len(rows), dtype=n_above_2nd.dtype)
+    for batch_start in range(0, len(rows), batch_size):
+        batch = np.s_[batch_start : batch_start + batch_size]
+        windows = chunk[
+            np.minimum(rows[batch, np.newaxis] + offsets, len(chunk) - 1)
+        ]
+        local_max = np.max(windows, axis=1)
+        local_min = np.min(windows, axis=1)
+        n_windowed[batch] = np.sum(
+            np.abs(local_max - local_min) > amplitude_thresh_2nd, axis=1
+        )
+    n_above_2nd[is_windowed] = n_windowed
+
+    return frames[n_above_2nd >= nelect_above_2nd]
+
+
+def _union_sorted_intervals(intervals):
+    """Unions intervals sorted by start and stop, as reduce(_union_concat).
+
+    Returns
+    -------
+    intervals : np.ndarray, shape (n_intervals, 2), or (2,) if there is one
+    """
+    starts, stops = intervals[:, 0], intervals[:, 1]
+    if not (
+        np.all(stops > starts)
+        and np.all(np.diff(starts) >= 0)
+        and np.all(np.diff(stops) >= 0)
+    ):
+        return reduce(_union_concat, intervals)
+    if len(intervals) == 1:
+        return intervals[0]
+
+    # an interval starts a new union unless it overlaps the previous one
+    new_union = np.ones(len(intervals), dtype=bool)
+    new_union[1:] = starts[1:] >= stops[:-1]
+    union_first = np.flatnonzero(new_union)
+    union_last = np.append(union_first[1:], len(intervals)) - 1
+
+    return np.stack((starts[union_first], stops[union_last]), axis=1)
+
+
 def _check_artifact_thresholds(
     amplitude_thresh_1st,
     amplitude_thresh_2nd,
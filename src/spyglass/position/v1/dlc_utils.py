@@ -8,8 +8,6 @@ import pwd
 import subprocess
 from collections import abc
 from contextlib import redirect_stdout
-from itertools import groupby
-from operator import itemgetter
 from typing import Union
 
 import datajoint as dj
@@ -650,27 +648,162 @@ def get_gpu_memory():
 
 
 def get_span_start_stop(indices):
-    """_summary_
+    """Get the start and stop of each span of consecutive indices.
 
     Parameters
     ----------
-    indices : _type_
-        _description_
+    indices : array_like
+        Sorted indices, e.g. of NaN samples.
 
     Returns
     -------
-    _type_
-        _description_
+    list of tuple
+        (start, stop) index of each span, both inclusive.
     """
-    span_inds = []
-    # Get start and stop index of spans of consecutive indices
-    for k, g in groupby(enumerate(indices), lambda x: x[1] - x[0]):
-        group = list(map(itemgetter(1), g))
-        span_inds.append((group[0], group[-1]))
-    return span_inds
+    indices = np.asarray(indices)
+    if indices.size == 0:
+        return []
+    # run-length encode: a span ends wherever the next index is not +1
+    breaks = np.flatnonzero(np.diff(indices) != 1)
+    starts = indices[np.concatenate(([0], breaks + 1))]
+    stops = indices[np.concatenate((breaks, [indices.size - 1]))]
+    return list(zip(starts.tolist(), stops.tolist()))
 
 
 def interp_pos(dlc_df, spans_to_interp, **kwargs):
+    """Linearly interpolate x and y across spans of samples.
+
+    Each span is interpolated from the sample before it to the sample after
+    it. Spans at the start or end of the data, and spans whose endpoints are
+    more than max_cm_to_interp apart, are set to NaN instead.
+
+    Parameters
+    ----------
+    dlc_df : pd.DataFrame
+        Position with 'x' and 'y' columns, indexed by time. Modified in place.
+    spans_to_interp : list of tuple
+        (start, stop) integer index of each span, both inclusive, as returned
+        by get_span_start_stop.
+    max_pts_to_interp : int, optional
+        Spans longer than this are reported.
+    max_cm_to_interp : float, optional
+        Spans whose endpoints are further apart than this are set to NaN.
+
+    Returns
+    -------
+    pd.DataFrame
+        dlc_df with interpolated x and y.
+    """
+    if len(spans_to_interp) == 0:
+        return dlc_df
+    time = dlc_df.index.to_numpy()
+    if not np.all(np.diff(time) > 0):
+        return _interp_pos_by_span(dlc_df, spans_to_interp, **kwargs)
+
+    spans = np.asarray(spans_to_interp, dtype=int).reshape(-1, 2)
+    span_start, span_stop = spans[:, 0], spans[:, 1]
+    span_len = span_stop - span_start + 1
+    no_stop = (span_stop + 1) >= len(dlc_df)
+    no_start = ~no_stop & (span_start < 1)
+    too_long = np.zeros(len(spans), dtype=bool)
+    if "max_pts_to_interp" in kwargs:
+        too_long = (
+            ~no_stop & ~no_start & (span_len > kwargs["max_pts_to_interp"])
+        )
+
+    # These spans are set to NaN by time label, treating the integer span
+    # start and stop as times, which matches no samples unless time starts
+    # near zero. Only handle them in bulk if they match no samples.
+    label_nan = no_stop | no_start | too_long
+    label_rows = np.searchsorted(
+        time, span_stop[label_nan], side="right"
+    ) - np.searchsorted(time, span_start[label_nan], side="left")
+    if np.any(label_rows > 0):
+        return _interp_pos_by_span(dlc_df, spans_to_interp, **kwargs)
+
+    # (span, order, message) of each span not interpolated, printed in order
+    messages = []
+    for ind in np.flatnonzero(label_nan):
+        if no_stop[ind]:
+            message = f"ind: {ind} has no endpoint with which to interpolate"
+        elif no_start[ind]:
+            message = f"ind: {ind} has no startpoint with which to interpolate"
+        else:
+            message = (
+                f"inds {span_start[ind]} to {span_stop[ind]} "
+                f"length: {span_len[ind]} not interpolated"
+            )
+        messages.append((ind, 0, message))
+
+    x = dlc_df["x"].to_numpy(dtype=float, copy=True)
+    y = dlc_df["y"].to_numpy(dtype=float, copy=True)
+    span_ind = np.flatnonzero(~no_stop & ~no_start)
+    span_start, span_stop = span_start[span_ind], span_stop[span_ind]
+    x_ends = np.stack((x[span_start - 1], x[span_stop + 1]), axis=1)
+    y_ends = np.stack((y[span_start - 1], y[span_stop + 1]), axis=1)
+
+    too_far = np.zeros(len(span_start), dtype=bool)
+    if "max_cm_to_interp" in kwargs:
+        change = np.linalg.norm(
+            np.stack(
+                (x_ends[:, 0] - x_ends[:, 1], y_ends[:, 0] - y_ends[:, 1]),
+                axis=1,
+            ),
+            axis=1,
+        )
+        too_far = change > kwargs["max_cm_to_interp"]
+        for ind in np.flatnonzero(too_far):
+            messages.append(
+                (
+                    span_ind[ind],
+                    1,
+                    f"inds {span_start[ind]} to {span_stop[ind] + 1} with "
+                    + f"change in position: {change[ind]:.2f} not interpolated",
+                )
+            )
+    for *_, message in sorted(messages):
+        print(message)
+
+    rows = _span_rows(span_start[too_far], span_stop[too_far])
+    x[rows] = np.nan
+    y[rows] = np.nan
+
+    # One np.interp call with the start and stop times of all interpolated
+    # spans as sample points. Between the start and stop of a span this is the
+    # same as interpolating that span alone; at each stop it returns the value
+    # after the span, as np.interp does for the last sample point.
+    span_start, span_stop = span_start[~too_far], span_stop[~too_far]
+    x_ends, y_ends = x_ends[~too_far], y_ends[~too_far]
+    rows = _span_rows(span_start, span_stop)
+    if len(rows):
+        xp = np.stack((time[span_start], time[span_stop]), axis=1).ravel()
+        for values, ends in ((x, x_ends), (y, y_ends)):
+            values[rows] = np.interp(time[rows], xp, ends.ravel())
+            values[span_stop] = ends[:, 1]
+
+    dlc_df["x"] = x
+    dlc_df["y"] = y
+    return dlc_df
+
+
+def _span_rows(span_start, span_stop):
+    """Integer index of every sample in the given spans, stops inclusive."""
+    span_len = span_stop - span_start + 1
+    if not len(span_len):
+        return np.array([], dtype=int)
+    offsets = np.arange(span_len.sum()) - np.repeat(
+        np.cumsum(span_len) - span_len, span_len
+    )
+    return np.repeat(span_start, span_len) + offsets
+
+
+def _interp_pos_by_span(dlc_df, spans_to_interp, **kwargs):
+    """Interpolate each span in turn, as `interp_pos`.
+
+    Used when spans at the edges of the data or longer than
+    max_pts_to_interp select samples by time, so that later spans can
+    depend on earlier ones, or when time is not strictly increasing.
+    """
     idx = pd.IndexSlice
     for ind, (span_start, span_stop) in enumerate(spans_to_interp):
         if (span_stop + 1) >= len(dlc_df):
@@ -733,15 +866,13 @@ def smooth_moving_avg(
 ):
     import bottleneck as bn
 
-    idx = pd.IndexSlice
     moving_avg_window = int(np.round(smoothing_duration * sampling_rate))
-    xy_arr = interp_df.loc[:, idx[("x", "y")]].values
+    xy_arr = interp_df[["x", "y"]].to_numpy()
     smoothed_xy_arr = bn.move_mean(
         xy_arr, window=moving_avg_window, axis=0, min_count=1
     )
-    interp_df.loc[:, idx["x"]], interp_df.loc[:, idx["y"]] = [
-        *zip(*smoothed_xy_arr.tolist())
-    ]
+    interp_df["x"] = smoothed_xy_arr[:, 0]
+    interp_df["y"] = smoothed_xy_arr[:, 1]
     return interp_df
 
 
@@ -293,7 +293,9 @@ class DLCCentroid(SpyglassMixin, dj.Computed):
                 comments="no comments",
             )
             # Add to Analysis NWB file
-            analysis_file_name = AnalysisNwbfile().create(key["nwb_file_name"])
+            analysis_file_name = AnalysisNwbfile().create(
+                key["nwb_file_name"], minimal=True
+            )
             nwb_analysis_file = AnalysisNwbfile()
             key.update(
                 {
@@ -130,7 +130,7 @@ class DLCOrientation(SpyglassMixin, dj.Computed):
             orientation, columns=["orientation"], index=pos_df.index
         )
         key["analysis_file_name"] = AnalysisNwbfile().create(
-            key["nwb_file_name"]
+            key["nwb_file_name"], minimal=True
         )
         spatial_series = (RawPosition() & key).fetch_nwb()[0]["raw_position"]
         orientation = pynwb.behavior.CompassDirection()
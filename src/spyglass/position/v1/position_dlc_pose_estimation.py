@@ -279,7 +279,7 @@ class DLCPoseEstimation(dj.Computed):
                 )
                 key["bodypart"] = body_part
                 key["analysis_file_name"] = AnalysisNwbfile().create(
-                    key["nwb_file_name"]
+                    key["nwb_file_name"], minimal=True
                 )
                 position = pynwb.behavior.Position()
                 likelihood = pynwb.behavior.BehavioralTimeSeries()
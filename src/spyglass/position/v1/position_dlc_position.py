@@ -219,7 +219,7 @@ class DLCSmoothInterp(SpyglassMixin, dj.Computed):
                 .get_spatial_series()
             )
             key["analysis_file_name"] = AnalysisNwbfile().create(
-                key["nwb_file_name"]
+                key["nwb_file_name"], minimal=True
             )
             # Add dataframe to AnalysisNwbfile
             nwb_analysis_file = AnalysisNwbfile()
@@ -305,88 +305,82 @@ def nan_inds(
     likelihood_thresh: float,
     inds_to_span: int,
 ):
+    """NaN samples below the likelihood threshold and samples that jump.
+
+    Within each good span (see get_good_spans), starting from its middle good
+    sample and moving outwards in both directions, a sample is a jump if its x
+    or y is more than max_dist_between from the last sample that was not.
+    If every sample is below the likelihood threshold, all samples are bad.
+
+    Returns
+    -------
+    dlc_df : pd.DataFrame
+        dlc_df with x and y set to NaN for bad samples.
+    bad_inds_mask : np.ndarray
+        Boolean mask of the bad samples.
+    """
     idx = pd.IndexSlice
 
     # Could either NaN sub-likelihood threshold inds here and then not consider
     # in jumping... OR just keep in back pocket when checking jumps against
     # last good point
 
-    subthresh_inds = get_subthresh_inds(
-        dlc_df, likelihood_thresh=likelihood_thresh
-    )
-    df_subthresh_indices = dlc_df.index[subthresh_inds]
-    dlc_df.loc[idx[df_subthresh_indices], idx[("x", "y")]] = np.nan
+    subthresh_inds_mask = _get_subthresh_mask(dlc_df, likelihood_thresh)
+    dlc_df.loc[subthresh_inds_mask, idx[("x", "y")]] = np.nan
 
     # To further determine which indices are the original point and which are
-    # jump points. There could be a more efficient method of doing this screen
-    # inds for jumps to baseline
-
-    subthresh_inds_mask = np.zeros(len(dlc_df), dtype=bool)
-    subthresh_inds_mask[subthresh_inds] = True
+    # jump points.
     jump_inds_mask = np.zeros(len(dlc_df), dtype=bool)
     _, good_spans = get_good_spans(
         subthresh_inds_mask, inds_to_span=inds_to_span
     )
 
-    for span in good_spans[::-1]:
-        if np.sum(np.isnan(dlc_df.iloc[span[0] : span[-1]].x)) > 0:
-            nan_mask = np.isnan(dlc_df.iloc[span[0] : span[-1]].x)
-            good_start = np.arange(span[0], span[1])[~nan_mask]
-            start_point = good_start[int(len(good_start) // 2)]
-        else:
-            start_point = span[0] + int(span_length(span) // 2)
-        for ind in range(start_point, span[0], -1):
-            if subthresh_inds_mask[ind]:
+    # x is NaN exactly where the likelihood is below threshold, so the good
+    # samples are the complement of subthresh_inds_mask
+    good_inds = np.flatnonzero(~subthresh_inds_mask)
+    x = dlc_df["x"].to_numpy().tolist()
+    y = dlc_df["y"].to_numpy().tolist()
+    is_subthresh = subthresh_inds_mask.tolist()
+    is_jump = [False] * len(dlc_df)
+
+    def is_jump_from(ind, last_good_ind):
+        good_x, good_y = x[last_good_ind], y[last_good_ind]
+        return (
+            (y[ind] < int(good_y - max_dist_between))
+            | (y[ind] > int(good_y + max_dist_between))
+        ) | (
+            (x[ind] < int(good_x - max_dist_between))
+            | (x[ind] > int(good_x + max_dist_between))
+        )
+
+    for span_start, span_stop in good_spans[::-1]:
+        # middle good sample of [span_start, span_stop)
+        first_good = np.searchsorted(good_inds, span_start)
+        n_good = np.searchsorted(good_inds, span_stop) - first_good
+        start_point = int(good_inds[first_good + n_good // 2])
+
+        # Compare each sample to the nearest good, non-jump sample between it
+        # and the start point, walking outwards from the start point.
+        last_good_ind = start_point
+        for ind in range(start_point, span_start, -1):
+            if is_subthresh[ind]:
                 continue
-            previous_good_inds = np.where(
-                np.logical_and(
-                    ~np.isnan(dlc_df.iloc[ind + 1 : start_point].x),
-                    ~jump_inds_mask[ind + 1 : start_point],
-                    ~subthresh_inds_mask[ind + 1 : start_point],
-                )
-            )[0]
-            if len(previous_good_inds) >= 1:
-                last_good_ind = ind + 1 + np.min(previous_good_inds)
-            else:
-                last_good_ind = start_point
-            good_x, good_y = dlc_df.loc[
-                idx[dlc_df.index[last_good_ind]], ["x", "y"]
-            ]
-            if (
-                (dlc_df.y.iloc[ind] < int(good_y - max_dist_between))
-                | (dlc_df.y.iloc[ind] > int(good_y + max_dist_between))
-            ) | (
-                (dlc_df.x.iloc[ind] < int(good_x - max_dist_between))
-                | (dlc_df.x.iloc[ind] > int(good_x + max_dist_between))
-            ):
-                jump_inds_mask[ind] = True
-        for ind in range(start_point, span[-1], 1):
-            if subthresh_inds_mask[ind]:
+            if is_jump_from(ind, last_good_ind):
+                is_jump[ind] = True
+            elif not is_jump[ind] and ind != start_point:
+                last_good_ind = ind
+        last_good_ind = start_point
+        for ind in range(start_point, span_stop, 1):
+            if is_subthresh[ind]:
                 continue
-            previous_good_inds = np.where(
-                np.logical_and(
-                    ~np.isnan(dlc_df.iloc[start_point:ind].x),
-                    ~jump_inds_mask[start_point:ind],
-                    ~subthresh_inds_mask[start_point:ind],
-                )
-            )[0]
-            if len(previous_good_inds) >= 1:
-                last_good_ind = start_point + np.max(previous_good_inds)
-            else:
-                last_good_ind = start_point
-            good_x, good_y = dlc_df.loc[
-                idx[dlc_df.index[last_good_ind]], ["x", "y"]
-            ]
-            if (
-                (dlc_df.y.iloc[ind] < int(good_y - max_dist_between))
-                | (dlc_df.y.iloc[ind] > int(good_y + max_dist_between))
-            ) | (
-                (dlc_df.x.iloc[ind] < int(good_x - max_dist_between))
-                | (dlc_df.x.iloc[ind] > int(good_x + max_dist_between))
-            ):
-                jump_inds_mask[ind] = True
-        bad_inds_mask = np.logical_or(jump_inds_mask, subthresh_inds_mask)
-        dlc_df.loc[bad_inds_mask, idx[("x", "y")]] = np.nan
+            if is_jump_from(ind, last_good_ind):
+                is_jump[ind] = True
+            elif not is_jump[ind]:
+                last_good_ind = ind
+
+    jump_inds_mask[:] = is_jump
+    bad_inds_mask = np.logical_or(jump_inds_mask, subthresh_inds_mask)
+    dlc_df.loc[bad_inds_mask, idx[("x", "y")]] = np.nan
     return dlc_df, bad_inds_mask
 
 
@@ -419,47 +413,69 @@ def get_good_spans(bad_inds_mask, inds_to_span: int = 50):
     good_spans = get_span_start_stop(
         np.arange(len(bad_inds_mask))[~bad_inds_mask]
     )
-    if len(good_spans) > 1:
-        modified_spans = []
-        for (start1, stop1), (start2, stop2) in zip(
-            good_spans[:-1], good_spans[1:]
-        ):
-            check_existing = [
-                entry
-                for entry in modified_spans
-                if start1
-                in range(entry[0] - inds_to_span, entry[1] + inds_to_span)
-            ]
-            if len(check_existing) > 0:
-                modify_ind = modified_spans.index(check_existing[0])
-                if (start2 - stop1) <= inds_to_span:
-                    modified_spans[modify_ind] = (check_existing[0][0], stop2)
-                else:
-                    modified_spans[modify_ind] = (check_existing[0][0], stop1)
-                    modified_spans.append((start2, stop2))
-                continue
+    if len(good_spans) <= 1:
+        return None, good_spans
+    if inds_to_span < 1:
+        return good_spans, _bridge_good_spans(good_spans, inds_to_span)
+
+    # merge runs of spans separated by at most inds_to_span
+    starts, stops = np.asarray(good_spans).T
+    is_new_span = np.concatenate(
+        ([True], starts[1:] - stops[:-1] > inds_to_span)
+    )
+    is_last_span = np.concatenate((is_new_span[1:], [True]))
+    modified_spans = list(
+        zip(starts[is_new_span].tolist(), stops[is_last_span].tolist())
+    )
+    return good_spans, modified_spans
+
+
+def _bridge_good_spans(good_spans, inds_to_span):
+    """Bridge good spans pair by pair, as get_good_spans.
+
+    For inds_to_span >= 1 this merges runs of spans separated by at most
+    inds_to_span, which get_good_spans does directly. Smaller values can
+    leave repeated spans, so they use this loop.
+    """
+    modified_spans = []
+    for (start1, stop1), (start2, stop2) in zip(
+        good_spans[:-1], good_spans[1:]
+    ):
+        check_existing = [
+            entry
+            for entry in modified_spans
+            if start1 in range(entry[0] - inds_to_span, entry[1] + inds_to_span)
+        ]
+        if len(check_existing) > 0:
+            modify_ind = modified_spans.index(check_existing[0])
             if (start2 - stop1) <= inds_to_span:
-                modified_spans.append((start1, stop2))
+                modified_spans[modify_ind] = (check_existing[0][0], stop2)
             else:
-                modified_spans.append((start1, stop1))
+                modified_spans[modify_ind] = (check_existing[0][0], stop1)
                 modified_spans.append((start2, stop2))
-        return good_spans, modified_spans
-    else:
-        return None, good_spans
+            continue
+        if (start2 - stop1) <= inds_to_span:
+            modified_spans.append((start1, stop2))
+        else:
+            modified_spans.append((start1, stop1))
+            modified_spans.append((start2, stop2))
+    return modified_spans
 
 
 def span_length(x):
     return x[-1] - x[0]
 
 
+def _get_subthresh_mask(dlc_df: pd.DataFrame, likelihood_thresh: float):
+    """Mask of samples below the likelihood threshold or with NaN x."""
+    return (dlc_df["likelihood"].to_numpy() < likelihood_thresh) | np.isnan(
+        dlc_df["x"].to_numpy()
+    )
+
+
 def get_subthresh_inds(dlc_df: pd.DataFrame, likelihood_thresh: float):
-    df_filter = dlc_df["likelihood"] < likelihood_thresh
-    sub_thresh_inds = np.where(
-        ~np.isnan(dlc_df["likelihood"].where(df_filter))
-    )[0]
-    nand_inds = np.where(np.isnan(dlc_df["x"]))[0]
-    all_nan_inds = list(set(sub_thresh_inds).union(set(nand_inds)))
-    all_nan_inds.sort()
     # TODO: add option to return sub_thresh_percent
     # sub_thresh_percent = (len(sub_thresh_inds) / len(dlc_df)) * 100
-    return all_nan_inds
+    return np.flatnonzero(
+        _get_subthresh_mask(dlc_df, likelihood_thresh)
+    ).tolist()
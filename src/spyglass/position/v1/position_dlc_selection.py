@@ -112,7 +112,7 @@ class DLCPosV1(SpyglassMixin, dj.Computed):
 
         # Add to Analysis NWB file
         key["analysis_file_name"] = AnalysisNwbfile().create(
-            key["nwb_file_name"]
+            key["nwb_file_name"], minimal=True
         )
         nwb_analysis_file = AnalysisNwbfile()
         key["orientation_object_id"] = nwb_analysis_file.add_nwb_object(
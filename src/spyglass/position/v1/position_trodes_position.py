@@ -161,7 +161,9 @@ class TrodesPosV1(SpyglassMixin, dj.Computed):
         print(f"Computing position for: {key}")
         orig_key = copy.deepcopy(key)
 
-        analysis_file_name = AnalysisNwbfile().create(key["nwb_file_name"])
+        analysis_file_name = AnalysisNwbfile().create(
+            key["nwb_file_name"], minimal=True
+        )
 
         raw_position = RawPosition.PosObject & key
         spatial_series = raw_position.fetch_nwb()[0]["raw_position"]
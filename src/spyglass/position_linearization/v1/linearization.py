@@ -122,7 +122,7 @@ class LinearizedPositionV1(SpyglassMixin, dj.Computed):
             {"merge_id": key["pos_merge_id"]}
         )[0]
         key["analysis_file_name"] = AnalysisNwbfile().create(
-            position_nwb["nwb_file_name"]
+            position_nwb["nwb_file_name"], minimal=True
         )
         position = np.asarray(
             position_nwb["position"].get_spatial_series().data
@@ -185,7 +185,9 @@ class RippleTimesV1(SpyglassMixin, dj.Computed):
         )
         # Insert into analysis nwb file
         nwb_analysis_file = AnalysisNwbfile()
-        key["analysis_file_name"] = nwb_analysis_file.create(nwb_file_name)
+        key["analysis_file_name"] = nwb_analysis_file.create(
+            nwb_file_name, minimal=True
+        )
         key["ripple_times_object_id"] = nwb_analysis_file.add_nwb_object(
             analysis_file_name=key["analysis_file_name"],
             nwb_object=ripple_times,
@@ -1,4 +1,4 @@
-from typing import Dict, List, Union
+from typing import List, Union
 
 import numpy as np
 import spikeinterface as si
@@ -13,57 +13,43 @@ class MergedSortingExtractor(si.BaseSorting):
     def __init__(
         self, *, parent_sorting: si.BaseSorting, merge_groups: List[List[int]]
     ):
+        # the representative unit_id of a merge group is the min in the group;
+        # its spike train is the union of the spike trains of the group
+        merged_unit_ids = {}
+        for merge_group in merge_groups:
+            merged_unit_ids[min(merge_group)] = list(merge_group)
+        used_unit_ids = {
+            unit_id for merge_group in merge_groups for unit_id in merge_group
+        }
+        # Now we'll take care of all of the unit_ids that are not part of a merge group
+        for unit_id in parent_sorting.get_unit_ids():
+            if unit_id not in used_unit_ids:
+                merged_unit_ids[unit_id] = [unit_id]
+        final_unit_ids = sorted(merged_unit_ids)
+
         # Loop through the sorting segments in the original sorting
         # and add merged versions to the new sorting
         sorting_segment_list = []
-        final_unit_ids = []  # TODO: not sure what final_unit_ids is used for
         # Note: sorting_segments should be exposed in spikeinterface
         for sorting_segment in parent_sorting._sorting_segments:
-            # initialize the new sorting segment
-            new_sorting_segment = MergedSortingSegment()
-            # keep track of which unit_ids are part of the merge groups
-            used_unit_ids = []
-            # first loop through the merge groups
-            for merge_group in merge_groups:
-                # the representative unit_id is the min in the group
-                representative_unit_id = min(merge_group)
-                if representative_unit_id not in final_unit_ids:
-                    final_unit_ids.append(representative_unit_id)
-                # we are going to take the union of all the spike trains for the merge group
-                spike_trains_to_concatenate = []
-                for unit_id in merge_group:
-                    spike_trains_to_concatenate.append(
-                        sorting_segment.get_unit_spike_train(
-                            unit_id, start_frame=None, end_frame=None
-                        )
+            spike_trains = [
+                np.sort(
+                    np.concatenate(
+                        [
+                            sorting_segment.get_unit_spike_train(
+                                unit_id, start_frame=None, end_frame=None
+                            )
+                            for unit_id in merged_unit_ids[final_unit_id]
+                        ]
                     )
-                    # append this unit_id to the used unit_ids
-                    used_unit_ids.append(unit_id)
-                # concatenate the spike trains for this merge group
-                spike_train = np.concatenate(spike_trains_to_concatenate)
-                # sort the concatenated spike train (chronological)
-                spike_train = np.sort(spike_train)
-                # add the unit to the new sorting segment
-                new_sorting_segment.add_unit(
-                    representative_unit_id, spike_train
                 )
-            # Now we'll take care of all of the unit_ids that are not part of a merge group
-            for unit_id in parent_sorting.get_unit_ids():
-                if unit_id not in used_unit_ids:
-                    new_sorting_segment.add_unit(
-                        unit_id,
-                        sorting_segment.get_unit_spike_train(
-                            unit_id, start_frame=None, end_frame=None
-                        ),
-                    )
-                    if unit_id not in final_unit_ids:
-                        final_unit_ids.append(unit_id)
-
-            # add the new sorting segment to the new sorting
-            sorting_segment_list.append(new_sorting_segment)
+                for final_unit_id in final_unit_ids
+            ]
+            sorting_segment_list.append(
+                MergedSortingSegment(final_unit_ids, spike_trains)
+            )
 
         # Add the segments to this sorting
-        final_unit_ids.sort()  # TODO: not sure what final_unit_ids is used for
         si.BaseSorting.__init__(
             self,
             sampling_frequency=parent_sorting.get_sampling_frequency(),
@@ -79,16 +65,56 @@ class MergedSortingExtractor(si.BaseSorting):
             self.add_sorting_segment(new_sorting_segment)
         print(self)
 
+    def get_total_num_spikes(self):
+        """Number of spikes of each unit across segments.
+
+        Returns
+        -------
+        dict
+            Number of spikes for each unit_id.
+        """
+        num_spikes = np.sum(
+            [
+                sorting_segment.get_unit_spike_counts()
+                for sorting_segment in self._sorting_segments
+            ],
+            axis=0,
+        )
+        return dict(zip(self.unit_ids, num_spikes.tolist()))
+
 
 class MergedSortingSegment(si.BaseSortingSegment):
-    def __init__(self):
+    """Spike trains of all the units of a segment in one array.
+
+    The spike frames are grouped by unit, in the order of unit_ids, and sorted
+    within each unit, so that the spikes of a unit in a window of frames are
+    found by binary search.
+
+    Parameters
+    ----------
+    unit_ids : list
+    spike_trains : list of np.ndarray
+        Sorted spike frames of each unit.
+    """
+
+    def __init__(self, unit_ids: List, spike_trains: List[np.ndarray]):
         si.BaseSortingSegment.__init__(self)
-        # Store all the unit spike trains in RAM
-        self._unit_spike_trains: Dict[int, np.array] = {}
+        self._unit_inds = {
+            unit_id: unit_ind for unit_ind, unit_id in enumerate(unit_ids)
+        }
+        self._spike_frames = (
+            np.concatenate(spike_trains)
+            if len(spike_trains)
+            else np.array([], dtype=np.int64)
+        )
+        self._unit_offsets = np.zeros(len(unit_ids) + 1, dtype=np.int64)
+        np.cumsum(
+            [len(train) for train in spike_trains], out=self._unit_offsets[1:]
+        )
 
-    def add_unit(self, unit_id: int, spike_times: np.array):
-        # Add a unit spike train
-        self._unit_spike_trains[unit_id] = spike_times
+    def get_unit_spike_counts(self) -> np.ndarray:
+        """Number of spikes of each unit, in the order of unit_ids."""
+        return np.diff(self._unit_offsets)
 
     def get_unit_spike_train(
         self,
@@ -97,9 +123,13 @@ class MergedSortingSegment(si.BaseSortingSegment):
         end_frame: Union[int, None] = None,
     ) -> np.ndarray:
         # Get a unit spike train
-        spike_times = self._unit_spike_trains[unit_id]
+        unit_ind = self._unit_inds[unit_id]
+        spike_times = self._spike_frames[
+            self._unit_offsets[unit_ind] : self._unit_offsets[unit_ind + 1]
+        ]
+        start, stop = 0, len(spike_times)
         if start_frame is not None:
-            spike_times = spike_times[spike_times >= start_frame]
+            start = np.searchsorted(spike_times, start_frame, side="left")
         if end_frame is not None:
-            spike_times = spike_times[spike_times < end_frame]
-        return spike_times
+            stop = np.searchsorted(spike_times, end_frame, side="left")
+        return spike_times[start:stop]
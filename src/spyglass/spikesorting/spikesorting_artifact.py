@@ -67,6 +67,9 @@ class ArtifactDetection(dj.Computed):
     artifact_removed_interval_list_name: varchar(200) # name of the array of no-artifact valid time intervals
     """
 
+    # number of jobs used to detect artifacts
+    n_jobs = 4
+
     def make(self, key):
         if not (ArtifactDetectionSelection & key).fetch1(
             "custom_artifact_detection"
@@ -84,7 +87,7 @@ class ArtifactDetection(dj.Computed):
 
             job_kwargs = {
                 "chunk_duration": "10s",
-                "n_jobs": 4,
+                "n_jobs": self.n_jobs,
                 "progress_bar": "True",
             }
 
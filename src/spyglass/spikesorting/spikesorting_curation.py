@@ -4,6 +4,7 @@ import shutil
 import time
 import uuid
 import warnings
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import List
 
@@ -257,6 +258,25 @@ class Curation(SpyglassMixin, dj.Manual):
 
 @schema
 class WaveformParameters(dj.Manual):
+    """Parameters of `si.extract_waveforms`, plus the optional keys
+
+    whiten : bool
+        Whether to whiten the recording first. Default False.
+    sampling : str
+        How the spikes of units with more than "max_spikes_per_unit" spikes
+        are chosen: "uniform" (default) draws them at random from the whole
+        train, "stratified" splits the session in "n_strata" bins of equal
+        duration and spreads the spikes as evenly as possible over them.
+    n_strata : int
+        Number of bins of stratified sampling. Default 10.
+    seed : int
+        Seed of the spike sampling, for reproducible waveforms.
+
+    The sampled waveforms are the ones saved in the analysis NWB file. Set
+    "max_spikes_per_unit" to None to extract the waveforms of all spikes,
+    e.g. for metrics that need them.
+    """
+
     definition = """
     waveform_params_name: varchar(80) # name of waveform extraction parameters
     ---
@@ -309,6 +329,10 @@ class Waveforms(dj.Computed):
     waveforms_object_id: varchar(40)   # Object ID for the waveforms in NWB file
     """
 
+    # number of jobs used to extract waveforms. None uses the "n_jobs"
+    # waveform parameter
+    n_jobs = None
+
     def make(self, key):
         recording = Curation.get_recording(key)
         if recording.get_num_segments() > 1:
@@ -321,6 +345,12 @@ class Waveforms(dj.Computed):
         if "whiten" in waveform_params:
             if waveform_params.pop("whiten"):
                 recording = sip.whiten(recording, dtype="float32")
+        sampling = waveform_params.pop("sampling", "uniform")
+        n_strata = waveform_params.pop("n_strata", 10)
+        if self.n_jobs:
+            waveform_params["n_jobs"] = self.n_jobs
+        if sampling not in ("uniform", "stratified"):
+            raise ValueError(f"Unknown spike sampling {sampling}")
 
         waveform_extractor_name = self._get_waveform_extractor_name(key)
         key["waveform_extractor_path"] = str(
@@ -329,12 +359,21 @@ class Waveforms(dj.Computed):
         )
         if os.path.exists(key["waveform_extractor_path"]):
             shutil.rmtree(key["waveform_extractor_path"])
-        waveforms = si.extract_waveforms(
-            recording=recording,
-            sorting=sorting,
-            folder=key["waveform_extractor_path"],
-            **waveform_params,
-        )
+        if sampling == "stratified":
+            waveforms = _extract_waveforms_stratified(
+                recording=recording,
+                sorting=sorting,
+                folder=key["waveform_extractor_path"],
+                n_strata=n_strata,
+                **waveform_params,
+            )
+        else:
+            waveforms = si.extract_waveforms(
+                recording=recording,
+                sorting=sorting,
+                folder=key["waveform_extractor_path"],
+                **waveform_params,
+            )
 
         key["analysis_file_name"] = AnalysisNwbfile().create(
             key["nwb_file_name"]
@@ -379,6 +418,219 @@ class Waveforms(dj.Computed):
         )
 
 
+class _StratifiedWaveformExtractor(si.WaveformExtractor):
+    """Waveform extractor that samples spikes with `_select_spikes_stratified`.
+
+    Loading its folder gives a regular `si.WaveformExtractor`.
+    """
+
+    n_strata = 10
+
+    def sample_spikes(self, seed=None):
+        selected_spikes = _select_spikes_stratified(
+            self.recording,
+            self.sorting,
+            self._params["max_spikes_per_unit"],
+            self.nbefore,
+            self.nafter,
+            n_strata=self.n_strata,
+            seed=seed,
+        )
+
+        # stored like in si.WaveformExtractor.sample_spikes
+        for unit_id in self.sorting.unit_ids:
+            indices = selected_spikes[unit_id]
+            sampled_index = np.zeros(
+                sum(segment_indices.size for segment_indices in indices),
+                dtype=[("spike_index", "int64"), ("segment_index", "int64")],
+            )
+            sampled_index["spike_index"] = np.concatenate(indices)
+            sampled_index["segment_index"] = np.repeat(
+                np.arange(len(indices)),
+                [segment_indices.size for segment_indices in indices],
+            )
+            if self.folder is not None:
+                np.save(
+                    self.folder / "waveforms" / f"sampled_index_{unit_id}.npy",
+                    sampled_index,
+                )
+            else:
+                self._memory_objects["sampled_indices"][unit_id] = sampled_index
+
+        return selected_spikes
+
+
+def _extract_waveforms_stratified(
+    recording: si.BaseRecording,
+    sorting: si.BaseSorting,
+    folder,
+    n_strata: int = 10,
+    ms_before: float = 3.0,
+    ms_after: float = 4.0,
+    max_spikes_per_unit=500,
+    return_scaled: bool = True,
+    dtype=None,
+    seed=None,
+    **job_kwargs,
+):
+    """Same as `si.extract_waveforms` in a folder, with the spikes of each
+    unit sampled evenly across the session.
+
+    Parameters
+    ----------
+    recording : si.BaseRecording
+    sorting : si.BaseSorting
+    folder : str or Path
+    n_strata : int, optional
+        Number of bins of equal duration the session is split in.
+    ms_before, ms_after, max_spikes_per_unit, return_scaled, dtype, seed
+        As in `si.extract_waveforms`.
+    **job_kwargs
+        Parallelization parameters of spikeinterface, e.g. n_jobs.
+
+    Returns
+    -------
+    waveform_extractor : si.WaveformExtractor
+    """
+    waveform_extractor = _StratifiedWaveformExtractor.create(
+        recording, sorting, folder
+    )
+    waveform_extractor.n_strata = n_strata
+    waveform_extractor.set_params(
+        ms_before=ms_before,
+        ms_after=ms_after,
+        max_spikes_per_unit=max_spikes_per_unit,
+        return_scaled=return_scaled,
+        dtype=dtype,
+    )
+    waveform_extractor.run_extract_waveforms(seed=seed, **job_kwargs)
+    waveform_extractor.precompute_templates(modes=("average",))
+
+    return waveform_extractor
+
+
+def _select_spikes_stratified(
+    recording: si.BaseRecording,
+    sorting: si.BaseSorting,
+    max_spikes_per_unit,
+    nbefore: int,
+    nafter: int,
+    n_strata: int = 10,
+    seed=None,
+):
+    """Selects up to max_spikes_per_unit spikes of each unit, spread evenly
+    across the session.
+
+    The segments are laid end to end and split in n_strata bins of equal
+    duration. Each bin gets the same number of spikes, or all of its spikes
+    if it has fewer, the rest going to the bins with more spikes, and the
+    spikes are drawn at random within each bin. Like
+    `si.core.waveform_extractor.select_random_spikes_uniformly`, spikes too
+    close to the segment borders to cut a waveform are left out unless
+    max_spikes_per_unit is None, in which case all spikes are selected.
+
+    Parameters
+    ----------
+    recording : si.BaseRecording
+    sorting : si.BaseSorting
+    max_spikes_per_unit : int or None
+    nbefore, nafter : int
+        Samples of the waveforms before and after the spike.
+    n_strata : int, optional
+    seed : int, optional
+
+    Returns
+    -------
+    selected_spikes : dict
+        For each unit id, a list with the selected spike indices in each
+        segment.
+    """
+    rng = np.random.default_rng(seed)
+    num_segments = sorting.get_num_segments()
+    num_samples = [
+        recording.get_num_samples(segment_index=segment_index)
+        for segment_index in range(num_segments)
+    ]
+    segment_starts = np.concatenate(([0], np.cumsum(num_samples)))
+    strata_edges = np.linspace(0, segment_starts[-1], n_strata + 1)[1:-1]
+
+    selected_spikes = {}
+    for unit_id in sorting.unit_ids:
+        spike_trains = [
+            sorting.get_unit_spike_train(unit_id, segment_index=segment_index)
+            for segment_index in range(num_segments)
+        ]
+        if max_spikes_per_unit is None:
+            selected_spikes[unit_id] = [
+                np.arange(spike_train.size) for spike_train in spike_trains
+            ]
+            continue
+
+        indices, segments, times = [], [], []
+        for segment_index, spike_train in enumerate(spike_trains):
+            (valid,) = np.nonzero(
+                (spike_train >= nbefore)
+                & (spike_train < num_samples[segment_index] - nafter)
+            )
+            indices.append(valid)
+            segments.append(np.full(valid.size, segment_index))
+            times.append(spike_train[valid] + segment_starts[segment_index])
+        indices = np.concatenate(indices)
+        segments = np.concatenate(segments)
+        times = np.concatenate(times)
+
+        if indices.size > max_spikes_per_unit:
+            strata = np.searchsorted(strata_edges, times, side="right")
+            counts = np.bincount(strata, minlength=n_strata)
+            quotas = _allocate_evenly(counts, max_spikes_per_unit)
+            order = np.argsort(strata, kind="stable")
+            stratum_starts = np.concatenate(([0], np.cumsum(counts)))
+            keep = np.concatenate(
+                [
+                    order[start + rng.choice(count, quota, replace=False)]
+                    for start, count, quota in zip(
+                        stratum_starts, counts, quotas
+                    )
+                ]
+            )
+            keep.sort()
+            indices, segments = indices[keep], segments[keep]
+
+        selected_spikes[unit_id] = [
+            indices[segments == segment_index]
+            for segment_index in range(num_segments)
+        ]
+
+    return selected_spikes
+
+
+def _allocate_evenly(counts: np.ndarray, total: int):
+    """Splits total in quotas as equal as possible, no quota exceeding its
+    count.
+
+    Parameters
+    ----------
+    counts : np.ndarray
+        Number of items available in each group, summing to at least total.
+    total : int
+
+    Returns
+    -------
+    quotas : np.ndarray
+    """
+    quotas = np.zeros_like(counts)
+    remaining = total
+    # going from the smallest group, each takes its share of what remains or
+    # all its items, so the last and largest takes the rest
+    for n_left, group in zip(
+        range(len(counts), 0, -1), np.argsort(counts, kind="stable")
+    ):
+        quotas[group] = min(counts[group], remaining // n_left)
+        remaining -= quotas[group]
+
+    return quotas
+
+
 @schema
 class MetricParameters(dj.Manual):
     definition = """
@@ -496,15 +748,18 @@ class QualityMetrics(dj.Computed):
     object_id: varchar(40) # Object ID for the metrics in NWB file
     """
 
+    # number of worker processes used to compute metrics. Each loads the
+    # waveform extractor, so more than one only pays off for large sortings
+    # that are not already populated concurrently
+    n_jobs = 1
+
     def make(self, key):
-        waveform_extractor = Waveforms().load_waveforms(key)
-        qm = {}
+        we_path = (Waveforms & key).fetch1("waveform_extractor_path")
+        waveform_extractor = si.WaveformExtractor.load_from_folder(we_path)
         params = (MetricParameters & key).fetch1("metric_params")
-        for metric_name, metric_params in params.items():
-            metric = self._compute_metric(
-                waveform_extractor, metric_name, **metric_params
-            )
-            qm[metric_name] = metric
+        qm = self._compute_metrics(
+            waveform_extractor, params, we_path=we_path, n_jobs=self.n_jobs
+        )
         qm_name = self._get_quality_metrics_name(key)
         key["quality_metrics_path"] = str(
             Path(os.environ["SPYGLASS_WAVEFORMS_DIR"]) / Path(qm_name + ".json")
@@ -528,11 +783,81 @@ class QualityMetrics(dj.Computed):
         qm_name = wf_name + "_qm"
         return qm_name
 
-    def _compute_metric(self, waveform_extractor, metric_name, **metric_params):
+    @classmethod
+    def _compute_metrics(
+        cls, waveform_extractor, params, we_path=None, n_jobs=1
+    ):
+        """Computes each metric in params for all units.
+
+        Each metric is one task, except per-unit metrics (e.g. nn_isolation),
+        whose units are split into several tasks. If we_path is given and
+        n_jobs > 1, tasks run in a pool of processes that each load the
+        waveform extractor from we_path.
+
+        Parameters
+        ----------
+        waveform_extractor : si.WaveformExtractor
+        params : dict
+            Metric names and their parameters, as in MetricParameters.
+        we_path : str, optional
+            Folder of the waveform extractor. Required to run in parallel.
+        n_jobs : int, optional
+            Number of worker processes. Default 1 computes the metrics in this
+            process. None uses all CPUs.
+
+        Returns
+        -------
+        qm : dict
+            Metric names and dictionaries of unit ids to metric values.
+        """
+        unit_ids = list(waveform_extractor.sorting.get_unit_ids())
+        n_jobs = n_jobs or os.cpu_count()
+        # several chunks per worker, as the cost per unit varies
+        n_chunks = min(4 * n_jobs, len(unit_ids)) or 1
+
+        tasks = []
+        for metric_name, metric_params in params.items():
+            if metric_name in _per_unit_metrics:
+                for unit_chunk in np.array_split(unit_ids, n_chunks):
+                    if len(unit_chunk):
+                        tasks.append(
+                            (metric_name, list(unit_chunk), metric_params)
+                        )
+            else:
+                tasks.append((metric_name, None, metric_params))
+
+        n_jobs = min(n_jobs, len(tasks))
+        if n_jobs <= 1 or we_path is None:
+            results = [
+                cls._compute_metric(
+                    waveform_extractor,
+                    metric_name,
+                    unit_ids=task_unit_ids,
+                    **dict(metric_params),
+                )
+                for metric_name, task_unit_ids, metric_params in tasks
+            ]
+        else:
+            with ProcessPoolExecutor(
+                max_workers=n_jobs,
+                initializer=_init_metric_worker,
+                initargs=(we_path,),
+            ) as executor:
+                results = list(executor.map(_compute_metric_worker, tasks))
+
+        qm = {metric_name: {} for metric_name in params}
+        for (metric_name, *_), metric in zip(tasks, results):
+            qm[metric_name].update(metric)
+        return qm
+
+    @staticmethod
+    def _compute_metric(
+        waveform_extractor, metric_name, unit_ids=None, **metric_params
+    ):
         peak_sign_metrics = ["snr", "peak_offset", "peak_channel"]
         metric_func = _metric_name_to_func[metric_name]
         # TODO clean up code below
-        if metric_name == "isi_violation":
+        if metric_name in ["isi_violation", "num_spikes"]:
             metric = metric_func(waveform_extractor, **metric_params)
         elif metric_name in peak_sign_metrics:
             if "peak_sign" in metric_params:
@@ -548,7 +873,9 @@ class QualityMetrics(dj.Computed):
                 )
         else:
             metric = {}
-            for unit_id in waveform_extractor.sorting.get_unit_ids():
+            if unit_ids is None:
+                unit_ids = waveform_extractor.sorting.get_unit_ids()
+            for unit_id in unit_ids:
                 metric[str(unit_id)] = metric_func(
                     waveform_extractor, this_unit_id=unit_id, **metric_params
                 )
@@ -623,14 +950,38 @@ def _get_peak_channel(
     return peak_channel
 
 
-def _get_num_spikes(
-    waveform_extractor: si.WaveformExtractor, this_unit_id: int
-):
+def _get_num_spikes(waveform_extractor: si.WaveformExtractor):
     """Computes the number of spikes for each unit."""
+    # count spikes once for all units, not once per unit
     all_spikes = sq.compute_num_spikes(waveform_extractor)
-    cluster_spikes = all_spikes[this_unit_id]
-    return cluster_spikes
+    return {
+        str(unit_id): all_spikes[unit_id]
+        for unit_id in waveform_extractor.sorting.get_unit_ids()
+    }
+
+
+_metric_worker_ctx = {}
+
+
+def _init_metric_worker(we_path):
+    """Load the waveform extractor once per worker process."""
+    _metric_worker_ctx[
+        "waveform_extractor"
+    ] = si.WaveformExtractor.load_from_folder(we_path)
+
+
+def _compute_metric_worker(task):
+    metric_name, unit_ids, metric_params = task
+    return QualityMetrics._compute_metric(
+        _metric_worker_ctx["waveform_extractor"],
+        metric_name,
+        unit_ids=unit_ids,
+        **dict(metric_params),
+    )
+
 
+# metrics computed unit by unit, which are split across workers by unit
+_per_unit_metrics = ["nn_isolation", "nn_noise_overlap"]
 
 _metric_name_to_func = {
     "snr": sq.compute_snrs,
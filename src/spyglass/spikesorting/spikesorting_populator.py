@@ -1,4 +1,8 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
 import datajoint as dj
+import numpy as np
 
 from ..common import ElectrodeGroup, IntervalList
 from .curation_figurl import CurationFigurl, CurationFigurlSelection
@@ -59,6 +63,10 @@ def spikesorting_pipeline_populator(
     waveform_params_name: str = "default_whitened",
     metric_params_name: str = "peak_offest_num_spikes_2",
     auto_curation_params_name: str = "mike_noise_03_offset_2_isi_0025_mua",
+    n_workers: int = 1,
+    step_resources: dict = None,
+    cpu_budget: int = None,
+    memory_budget_gb: float = None,
 ):
     """Automatically populate the spike sorting pipeline for a given epoch
 
@@ -107,6 +115,26 @@ def spikesorting_pipeline_populator(
         Thresholds applied to Quality metrics for automatic unit curation. If
         empty string, will skip automatic curation steps, by default
         "mike_noise_03_offset_2_isi_0025_mua"
+    n_workers : int, optional
+        Number of worker processes. If 1, each step is run for all sort groups
+        before the next one. Otherwise, the steps of different sort groups run
+        concurrently in a process pool and reserve their keys in the DataJoint
+        jobs table. Errors are then logged to the jobs table, and the failed
+        keys are skipped by later runs until their error jobs are deleted. If
+        None, uses one worker per CPU. By default 1
+    step_resources : dict, optional
+        Maps step names (e.g. "SpikeSorting") to the CPUs and memory,
+        dict(cpus=..., memory_gb=...), reserved from the budgets by each of its
+        concurrent runs, updating DEFAULT_STEP_RESOURCES. These limit how
+        many steps are started together, and steps that take a number of jobs
+        (SpikeSortingRecording, ArtifactDetection, Waveforms and
+        QualityMetrics) use their CPUs as their number of jobs. Memory is not
+        enforced on the workers. By default None
+    cpu_budget : int, optional
+        Number of CPUs shared by the concurrent steps. By default None, all
+        CPUs of the machine
+    memory_budget_gb : float, optional
+        Memory in GB shared by the concurrent steps. By default None, no limit
     """
     nwbf_dict = dict(nwb_file_name=nwb_file_name)
     # Define pipeline parameters
@@ -175,126 +203,378 @@ def spikesorting_pipeline_populator(
         & probe_restriction
     ).fetch("sort_group_id")
 
+    params = dict(
+        team_name=team_name,
+        interval_list_name=interval_list_name,
+        preproc_params_name=preproc_params_name,
+        artifact_parameters=artifact_parameters,
+        sorter=sorter,
+        sorter_params_name=sorter_params_name,
+        waveform_params_name=waveform_params_name,
+        metric_params_name=metric_params_name,
+        auto_curation_params_name=auto_curation_params_name,
+    )
+    params["auto_curate"] = (
+        len(waveform_params_name) > 0
+        and len(metric_params_name) > 0
+        and len(auto_curation_params_name) > 0
+    )
+    steps = _get_pipeline_steps(params["auto_curate"])
+    sort_group_ids = np.unique(sort_group_id_list)
+
+    if n_workers is None or n_workers > 1:
+        _run_pipeline_concurrently(
+            steps,
+            sort_dict,
+            sort_group_ids,
+            params,
+            n_workers=n_workers,
+            step_resources=step_resources,
+            cpu_budget=cpu_budget,
+            memory_budget_gb=memory_budget_gb,
+        )
+    else:
+        params["sort_group_ids"] = sort_group_ids
+        for step in steps:
+            _run_pipeline_step(step, sort_dict, params)
+
+    if fig_url_repo:
+        # Curation Figurl
+        print("Creating curation figurl")
+        sort_interval_name = interval_list_name + "_entire"
+        gh_url = (
+            fig_url_repo
+            + str(nwb_file_name + "_" + sort_interval_name)  # session id
+            + "/{}"  # tetrode using auto_id['sort_group_id']
+            + "/curation.json"
+        )
+
+        for auto_id in (AutomaticCuration() & sort_dict).fetch(
+            "auto_curation_key"
+        ):
+            auto_curation_out_key = dict(
+                **(Curation() & auto_id).fetch1("KEY"),
+                new_curation_uri=gh_url.format(str(auto_id["sort_group_id"])),
+            )
+            CurationFigurlSelection.insert1(
+                auto_curation_out_key, skip_duplicates=True
+            )
+            CurationFigurl.populate(auto_curation_out_key)
+
+
+def _populate_recording(restriction, params, populate_kwargs):
     # make spike sorting recording
     print("Generating spike sorting recording")
-    for sort_group_id in sort_group_id_list:
-        ssr_key = dict(
-            **sort_dict,
-            sort_group_id=sort_group_id,  # See SortGroup
-            preproc_params_name=preproc_params_name,  # See preproc_params
-            interval_list_name=interval_list_name,
-            team_name=team_name,
-        )
-        SpikeSortingRecordingSelection.insert1(ssr_key, skip_duplicates=True)
+    interval_dict = dict(
+        nwb_file_name=restriction["nwb_file_name"],
+        interval_list_name=params["interval_list_name"],
+    )
+    SpikeSortingRecordingSelection.insert(
+        [
+            dict(
+                **restriction,
+                sort_group_id=sort_group_id,  # See SortGroup
+                preproc_params_name=params["preproc_params_name"],
+                interval_list_name=params["interval_list_name"],
+                team_name=params["team_name"],
+            )
+            for sort_group_id in params["sort_group_ids"]
+        ],
+        skip_duplicates=True,
+    )
+    SpikeSortingRecording.populate(
+        restriction, interval_dict, **populate_kwargs
+    )
 
-    SpikeSortingRecording.populate(interval_dict)
 
-    # Artifact detection
+def _populate_artifact_detection(restriction, params, populate_kwargs):
     print("Running artifact detection")
+    interval_dict = dict(
+        nwb_file_name=restriction["nwb_file_name"],
+        interval_list_name=params["interval_list_name"],
+    )
     artifact_keys = [
-        {**k, "artifact_params_name": artifact_parameters}
-        for k in (SpikeSortingRecordingSelection() & interval_dict).fetch("KEY")
+        {**k, "artifact_params_name": params["artifact_parameters"]}
+        for k in (
+            SpikeSortingRecordingSelection() & restriction & interval_dict
+        ).fetch("KEY")
     ]
     ArtifactDetectionSelection().insert(artifact_keys, skip_duplicates=True)
-    ArtifactDetection.populate(interval_dict)
+    ArtifactDetection.populate(restriction, interval_dict, **populate_kwargs)
 
-    # Spike sorting
+
+def _populate_sorting(restriction, params, populate_kwargs):
     print("Running spike sorting")
+    interval_dict = dict(
+        nwb_file_name=restriction["nwb_file_name"],
+        interval_list_name=params["interval_list_name"],
+    )
+    artifact_keys = (
+        ArtifactDetectionSelection
+        & (SpikeSortingRecordingSelection & restriction & interval_dict)
+        & {"artifact_params_name": params["artifact_parameters"]}
+    ).fetch("KEY")
     for artifact_key in artifact_keys:
         ss_key = dict(
             **(ArtifactDetection & artifact_key).fetch1("KEY"),
             **(ArtifactRemovedIntervalList() & artifact_key).fetch1("KEY"),
-            sorter=sorter,
-            sorter_params_name=sorter_params_name,
+            sorter=params["sorter"],
+            sorter_params_name=params["sorter_params_name"],
         )
         ss_key.pop("artifact_params_name")
         SpikeSortingSelection.insert1(ss_key, skip_duplicates=True)
-    SpikeSorting.populate(sort_dict)
+    SpikeSorting.populate(restriction, **populate_kwargs)
 
     # initial curation
     print("Beginning curation")
-    for sorting_key in (SpikeSorting() & sort_dict).fetch("KEY"):
+    for sorting_key in (SpikeSorting() & restriction).fetch("KEY"):
         Curation.insert_curation(sorting_key)
 
-    # Calculate quality metrics and perform automatic curation if specified
-    if (
-        len(waveform_params_name) > 0
-        and len(metric_params_name) > 0
-        and len(auto_curation_params_name) > 0
-    ):
-        # Extract waveforms
-        print("Extracting waveforms")
-        curation_keys = [
-            {**k, "waveform_params_name": waveform_params_name}
-            for k in (Curation() & sort_dict).fetch("KEY")
-        ]
-        WaveformSelection.insert(curation_keys, skip_duplicates=True)
-        Waveforms.populate(sort_dict)
-
-        # Quality Metrics
-        print("Calculating quality metrics")
-        waveform_keys = [
-            {**k, "metric_params_name": metric_params_name}
-            for k in (Waveforms() & sort_dict).fetch("KEY")
-        ]
-        MetricSelection.insert(waveform_keys, skip_duplicates=True)
-        QualityMetrics().populate(sort_dict)
-
-        # Automatic Curation
-        print("Creating automatic curation")
-        metric_keys = [
-            {**k, "auto_curation_params_name": auto_curation_params_name}
-            for k in (QualityMetrics() & sort_dict).fetch("KEY")
-        ]
-        AutomaticCurationSelection.insert(metric_keys, skip_duplicates=True)
-        AutomaticCuration().populate(sort_dict)
 
-        # Curated Spike Sorting
+def _populate_waveforms(restriction, params, populate_kwargs):
+    # Extract waveforms
+    print("Extracting waveforms")
+    curation_keys = [
+        {**k, "waveform_params_name": params["waveform_params_name"]}
+        for k in (Curation() & restriction).fetch("KEY")
+    ]
+    WaveformSelection.insert(curation_keys, skip_duplicates=True)
+    Waveforms.populate(restriction, **populate_kwargs)
+
+
+def _populate_quality_metrics(restriction, params, populate_kwargs):
+    # Quality Metrics
+    print("Calculating quality metrics")
+    waveform_keys = [
+        {**k, "metric_params_name": params["metric_params_name"]}
+        for k in (Waveforms() & restriction).fetch("KEY")
+    ]
+    MetricSelection.insert(waveform_keys, skip_duplicates=True)
+    QualityMetrics().populate(restriction, **populate_kwargs)
+
+
+def _populate_automatic_curation(restriction, params, populate_kwargs):
+    # Automatic Curation
+    print("Creating automatic curation")
+    metric_keys = [
+        {**k, "auto_curation_params_name": params["auto_curation_params_name"]}
+        for k in (QualityMetrics() & restriction).fetch("KEY")
+    ]
+    AutomaticCurationSelection.insert(metric_keys, skip_duplicates=True)
+    AutomaticCuration().populate(restriction, **populate_kwargs)
+
+
+def _populate_curated_sorting(restriction, params, populate_kwargs):
+    print("Creating curated spike sorting")
+    if params["auto_curate"]:
         # get curation keys of the automatic curation to populate into curated
         # spike sorting selection
-        print("Creating curated spike sorting")
-        auto_key_list = (AutomaticCuration() & sort_dict).fetch(
-            "auto_curation_key"
-        )
-        for auto_key in auto_key_list:
-            curation_auto_key = (Curation() & auto_key).fetch1("KEY")
-            CuratedSpikeSortingSelection.insert1(
-                curation_auto_key, skip_duplicates=True
+        curation_keys = [
+            (Curation() & auto_key).fetch1("KEY")
+            for auto_key in (AutomaticCuration() & restriction).fetch(
+                "auto_curation_key"
             )
-
+        ]
     else:
         # Perform no automatic curation, just populate curated spike sorting
         # selection with the initial curation. Used in case of clusterless
         # decoding
-        print("Creating curated spike sorting")
-        curation_keys = (Curation() & sort_dict).fetch("KEY")
-        for curation_key in curation_keys:
-            CuratedSpikeSortingSelection.insert1(
-                curation_auto_key, skip_duplicates=True
-            )
+        curation_keys = (Curation() & restriction).fetch("KEY")
+    CuratedSpikeSortingSelection.insert(curation_keys, skip_duplicates=True)
 
     # Populate curated spike sorting
-    CuratedSpikeSorting.populate(sort_dict)
+    CuratedSpikeSorting.populate(restriction, **populate_kwargs)
 
-    if fig_url_repo:
-        # Curation Figurl
-        print("Creating curation figurl")
-        sort_interval_name = interval_list_name + "_entire"
-        gh_url = (
-            fig_url_repo
-            + str(nwb_file_name + "_" + sort_interval_name)  # session id
-            + "/{}"  # tetrode using auto_id['sort_group_id']
-            + "/curation.json"
+
+# step name: (function, upstream steps)
+_PIPELINE_STEPS = {
+    "SpikeSortingRecording": (_populate_recording, ()),
+    "ArtifactDetection": (
+        _populate_artifact_detection,
+        ("SpikeSortingRecording",),
+    ),
+    "SpikeSorting": (_populate_sorting, ("ArtifactDetection",)),
+    "Waveforms": (_populate_waveforms, ("SpikeSorting",)),
+    "QualityMetrics": (_populate_quality_metrics, ("Waveforms",)),
+    "AutomaticCuration": (_populate_automatic_curation, ("QualityMetrics",)),
+    "CuratedSpikeSorting": (_populate_curated_sorting, ("AutomaticCuration",)),
+}
+
+# resources reserved for each step of one sort group when running concurrently.
+# Steps whose table has an `n_jobs` attribute run with their reserved CPUs.
+DEFAULT_STEP_RESOURCES = {
+    "SpikeSortingRecording": dict(cpus=8, memory_gb=8),
+    "ArtifactDetection": dict(cpus=4, memory_gb=4),
+    "SpikeSorting": dict(cpus=4, memory_gb=16),
+    "Waveforms": dict(cpus=5, memory_gb=8),
+    "QualityMetrics": dict(cpus=1, memory_gb=4),
+    "AutomaticCuration": dict(cpus=1, memory_gb=2),
+    "CuratedSpikeSorting": dict(cpus=1, memory_gb=2),
+}
+
+
+def _get_pipeline_steps(auto_curate=True):
+    """Dependency graph of the pipeline steps, in execution order.
+
+    Without automatic curation, curated spike sorting follows directly from
+    the initial curation made after spike sorting.
+
+    Returns
+    -------
+    steps : dict
+        Maps each step name to the names of the steps it depends on.
+    """
+    if auto_curate:
+        return {step: deps for step, (_, deps) in _PIPELINE_STEPS.items()}
+
+    skipped = ("Waveforms", "QualityMetrics", "AutomaticCuration")
+    steps = {
+        step: deps
+        for step, (_, deps) in _PIPELINE_STEPS.items()
+        if step not in skipped
+    }
+    steps["CuratedSpikeSorting"] = ("SpikeSorting",)
+    return steps
+
+
+# tables whose `n_jobs` attribute sets the number of jobs of their make
+_STEP_TABLES_WITH_N_JOBS = {
+    "SpikeSortingRecording": SpikeSortingRecording,
+    "ArtifactDetection": ArtifactDetection,
+    "Waveforms": Waveforms,
+    "QualityMetrics": QualityMetrics,
+}
+
+
+def _run_pipeline_step(
+    step, restriction, params, populate_kwargs=None, n_jobs=None
+):
+    """Insert the selection entries of one step and populate it.
+
+    If n_jobs is given, it replaces the number of jobs of the step's make
+    for the duration of the step, if the step's table has one.
+    """
+    table = _STEP_TABLES_WITH_N_JOBS.get(step)
+    if n_jobs is None or table is None:
+        _PIPELINE_STEPS[step][0](restriction, params, populate_kwargs or {})
+        return
+
+    default_n_jobs, table.n_jobs = table.n_jobs, n_jobs
+    try:
+        _PIPELINE_STEPS[step][0](restriction, params, populate_kwargs or {})
+    finally:
+        table.n_jobs = default_n_jobs
+
+
+def _init_pipeline_worker():
+    """Give each worker process its own connection to the database."""
+    dj.conn().connect()
+
+
+def _run_pipeline_concurrently(
+    steps,
+    sort_dict,
+    sort_group_ids,
+    params,
+    n_workers=None,
+    step_resources=None,
+    cpu_budget=None,
+    memory_budget_gb=None,
+):
+    """Run the pipeline steps of each sort group in a pool of processes.
+
+    A step of a sort group is submitted once the steps it depends on are done
+    for that group, there is a free worker and the CPUs and memory it reserves
+    fit in what is left of the budgets. Ready steps that do not fit are
+    skipped over in favor of smaller ones. Steps that take a number of jobs
+    run with the CPUs they reserve. Populate calls reserve their keys
+    in the DataJoint jobs table, so that several drivers, on one or many
+    machines, can share the same entries.
+
+    If a step fails, the later steps of its sort group are skipped, the other
+    groups carry on and a RuntimeError is raised at the end.
+    """
+    n_workers = n_workers or os.cpu_count()
+    cpu_budget = cpu_budget or os.cpu_count()
+    memory_budget_gb = memory_budget_gb or np.inf
+    step_resources = {**DEFAULT_STEP_RESOURCES, **(step_resources or {})}
+    # a step larger than the budget runs alone rather than never
+    resources = {
+        step: (
+            min(step_resources[step].get("cpus", 1), cpu_budget),
+            min(step_resources[step].get("memory_gb", 0), memory_budget_gb),
         )
+        for step in steps
+    }
+    populate_kwargs = dict(reserve_jobs=True)
 
-        for auto_id in (AutomaticCuration() & sort_dict).fetch(
-            "auto_curation_key"
-        ):
-            auto_curation_out_key = dict(
-                **(Curation() & auto_id).fetch1("KEY"),
-                new_curation_uri=gh_url.format(str(auto_id["sort_group_id"])),
-            )
-            CurationFigurlSelection.insert1(
-                auto_curation_out_key, skip_duplicates=True
+    waiting = {
+        (sort_group_id, step): set(deps)
+        for sort_group_id in sort_group_ids
+        for step, deps in steps.items()
+    }
+    ready = [task for task, deps in waiting.items() if not deps]
+    for task in ready:
+        del waiting[task]
+    running = {}
+    failed = {}
+    free_cpus, free_memory_gb = cpu_budget, memory_budget_gb
+
+    with ProcessPoolExecutor(
+        max_workers=n_workers, initializer=_init_pipeline_worker
+    ) as executor:
+        while ready or running:
+            for task in list(ready):
+                if len(running) >= n_workers:
+                    break
+                cpus, memory_gb = resources[task[1]]
+                if cpus > free_cpus or memory_gb > free_memory_gb:
+                    continue
+                ready.remove(task)
+                free_cpus -= cpus
+                free_memory_gb -= memory_gb
+                sort_group_id, step = task
+                running[
+                    executor.submit(
+                        _run_pipeline_step,
+                        step,
+                        dict(**sort_dict, sort_group_id=sort_group_id),
+                        dict(params, sort_group_ids=[sort_group_id]),
+                        populate_kwargs,
+                        n_jobs=cpus,
+                    )
+                ] = task
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                sort_group_id, step = task = running.pop(future)
+                cpus, memory_gb = resources[step]
+                free_cpus += cpus
+                free_memory_gb += memory_gb
+
+                if future.exception() is not None:
+                    failed[task] = future.exception()
+                    print(
+                        f"{step} failed for sort group {sort_group_id}: "
+                        f"{future.exception()!r}"
+                    )
+                    # drop the later steps of this sort group
+                    for other in [t for t in waiting if t[0] == sort_group_id]:
+                        del waiting[other]
+                    continue
+
+                for other, deps in list(waiting.items()):
+                    if other[0] == sort_group_id:
+                        deps.discard(step)
+                        if not deps:
+                            ready.append(other)
+                            del waiting[other]
+
+    if failed:
+        raise RuntimeError(
+            "Spike sorting pipeline failed for "
+            + ", ".join(
+                f"sort group {sort_group_id} at {step}"
+                for sort_group_id, step in failed
             )
-            CurationFigurl.populate(auto_curation_out_key)
+        ) from next(iter(failed.values()))
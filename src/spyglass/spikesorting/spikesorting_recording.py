@@ -1,4 +1,4 @@
-import os
+import json
 import shutil
 from functools import reduce
 from pathlib import Path
@@ -8,6 +8,12 @@ import numpy as np
 import probeinterface as pi
 import spikeinterface as si
 import spikeinterface.extractors as se
+from spikeinterface.core import BinaryFolderRecording, BinaryRecordingExtractor
+from spikeinterface.core.core_tools import SIJsonEncoder
+from spikeinterface.core.job_tools import (
+    ChunkRecordingExecutor,
+    ensure_chunk_size,
+)
 
 from ..common.common_device import Probe, ProbeType  # noqa: F401
 from ..common.common_ephys import Electrode, ElectrodeGroup
@@ -86,6 +92,7 @@ class SortGroup(dj.Manual):
         sg_key = dict()
         sge_key = dict()
         sg_key["nwb_file_name"] = sge_key["nwb_file_name"] = nwb_file_name
+        sg_rows, sge_rows = [], []
         for e_group in e_groups:
             # for each electrode group, get a list of the unique shank numbers
             shank_list = np.unique(
@@ -166,11 +173,12 @@ class SortGroup(dj.Manual):
                         f"Omitting electrode group {e_group}, shank {shank} from sort groups because unitrode."
                     )
                     continue
-                self.insert1(sg_key)
-                for elect in shank_elect:
-                    sge_key["electrode_id"] = elect
-                    self.SortGroupElectrode().insert1(sge_key)
+                sg_rows.append(dict(sg_key))
+                sge_rows.extend(
+                    {**sge_key, "electrode_id": elect} for elect in shank_elect
+                )
                 sort_group += 1
+        self._insert_groups(sg_rows, sge_rows)
 
     def set_group_by_electrode_group(self, nwb_file_name: str):
         """Assign groups to all non-bad channel electrodes based on their electrode group
@@ -194,6 +202,7 @@ class SortGroup(dj.Manual):
         sge_key = dict()
         sg_key["nwb_file_name"] = sge_key["nwb_file_name"] = nwb_file_name
         sort_group = 0
+        sg_rows, sge_rows = [], []
         for e_group in e_groups:
             sge_key["electrode_group_name"] = e_group
             # sg_key['sort_group_id'] = sge_key['sort_group_id'] = sort_group
@@ -209,15 +218,30 @@ class SortGroup(dj.Manual):
                 ValueError(
                     f"Error in electrode group {e_group}: reference electrodes are not all the same"
                 )
-            self.insert1(sg_key)
+            sg_rows.append(dict(sg_key))
 
             shank_elect = electrodes["electrode_id"][
                 electrodes["electrode_group_name"] == e_group
             ]
-            for elect in shank_elect:
-                sge_key["electrode_id"] = elect
-                self.SortGroupElectrode().insert1(sge_key)
+            sge_rows.extend(
+                {**sge_key, "electrode_id": elect} for elect in shank_elect
+            )
             sort_group += 1
+        self._insert_groups(sg_rows, sge_rows)
+
+    def _insert_groups(self, sg_rows, sge_rows):
+        """Inserts sort groups and their electrodes in one transaction.
+
+        Parameters
+        ----------
+        sg_rows : list of dict
+            SortGroup entries
+        sge_rows : list of dict
+            SortGroup.SortGroupElectrode entries of these sort groups
+        """
+        with self.connection.transaction:
+            self.insert(sg_rows)
+            self.SortGroupElectrode().insert(sge_rows)
 
     def set_reference_from_list(self, nwb_file_name, sort_group_ref_list):
         """
@@ -338,6 +362,9 @@ class SpikeSortingPreprocessingParameters(dj.Manual):
     """
     # NOTE: Reduced key less than 2 existing entries
     # All existing entries are below 48
+    # Optional preproc_params: "min_segment_length" (s) of the sort intervals,
+    # "chunk_duration" (default "10000ms") and "n_jobs" (default 8) for saving
+    # the recording
 
     def insert_default(self):
         # set up the default filter parameters
@@ -379,6 +406,10 @@ class SpikeSortingRecording(dj.Computed):
     -> IntervalList.proj(sort_interval_list_name='interval_list_name')
     """
 
+    # number of jobs used to save the recording. None uses the "n_jobs"
+    # preprocessing parameter, default 8
+    n_jobs = None
+
     def make(self, key):
         sort_interval_valid_times = self._get_sort_interval_valid_times(key)
         recording = self._get_filtered_recording(key)
@@ -386,11 +417,15 @@ class SpikeSortingRecording(dj.Computed):
 
         # Path to files that will hold the recording extractors
         recording_path = str(recording_dir / Path(recording_name))
-        if os.path.exists(recording_path):
-            shutil.rmtree(recording_path)
-
-        recording.save(
-            folder=recording_path, chunk_duration="10000ms", n_jobs=8
+        # resumes the save of a previous make that did not finish
+        params = (SpikeSortingPreprocessingParameters & key).fetch1(
+            "preproc_params"
+        )
+        _save_recording_resumable(
+            recording,
+            recording_path,
+            chunk_duration=params.get("chunk_duration", "10000ms"),
+            n_jobs=self.n_jobs or params.get("n_jobs", 8),
         )
 
         IntervalList.insert1(
@@ -629,3 +664,201 @@ class SpikeSortingRecording(dj.Computed):
             recording = recording.set_probe(tetrode, in_place=True)
 
         return recording
+
+
+# lists the chunks of the traces already written to a recording folder
+_CHUNK_MANIFEST_NAME = "chunk_manifest.txt"
+
+
+def _save_recording_resumable(
+    recording: si.BaseRecording,
+    folder,
+    chunk_duration="10000ms",
+    n_jobs: int = 8,
+):
+    """Save a recording to a binary folder, resuming an interrupted save.
+
+    Makes the same folder as `recording.save(folder=folder, ...)`, loadable
+    with `si.load_extractor`. The traces are written chunk by chunk and each
+    written chunk is recorded in a manifest in the folder. If the folder
+    holds a partial save of the same recording with the same chunk size, only
+    the chunks missing from the manifest are written. Otherwise the folder
+    is removed and the save starts over.
+
+    Parameters
+    ----------
+    recording : si.BaseRecording
+    folder : str or Path
+    chunk_duration : str or float, optional
+        Duration of the chunks, as a string with units (e.g. "10000ms") or in
+        seconds. By default "10000ms"
+    n_jobs : int, optional
+        Number of processes writing chunks, by default 8
+
+    Returns
+    -------
+    cached : si.BaseRecording
+        The saved recording, loaded from the folder.
+    """
+    folder = Path(folder)
+    manifest_path = folder / _CHUNK_MANIFEST_NAME
+    dtype = np.dtype(recording.get_dtype())
+    num_channels = recording.get_num_channels()
+    num_frames = [
+        recording.get_num_frames(segment_index=segment_index)
+        for segment_index in range(recording.get_num_segments())
+    ]
+    file_paths = [
+        folder / f"traces_cached_seg{segment_index}.raw"
+        for segment_index in range(len(num_frames))
+    ]
+    header = dict(
+        num_channels=num_channels,
+        num_frames=num_frames,
+        dtype=dtype.str,
+        chunk_size=ensure_chunk_size(recording, chunk_duration=chunk_duration),
+        recording=_get_recording_provenance(recording),
+    )
+
+    completed = _read_chunk_manifest(manifest_path, header)
+    if completed is None:
+        if folder.exists():
+            shutil.rmtree(folder)
+        folder.mkdir(parents=True)
+        for file_path, n_frames in zip(file_paths, num_frames):
+            with open(file_path, "wb") as f:
+                f.truncate(n_frames * num_channels * dtype.itemsize)
+        manifest_path.write_text(json.dumps(header) + "\n", encoding="utf8")
+        completed = set()
+    elif completed:
+        print(f"Resuming save of {folder} after {len(completed)} chunks")
+
+    with open(manifest_path, "a", encoding="utf8") as manifest:
+
+        def record_chunk(chunk):
+            if chunk is not None:
+                manifest.write("{} {}\n".format(*chunk))
+                manifest.flush()
+
+        ChunkRecordingExecutor(
+            recording,
+            _write_recording_chunk,
+            _init_chunk_writer,
+            (recording, file_paths, dtype, completed),
+            gather_func=record_chunk,
+            n_jobs=n_jobs,
+            chunk_size=header["chunk_size"],
+            job_name="_save_recording_resumable",
+        ).run()
+
+    return _finalize_binary_folder(recording, folder, file_paths, dtype)
+
+
+def _get_recording_provenance(recording):
+    """JSON-compatible description of a recording, None if not dumpable."""
+    if not recording.check_if_json_serializable():
+        return None
+    return json.loads(json.dumps(recording.to_dict(), cls=SIJsonEncoder))
+
+
+def _read_chunk_manifest(manifest_path, header):
+    """Chunks written by a previous save with the same header.
+
+    Returns
+    -------
+    completed : set of (segment_index, start_frame) or None
+        None if there is no manifest, or if it was written for another
+        recording or chunk size, so that the save cannot be resumed.
+    """
+    if header["recording"] is None or not manifest_path.is_file():
+        return None
+    lines = manifest_path.read_text(encoding="utf8").splitlines()
+    try:
+        if not lines or json.loads(lines[0]) != header:
+            return None
+    except json.JSONDecodeError:
+        return None
+
+    completed = set()
+    for line in lines[1:]:
+        # the last line may be cut short if the save was killed
+        fields = line.split()
+        if len(fields) == 2 and all(field.isdigit() for field in fields):
+            completed.add((int(fields[0]), int(fields[1])))
+    return completed
+
+
+def _init_chunk_writer(recording, file_paths, dtype, completed):
+    return dict(
+        recording=recording,
+        files=[open(file_path, "r+b") for file_path in file_paths],
+        dtype=dtype,
+        completed=completed,
+    )
+
+
+def _write_recording_chunk(segment_index, start_frame, end_frame, worker_ctx):
+    """Write the traces of one chunk, skipping those already written.
+
+    Returns
+    -------
+    chunk : (segment_index, start_frame) or None
+        The written chunk, None if it was skipped.
+    """
+    if (segment_index, start_frame) in worker_ctx["completed"]:
+        return None
+
+    traces = worker_ctx["recording"].get_traces(
+        segment_index=segment_index,
+        start_frame=start_frame,
+        end_frame=end_frame,
+    )
+    traces = np.ascontiguousarray(traces, dtype=worker_ctx["dtype"])
+    file = worker_ctx["files"][segment_index]
+    file.seek(start_frame * traces.shape[1] * traces.itemsize)
+    file.write(traces.data)
+    # written chunks must reach the file before they are in the manifest
+    file.flush()
+    return segment_index, start_frame
+
+
+def _finalize_binary_folder(recording, folder, file_paths, dtype):
+    """Write the metadata of a binary folder around its traces files.
+
+    Same as the end of `recording.save`, for spikeinterface 0.98.
+    """
+    provenance_file = folder / "provenance.json"
+    if recording.check_if_json_serializable():
+        recording.dump(provenance_file)
+    else:
+        provenance_file.write_text(
+            json.dumps({"warning": "the provenace is not dumpable!!!"}),
+            encoding="utf8",
+        )
+    # left by a save that was killed while finalizing
+    shutil.rmtree(folder / "properties", ignore_errors=True)
+    recording.save_metadata_to_folder(folder)
+
+    t_starts = [
+        segment.get_times_kwargs()["t_start"]
+        for segment in recording._recording_segments
+    ]
+    if all(t_start is None for t_start in t_starts):
+        t_starts = None
+    BinaryRecordingExtractor(
+        file_paths=file_paths,
+        sampling_frequency=recording.get_sampling_frequency(),
+        num_channels=recording.get_num_channels(),
+        dtype=dtype,
+        t_starts=t_starts,
+        channel_ids=recording.get_channel_ids(),
+        time_axis=0,
+        file_offset=0,
+        gain_to_uV=recording.get_channel_gains(),
+        offset_to_uV=recording.get_channel_offsets(),
+    ).dump(folder / "binary.json", relative_to=folder)
+
+    cached = BinaryFolderRecording(folder_path=folder)
+    recording.copy_metadata(cached)
+    cached.dump(folder / "si_folder.json", relative_to=folder)
+    return cached
@@ -11,6 +11,7 @@ import spikeinterface as si
 import spikeinterface.preprocessing as sip
 import spikeinterface.sorters as sis
 from spikeinterface.sortingcomponents.peak_detection import detect_peaks
+from spikeinterface.sortingcomponents.peak_pipeline import PipelineNode
 
 from ..common.common_lab import LabMember, LabTeam
 from ..common.common_nwbfile import AnalysisNwbfile
@@ -20,9 +21,13 @@ from .spikesorting_recording import (
     SpikeSortingRecording,
     SpikeSortingRecordingSelection,
 )
+from .zeroed_intervals_recording import ZeroedIntervalsRecording
 
 schema = dj.schema("spikesorting_sorting")
 
+# saved in the sorting folder of the clusterless thresholder
+CLUSTERLESS_MARKS_FILE_NAME = "clusterless_marks.npz"
+
 
 @schema
 class SpikeSorterParameters(dj.Manual):
@@ -170,22 +175,11 @@ class SpikeSorting(dj.Computed):
             if artifact_times.ndim == 1:
                 artifact_times = np.expand_dims(artifact_times, 0)
 
-            # convert artifact intervals to indices
-            list_triggers = []
-            for interval in artifact_times:
-                list_triggers.append(
-                    np.arange(
-                        np.searchsorted(timestamps, interval[0]),
-                        np.searchsorted(timestamps, interval[1]),
-                    )
-                )
-            list_triggers = [list(np.concatenate(list_triggers))]
-            recording = sip.remove_artifacts(
-                recording=recording,
-                list_triggers=list_triggers,
-                ms_before=None,
-                ms_after=None,
-                mode="zeros",
+            # convert artifact intervals to frame ranges, which are zeroed
+            # as the recording is read
+            artifact_frames = np.searchsorted(timestamps, artifact_times)
+            recording = ZeroedIntervalsRecording(
+                recording, list_frame_ranges=[artifact_frames]
             )
 
         print(f"Running spike sorting on {key}...")
@@ -203,11 +197,16 @@ class SpikeSorting(dj.Computed):
             sorter_params.pop("whiten", None)
             sorter_params.pop("outputs", None)
 
-            # Detect peaks for clusterless decoding
-            detected_spikes = detect_peaks(recording, **sorter_params)
+            # Detect peaks for clusterless decoding, reading the amplitudes
+            # of all channels at the peaks in the same pass
+            detected_spikes, marks = detect_peaks(
+                recording,
+                pipeline_nodes=[_ChannelAmplitudes(recording)],
+                **sorter_params,
+            )
             sorting = si.NumpySorting.from_times_labels(
                 times_list=detected_spikes["sample_index"],
-                labels_list=np.zeros(len(detected_spikes), dtype=np.int),
+                labels_list=np.zeros(len(detected_spikes), dtype=int),
                 sampling_frequency=recording.get_sampling_frequency(),
             )
         else:
@@ -235,8 +234,40 @@ class SpikeSorting(dj.Computed):
         if os.path.exists(key["sorting_path"]):
             shutil.rmtree(key["sorting_path"])
         sorting = sorting.save(folder=key["sorting_path"])
+        if sorter == "clusterless_thresholder":
+            order = np.argsort(detected_spikes["sample_index"], kind="stable")
+            np.savez(
+                Path(key["sorting_path"]) / CLUSTERLESS_MARKS_FILE_NAME,
+                frames=detected_spikes["sample_index"][order],
+                marks=marks[order],
+            )
         self.insert1(key)
 
+    @staticmethod
+    def get_clusterless_marks(key: dict):
+        """Returns the amplitudes saved by the clusterless thresholder.
+
+        Parameters
+        ----------
+        key : dict
+            SpikeSorting key
+
+        Returns
+        -------
+        frames : np.ndarray, shape (n_spikes,)
+            Sorted frames of the detected spikes.
+        marks : np.ndarray, shape (n_spikes, n_channels)
+            Amplitudes of all channels at each spike frame, scaled to uV if
+            the recording has gains.
+        Both are None if the sorting has no saved marks.
+        """
+        sorting_path = (SpikeSorting & key).fetch1("sorting_path")
+        marks_path = Path(sorting_path) / CLUSTERLESS_MARKS_FILE_NAME
+        if not marks_path.exists():
+            return None, None
+        with np.load(marks_path) as saved:
+            return saved["frames"], saved["marks"]
+
     def delete(self):
         """Extends the delete method of base class to implement permission
         checking. Note that this is NOT a security feature, as anyone that has
@@ -311,3 +342,35 @@ class SpikeSorting(dj.Computed):
 
     def _import_sorting(self, key):
         raise NotImplementedError
+
+
+class _ChannelAmplitudes(PipelineNode):
+    """Peak pipeline node reading all channels at the frame of each peak.
+
+    Amplitudes are scaled as by `get_traces(return_scaled=True)` if the
+    recording has gains, with the same dtype as the waveforms of
+    `si.extract_waveforms`.
+    """
+
+    def __init__(self, recording, parents=None):
+        PipelineNode.__init__(
+            self, recording, return_output=True, parents=parents
+        )
+        self.return_scaled = recording.has_scaled()
+        self.dtype = np.dtype(recording.get_dtype())
+        if self.return_scaled:
+            self.gains = recording.get_channel_gains().astype("float32")
+            self.offsets = recording.get_channel_offsets().astype("float32")
+            if np.issubdtype(self.dtype, np.integer):
+                self.dtype = np.dtype("float32")
+
+    def get_dtype(self):
+        return self.dtype
+
+    def compute(self, traces, peaks):
+        amplitudes = traces[peaks["sample_index"]]
+        if self.return_scaled:
+            amplitudes = (
+                amplitudes.astype("float32") * self.gains + self.offsets
+            )
+        return amplitudes.astype(self.dtype, copy=False)
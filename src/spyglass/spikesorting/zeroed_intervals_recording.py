@@ -0,0 +1,109 @@
+from typing import List
+
+import numpy as np
+import spikeinterface as si
+from spikeinterface.preprocessing.basepreprocessor import (
+    BasePreprocessor,
+    BasePreprocessorSegment,
+)
+
+
+class ZeroedIntervalsRecording(BasePreprocessor):
+    """Recording with the samples in the given frame ranges set to zero.
+
+    Same as `spikeinterface.preprocessing.remove_artifacts` with
+    mode="zeros" and a trigger for every sample of the ranges, but the
+    ranges are stored as (start, stop) pairs and zeroed as traces are read.
+
+    Parameters
+    ----------
+    recording : si.BaseRecording
+    list_frame_ranges : list of array-like, shape (n_ranges, 2)
+        For each segment, the [start, stop) frames to zero.
+    """
+
+    name = "zeroed_intervals"
+
+    def __init__(
+        self, recording: si.BaseRecording, list_frame_ranges: List[np.ndarray]
+    ):
+        assert (
+            len(list_frame_ranges) == recording.get_num_segments()
+        ), "list_frame_ranges must have one entry per segment"
+        BasePreprocessor.__init__(self, recording)
+
+        list_frame_ranges = [
+            _merge_frame_ranges(frame_ranges)
+            for frame_ranges in list_frame_ranges
+        ]
+        for parent_segment, frame_ranges in zip(
+            recording._recording_segments, list_frame_ranges
+        ):
+            self.add_recording_segment(
+                ZeroedIntervalsRecordingSegment(parent_segment, frame_ranges)
+            )
+
+        self._kwargs = {
+            "recording": recording,
+            "list_frame_ranges": [
+                frame_ranges.tolist() for frame_ranges in list_frame_ranges
+            ],
+        }
+
+
+class ZeroedIntervalsRecordingSegment(BasePreprocessorSegment):
+    def __init__(self, parent_recording_segment, frame_ranges):
+        BasePreprocessorSegment.__init__(self, parent_recording_segment)
+        self.frame_ranges = frame_ranges
+
+    def get_traces(self, start_frame, end_frame, channel_indices):
+        if start_frame is None:
+            start_frame = 0
+        if end_frame is None:
+            end_frame = self.get_num_samples()
+        traces = self.parent_recording_segment.get_traces(
+            start_frame, end_frame, channel_indices
+        )
+
+        # ranges are sorted and disjoint, so those overlapping the chunk are
+        # the ones stopping after its start and starting before its end
+        first = np.searchsorted(self.frame_ranges[:, 1], start_frame, "right")
+        last = np.searchsorted(self.frame_ranges[:, 0], end_frame, "left")
+        if first >= last:
+            return traces
+
+        traces = traces.copy()
+        for range_start, range_stop in self.frame_ranges[first:last]:
+            zero_start = max(range_start, start_frame) - start_frame
+            zero_stop = min(range_stop, end_frame) - start_frame
+            traces[zero_start:zero_stop] = 0
+        return traces
+
+
+def _merge_frame_ranges(frame_ranges):
+    """Sorts frame ranges and merges those that overlap or touch.
+
+    Empty ranges are dropped, so the ranges cover the same frames.
+
+    Parameters
+    ----------
+    frame_ranges : array-like, shape (n_ranges, 2)
+
+    Returns
+    -------
+    frame_ranges : np.ndarray, shape (n_merged_ranges, 2)
+    """
+    frame_ranges = np.asarray(frame_ranges, dtype=np.int64).reshape(-1, 2)
+    frame_ranges = frame_ranges[frame_ranges[:, 1] > frame_ranges[:, 0]]
+    if len(frame_ranges) == 0:
+        return frame_ranges
+
+    frame_ranges = frame_ranges[np.argsort(frame_ranges[:, 0], kind="stable")]
+    starts, stops = frame_ranges[:, 0], frame_ranges[:, 1]
+    running_stop = np.maximum.accumulate(stops)
+    new_range = np.ones(len(frame_ranges), dtype=bool)
+    new_range[1:] = starts[1:] > running_stop[:-1]
+    range_first = np.flatnonzero(new_range)
+    range_last = np.append(range_first[1:], len(frame_ranges)) - 1
+
+    return np.stack((starts[range_first], running_stop[range_last]), axis=1)
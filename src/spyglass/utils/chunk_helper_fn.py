@@ -0,0 +1,39 @@
+"""Helper functions for processing arrays in chunks."""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+
+def run_chunked(func, n_samples, chunk_size=None, n_jobs=1):
+    """Runs func(start, stop) over consecutive chunks of n_samples.
+
+    Chunks run in a pool of n_jobs threads; numpy releases the GIL for the
+    array operations, and the data is shared instead of copied.
+
+    Parameters
+    ----------
+    func : callable
+        Called as func(start, stop) for each chunk.
+    n_samples : int
+    chunk_size : int, optional
+        Number of samples per chunk. Defaults to a single chunk.
+    n_jobs : int, optional
+        Number of threads. None uses one per CPU. Defaults to 1.
+
+    Returns
+    -------
+    results : list
+        Result of func for each chunk, in order.
+    """
+    chunk_size = chunk_size or max(n_samples, 1)
+    bounds = [
+        (start, min(start + chunk_size, n_samples))
+        for start in range(0, n_samples, chunk_size)
+    ] or [(0, 0)]
+
+    n_jobs = min(n_jobs or os.cpu_count(), len(bounds))
+    if n_jobs <= 1:
+        return [func(start, stop) for start, stop in bounds]
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        return list(executor.map(lambda bound: func(*bound), bounds))
@@ -1,11 +1,16 @@
 """Helper functions for manipulating information from DataJoint fetch calls."""
+import bisect
 import inspect
 import os
+from contextlib import suppress
 
 import datajoint as dj
 import numpy as np
+import pandas as pd
+import pynwb
+from hdmf.common import VectorIndex
 
-from .nwb_helper_fn import get_nwb_file
+from .nwb_helper_fn import get_nwb_file, nwb_file_cache
 
 
 def dj_replace(original_table, new_values, key_column, replace_column):
@@ -44,7 +49,7 @@ def dj_replace(original_table, new_values, key_column, replace_column):
     return original_table
 
 
-def fetch_nwb(query_expression, nwb_master, *attrs, **kwargs):
+def fetch_nwb(query_expression, nwb_master, *attrs, lazy=False, **kwargs):
     """Get an NWB object from the given DataJoint query.
 
     Parameters
@@ -58,6 +63,9 @@ def fetch_nwb(query_expression, nwb_master, *attrs, **kwargs):
         attr is usually 'nwb_file_abs_path' or 'analysis_file_abs_path'
     *attrs : list
         Attributes from normal DataJoint fetch call.
+    lazy : bool, optional
+        If True, return each NWB object as an NwbObjectProxy, which reads
+        data from disk only when it is accessed. Default False.
     **kwargs : dict
         Keyword arguments from normal DataJoint fetch call.
 
@@ -86,18 +94,29 @@ def fetch_nwb(query_expression, nwb_master, *attrs, **kwargs):
     )
 
     # TODO: check that the query_expression restricts tbl - CBroz
-    nwb_files = (
-        query_expression * tbl.proj(nwb2load_filepath=attr_name)
-    ).fetch(file_name_str)
+    extra_attrs = [] if file_name_str in attrs else [file_name_str]
+    rec_dicts = (query_expression * tbl.proj()).fetch(
+        *attrs, *extra_attrs, **kwargs
+    )
+    nwb_files = {rec_dict[file_name_str] for rec_dict in rec_dicts}
     for file_name in nwb_files:
         file_path = file_path_fn(file_name)
         if not os.path.exists(file_path):
             # retrieve the file from kachery. This also opens the file and stores the file object
             get_nwb_file(file_path)
 
-    rec_dicts = (
-        query_expression * tbl.proj(nwb2load_filepath=attr_name)
-    ).fetch(*attrs, "nwb2load_filepath", **kwargs)
+    # fetching the filepath attribute lets DataJoint download and check files
+    # kept in an external store, once per file rather than once per entry
+    file_names, file_paths = (
+        tbl.proj(nwb2load_filepath=attr_name)
+        & [{file_name_str: file_name} for file_name in nwb_files]
+    ).fetch(file_name_str, "nwb2load_filepath")
+    file_path_lookup = dict(zip(file_names, file_paths))
+    for rec_dict in rec_dicts:
+        file_path = file_path_lookup[rec_dict[file_name_str]]
+        rec_dict["nwb2load_filepath"] = file_path
+        for attr in extra_attrs:
+            del rec_dict[attr]
 
     if not rec_dicts or not np.any(
         ["object_id" in key for key in rec_dicts[0]]
@@ -106,12 +125,16 @@ def fetch_nwb(query_expression, nwb_master, *attrs, **kwargs):
 
     ret = []
     for rec_dict in rec_dicts:
-        nwbf = get_nwb_file(rec_dict.pop("nwb2load_filepath"))
+        file_path = rec_dict.pop("nwb2load_filepath")
+        # proxies hold their file open themselves, eager objects pin it
+        nwbf = None if lazy else get_nwb_file(file_path)
         # for each attr that contains substring 'object_id', store key-value: attr name to NWB object
         # remove '_object_id' from attr name
         nwb_objs = {
-            id_attr.replace("_object_id", ""): _get_nwb_object(
-                nwbf.objects, rec_dict[id_attr]
+            id_attr.replace("_object_id", ""): (
+                NwbObjectProxy(file_path, rec_dict[id_attr])
+                if lazy
+                else _get_nwb_object(nwbf.objects, rec_dict[id_attr])
             )
             for id_attr in attrs
             if "object_id" in id_attr and rec_dict[id_attr] != ""
@@ -128,6 +151,158 @@ def _get_nwb_object(objects, object_id):
         return objects[object_id]
 
 
+class NwbObjectProxy:
+    """Lazy stand-in for an NWB object returned by `fetch_nwb(lazy=True)`.
+
+    Attribute access is forwarded to the underlying NWB object, whose data
+    and timestamps stay HDF5-backed until they are indexed. `to_dataframe`
+    returns what `fetch_nwb` returns without `lazy`, and `time_slice` reads
+    only the samples or spikes inside a time window.
+
+    The proxy acquires its file from `nwb_file_cache`, so that the file is not
+    closed while the proxy is in use, and releases it on `close`, on leaving
+    a `with` block, or when the proxy is garbage collected.
+
+    Parameters
+    ----------
+    nwb_file_path : str
+        Absolute path of the NWB file.
+    object_id : str
+        The object ID of the NWB object.
+    """
+
+    def __init__(self, nwb_file_path, object_id):
+        self._nwb_file_path = None
+        nwbf = nwb_file_cache.acquire(nwb_file_path)
+        self._nwb_file_path = nwb_file_path
+        self.nwb_object = nwbf.objects[object_id]
+        self.object_id = object_id
+        self._dataframe = None
+
+    def __getattr__(self, name):
+        if name in ("nwb_object", "_nwb_file_path"):  # e.g. while unpickling
+            raise AttributeError(name)
+        return getattr(self.nwb_object, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __del__(self):
+        # the cache may have closed all files already, e.g. at exit
+        with suppress(AttributeError, ValueError):
+            self.close()
+
+    def close(self):
+        """Release the file, which the cache may then close. Data not yet
+        read cannot be read afterwards."""
+        nwb_file_path, self._nwb_file_path = self._nwb_file_path, None
+        if nwb_file_path is not None:
+            nwb_file_cache.release(nwb_file_path)
+
+    def __len__(self):
+        """Number of rows of a table, or of samples of a time series."""
+        if isinstance(self.nwb_object, pynwb.TimeSeries):
+            return len(self.nwb_object.data)
+        return len(self.nwb_object)
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}({self.nwb_object.__class__.__name__} "
+            + f"'{self.nwb_object.name}', object_id={self.object_id})"
+        )
+
+    def to_dataframe(self):
+        """Load the object as `fetch_nwb(lazy=False)` would. Cached."""
+        if self._dataframe is None:
+            self._dataframe = _get_nwb_object(
+                {self.object_id: self.nwb_object}, self.object_id
+            )
+        return self._dataframe
+
+    def time_slice(self, start, stop):
+        """Read the part of the object within [start, stop], in seconds.
+
+        Parameters
+        ----------
+        start : float
+            Start time of the window.
+        stop : float
+            Stop time of the window.
+
+        Returns
+        -------
+        pd.DataFrame
+            For a time series, its data indexed by time. For a table with a
+            'spike_times' column (e.g. Units), each row's spike times within
+            the window and the table's other non-ragged columns. For a table
+            with 'start_time' and 'stop_time' columns, the rows overlapping
+            the window.
+        """
+        obj = self.nwb_object
+        if isinstance(obj, pynwb.TimeSeries):
+            return self._time_series_slice(start, stop)
+
+        colnames = getattr(obj, "colnames", ())
+        if "spike_times" in colnames:
+            return self._spike_times_slice(start, stop)
+        if "start_time" in colnames and "stop_time" in colnames:
+            rows = np.flatnonzero(
+                (obj["start_time"][:] <= stop) & (obj["stop_time"][:] >= start)
+            )
+            return obj[rows] if len(rows) else obj.to_dataframe().iloc[:0]
+
+        raise TypeError(
+            f"Cannot slice {obj.__class__.__name__} '{obj.name}' by time"
+        )
+
+    def _time_series_slice(self, start, stop):
+        obj = self.nwb_object
+        if obj.timestamps is not None:
+            timestamps = obj.timestamps
+            first = bisect.bisect_left(timestamps, start)
+            last = bisect.bisect_right(timestamps, stop)
+            timestamps = np.asarray(timestamps[first:last])
+        else:
+            first = max(0, int(np.ceil((start - obj.starting_time) * obj.rate)))
+            last = min(
+                len(obj.data),
+                int(np.floor((stop - obj.starting_time) * obj.rate)) + 1,
+            )
+            timestamps = obj.starting_time + np.arange(first, last) / obj.rate
+
+        data = np.asarray(obj.data[first:last])
+        return pd.DataFrame(
+            data.reshape(len(data), int(np.prod(data.shape[1:]))),
+            index=pd.Index(timestamps, name="time"),
+        )
+
+    def _spike_times_slice(self, start, stop):
+        obj = self.nwb_object
+        # ragged column: one flat dataset of spike times plus end offsets
+        spike_times = obj["spike_times"].target.data
+        spike_ends = np.asarray(obj["spike_times"].data[:])
+        spike_starts = np.concatenate(([0], spike_ends[:-1]))
+
+        windowed = []
+        for unit_start, unit_end in zip(spike_starts, spike_ends):
+            first = bisect.bisect_left(spike_times, start, unit_start, unit_end)
+            last = bisect.bisect_right(spike_times, stop, first, unit_end)
+            windowed.append(np.asarray(spike_times[first:last]))
+
+        columns = {
+            name: obj[name].data[:]
+            for name in obj.colnames
+            if name != "spike_times" and not isinstance(obj[name], VectorIndex)
+        }
+        return pd.DataFrame(
+            {"spike_times": windowed, **columns},
+            index=pd.Index(obj.id[:], name="id"),
+        )
+
+
 def get_child_tables(table):
     table = table() if inspect.isclass(table) else table
     return [
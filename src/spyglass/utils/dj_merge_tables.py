@@ -1,8 +1,11 @@
+from collections import defaultdict
 from contextlib import nullcontext
 from itertools import chain as iter_chain
 from pprint import pprint
+from uuid import UUID
 
 import datajoint as dj
+import numpy as np
 from datajoint.condition import make_condition
 from datajoint.errors import DataJointError
 from datajoint.preview import repr_html
@@ -17,6 +20,15 @@ RESERVED_SECONDARY_KEY = "source"
 RESERVED_SK_LENGTH = 32
 
 
+def _normalize_key_value(value):
+    """Compare uuids and numpy scalars in keys as their python values."""
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
 class Merge(dj.Manual):
     """Adds funcs to support standard Merge table operations.
 
@@ -272,45 +284,110 @@ class Merge(dj.Manual):
                 if from_camel_case(part_name) in p.full_table_name
             ]
 
+        rows = list(rows)
+        part_parents = {p: p.parents(as_objects=True)[-1] for p in parts}
+        # one query per part parent: the keys matching each row, in row order
+        part_keys = {
+            part: cls._fetch_parent_keys(part_parent, rows)
+            for part, part_parent in part_parents.items()
+        }
+        reserved_pk, reserved_sk = cls()._reserved_pk, cls()._reserved_sk
+
         master_entries = []
         parts_entries = {p: [] for p in parts}
-        for row in rows:
-            keys = []  # empty to-be-inserted key
-            for part in parts:  # check each part
-                part_parent = part.parents(as_objects=True)[-1]
-                part_name = to_camel_case(part.table_name.split("__")[-1])
-                if part_parent & row:  # if row is in part parent
-                    if keys and mutual_exclusvity:  # if key from other part
-                        raise ValueError(
-                            "Mutual Exclusivity Error! Entry exists in more "
-                            + f"than one table - Entry: {row}"
-                        )
-
-                    keys = (part_parent & row).fetch("KEY")  # get pk
-                    if len(keys) > 1:
-                        raise ValueError(
-                            "Ambiguous entry. Data has mult rows in "
-                            + f"{part_name}:\n\tData:{row}\n\t{keys}"
-                        )
-                    master_pk = {  # make uuid
-                        cls()._reserved_pk: dj.hash.key_hash(keys[0]),
-                    }
-                    parts_entries[part].append({**master_pk, **keys[0]})
-                    master_entries.append(
-                        {**master_pk, cls()._reserved_sk: part_name}
-                    )
-
-            if not keys:
+        for row_index, row in enumerate(rows):
+            matches = {
+                part: keys[row_index]
+                for part, keys in part_keys.items()
+                if keys[row_index]
+            }
+            if not matches:  # recheck in the database before raising
+                for part, part_parent in part_parents.items():
+                    keys = (part_parent & row).fetch("KEY")
+                    if keys:
+                        matches[part] = keys
+            if not matches:
                 raise ValueError(
                     "Non-existing entry in any of the parent tables - Entry: "
                     + f"{row}"
                 )
+            if len(matches) > 1 and mutual_exclusvity:
+                raise ValueError(
+                    "Mutual Exclusivity Error! Entry exists in more "
+                    + f"than one table - Entry: {row}"
+                )
+
+            for part, keys in matches.items():
+                part_name = to_camel_case(part.table_name.split("__")[-1])
+                if len(keys) > 1:
+                    raise ValueError(
+                        "Ambiguous entry. Data has mult rows in "
+                        + f"{part_name}:\n\tData:{row}\n\t{keys}"
+                    )
+                master_pk = {  # make uuid
+                    reserved_pk: dj.hash.key_hash(keys[0]),
+                }
+                parts_entries[part].append({**master_pk, **keys[0]})
+                master_entries.append({**master_pk, reserved_sk: part_name})
 
         with cls._safe_context():
             super().insert(cls(), master_entries, **kwargs)
             for part, part_entries in parts_entries.items():
                 part.insert(part_entries, **kwargs)
 
+    @staticmethod
+    def _fetch_parent_keys(part_parent, rows: list) -> list:
+        """Primary keys of part_parent matching each row, in one query.
+
+        Parameters
+        ---------
+        part_parent: dj.Table
+            Parent table of a merge part.
+        rows: List[dict]
+            Rows to be inserted. Attributes not in part_parent are ignored,
+            as when restricting by a dict.
+
+        Returns
+        -------
+        List[List[dict]]
+            For each row, the primary keys of part_parent that it matches.
+        """
+        heading = part_parent.heading.names
+        restrictions = [
+            {k: v for k, v in row.items() if k in heading} for row in rows
+        ]
+        if not restrictions:
+            return []
+
+        attrs = set(part_parent.primary_key)
+        for restriction in restrictions:
+            attrs.update(restriction)
+        entries = (part_parent & restrictions).fetch(
+            *sorted(attrs), as_dict=True
+        )
+
+        def to_key(values):
+            return tuple(_normalize_key_value(v) for v in values)
+
+        # index the entries once for each set of restricting attributes
+        lookups = dict()
+        matches = []
+        for restriction in restrictions:
+            names = tuple(sorted(restriction))
+            try:
+                if names not in lookups:
+                    lookup = defaultdict(list)
+                    for entry in entries:
+                        lookup[to_key(entry[n] for n in names)].append(
+                            {k: entry[k] for k in part_parent.primary_key}
+                        )
+                    lookups[names] = lookup
+                value = to_key(restriction[n] for n in names)
+                matches.append(lookups[names].get(value, []))
+            except TypeError:  # unhashable value, e.g. an array
+                matches.append((part_parent & restriction).fetch("KEY"))
+        return matches
+
     @classmethod
     def _safe_context(cls):
         """Return transaction if not already in one."""
@@ -19,6 +19,9 @@ class SpyglassMixin:
         A class that does not have with either '-> Nwbfile' or
         '-> AnalysisNwbfile' in its definition can use a _nwb_table attribute to
         specify which table to use.
+
+        Pass lazy=True to get each NWB object as an NwbObjectProxy that reads
+        data only when accessed and can be sliced by time with `time_slice`.
         """
 
         if not hasattr(self, "_nwb_table"):
@@ -3,15 +3,17 @@
 import os
 import os.path
 import warnings
+from collections import OrderedDict
+from contextlib import contextmanager
 from itertools import groupby
 from pathlib import Path
+from threading import RLock
 
+import h5py
 import numpy as np
 import pynwb
 import yaml
-
-# dict mapping file path to an open NWBHDF5IO object in read mode and its NWBFile
-__open_nwb_files = dict()
+from hdmf.common import DynamicTable
 
 # dict mapping NWB file path to config after it is loaded once
 __configs = dict()
@@ -20,12 +22,194 @@ global invalid_electrode_index
 invalid_electrode_index = 99999999
 
 
+class NwbFileCache:
+    """Least-recently-used cache of NWB files open in read mode.
+
+    Holds at most `max_handles` open `NWBHDF5IO` objects, whose files total
+    at most `max_size` bytes on disk. When a newly opened file exceeds either
+    limit, the least recently used files are closed. Files acquired with
+    `acquire` (or the `open` context manager) are reference counted and are
+    never closed while their count is above zero, even if that means
+    temporarily exceeding the limits.
+
+    Files returned by `get` are pinned: their callers may keep objects read
+    from them for any time, so they are never evicted, only closed by
+    `close_all`. Callers that only use a file inside a block should use
+    `open` instead, so that it can be closed once unused.
+
+    Parameters
+    ----------
+    max_handles : int, optional
+        Maximum number of open files. Default 32.
+    max_size : int, optional
+        Maximum total size of open files, in bytes. Default 200 GB.
+    """
+
+    def __init__(self, max_handles: int = 32, max_size: int = 200 * 1024**3):
+        self.max_handles = max_handles
+        self.max_size = max_size
+        # path -> [io, nwbfile, size, ref_count, pinned], least recently
+        # used first
+        self._files = OrderedDict()
+        self._lock = RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_size = 0
+
+    def __contains__(self, nwb_file_path):
+        return nwb_file_path in self._files
+
+    def __len__(self):
+        return len(self._files)
+
+    @property
+    def size(self) -> int:
+        """Total size in bytes of the open files."""
+        return sum(entry[2] for entry in self._files.values())
+
+    @property
+    def stats(self) -> dict:
+        """Hit, miss and eviction counters and current cache occupancy."""
+        with self._lock:
+            return dict(
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+                evicted_size=self.evicted_size,
+                open_handles=len(self._files),
+                open_size=self.size,
+                in_use={
+                    path: entry[3]
+                    for path, entry in self._files.items()
+                    if entry[3] > 0
+                },
+                pinned=[
+                    path for path, entry in self._files.items() if entry[4]
+                ],
+            )
+
+    def get(self, nwb_file_path: str) -> pynwb.NWBFile:
+        """Return the NWBFile for an absolute path, opening it if needed.
+
+        The file is pinned, i.e. never evicted.
+        """
+        with self._lock:
+            entry = self._get_entry(nwb_file_path)
+            entry[4] = True
+            return entry[1]
+
+    def acquire(self, nwb_file_path: str) -> pynwb.NWBFile:
+        """Return the NWBFile and protect it from eviction until released."""
+        with self._lock:
+            entry = self._get_entry(nwb_file_path)
+            entry[3] += 1
+            return entry[1]
+
+    def release(self, nwb_file_path: str):
+        """Release a file previously returned by `acquire`."""
+        with self._lock:
+            entry = self._files.get(nwb_file_path)
+            if entry is None or entry[3] == 0:
+                raise ValueError(f"NWB file was not acquired: {nwb_file_path}")
+            entry[3] -= 1
+            self._evict()
+
+    @contextmanager
+    def open(self, nwb_file_path: str):
+        """Context manager yielding an NWBFile that is not evicted inside."""
+        nwbfile = self.acquire(nwb_file_path)
+        try:
+            yield nwbfile
+        finally:
+            self.release(nwb_file_path)
+
+    def close_all(self):
+        """Close every open file, including those still acquired."""
+        with self._lock:
+            for io, *_ in self._files.values():
+                io.close()
+            self._files.clear()
+
+    def _get_entry(self, nwb_file_path):
+        entry = self._files.get(nwb_file_path)
+        if entry is not None:
+            self.hits += 1
+            self._files.move_to_end(nwb_file_path)
+            return entry
+
+        self.misses += 1
+        io = pynwb.NWBHDF5IO(
+            path=nwb_file_path, mode="r", load_namespaces=True
+        )  # keep file open
+        entry = [io, io.read(), os.path.getsize(nwb_file_path), 0, False]
+        self._files[nwb_file_path] = entry
+        self._evict(keep=nwb_file_path)
+        return entry
+
+    def _evict(self, keep=None):
+        """Close least recently used, unreferenced and unpinned files until
+        within limits.
+
+        Parameters
+        ----------
+        keep : str, optional
+            Path of a file that must not be closed, e.g. one just opened.
+        """
+        size = self.size
+        for path in list(self._files):
+            if len(self._files) <= self.max_handles and size <= self.max_size:
+                break
+            io, _, file_size, ref_count, pinned = self._files[path]
+            if ref_count > 0 or pinned or path == keep:
+                continue
+            io.close()
+            del self._files[path]
+            size -= file_size
+            self.evictions += 1
+            self.evicted_size += file_size
+
+
+# NWB files open in read mode, shared by all callers of get_nwb_file
+nwb_file_cache = NwbFileCache()
+
+
+def _resolve_nwb_file_path(nwb_file_path):
+    """Return the absolute path of an NWB file, downloading it if needed.
+
+    Returns None if the file is neither local nor available on kachery.
+    """
+    if not nwb_file_path.startswith("/"):
+        from ..common import Nwbfile
+
+        nwb_file_path = Nwbfile.get_abs_path(nwb_file_path)
+
+    if nwb_file_path in nwb_file_cache or os.path.exists(nwb_file_path):
+        return nwb_file_path
+
+    print(f"NWB file not found locally; checking kachery for {nwb_file_path}")
+    # first try the analysis files
+    from ..sharing.sharing_kachery import AnalysisNwbfileKachery
+
+    # the download functions assume just the filename, so we need to
+    # get that from the path
+    if not AnalysisNwbfileKachery.download_file(
+        os.path.basename(nwb_file_path)
+    ):
+        return None
+    return nwb_file_path
+
+
 def get_nwb_file(nwb_file_path):
     """Return an NWBFile object with the given file path in read mode.
 
     If the file is not found locally, this will check if it has been shared
     with kachery and if so, download it and open it.
 
+    The file is kept open in `nwb_file_cache` and never evicted, since the
+    objects read from it may be used at any later time. Use `open_nwb_file`
+    when the file is only needed inside a block, so that it can be closed
+    once unused.
 
     Parameters
     ----------
@@ -38,37 +222,37 @@ def get_nwb_file(nwb_file_path):
     nwbfile : pynwb.NWBFile
         NWB file object for the given path opened in read mode.
     """
-    if not nwb_file_path.startswith("/"):
-        from ..common import Nwbfile
+    nwb_file_path = _resolve_nwb_file_path(nwb_file_path)
+    if nwb_file_path is None:
+        return None
+    return nwb_file_cache.get(nwb_file_path)
 
-        nwb_file_path = Nwbfile.get_abs_path(nwb_file_path)
 
-    _, nwbfile = __open_nwb_files.get(nwb_file_path, (None, None))
+@contextmanager
+def open_nwb_file(nwb_file_path):
+    """Context manager version of `get_nwb_file`.
 
-    if nwbfile is None:
-        # check to see if the file exists
-        if not os.path.exists(nwb_file_path):
-            print(
-                "NWB file not found locally; checking kachery for "
-                + f"{nwb_file_path}"
-            )
-            # first try the analysis files
-            from ..sharing.sharing_kachery import AnalysisNwbfileKachery
+    The file is reference counted in `nwb_file_cache`, so it is not closed by
+    eviction before the context exits.
 
-            # the download functions assume just the filename, so we need to
-            # get that from the path
-            if not AnalysisNwbfileKachery.download_file(
-                os.path.basename(nwb_file_path)
-            ):
-                return None
-        # now open the file
-        io = pynwb.NWBHDF5IO(
-            path=nwb_file_path, mode="r", load_namespaces=True
-        )  # keep file open
-        nwbfile = io.read()
-        __open_nwb_files[nwb_file_path] = (io, nwbfile)
+    Parameters
+    ----------
+    nwb_file_path : str
+        Path to the NWB file or NWB file name. If it does not start with a "/",
+        get path with Nwbfile.get_abs_path
 
-    return nwbfile
+    Yields
+    ------
+    nwbfile : pynwb.NWBFile
+        NWB file object for the given path opened in read mode, or None if the
+        file could not be found.
+    """
+    nwb_file_path = _resolve_nwb_file_path(nwb_file_path)
+    if nwb_file_path is None:
+        yield None
+        return
+    with nwb_file_cache.open(nwb_file_path) as nwbfile:
+        yield nwbfile
 
 
 def get_config(nwb_file_path):
@@ -103,9 +287,99 @@ def get_config(nwb_file_path):
 
 
 def close_nwb_files():
-    for io, _ in __open_nwb_files.values():
-        io.close()
-    __open_nwb_files.clear()
+    nwb_file_cache.close_all()
+
+
+# top-level datasets and groups copied into a minimal NWB file. /general holds
+# the session metadata, subject, devices, electrode groups and electrodes table
+MINIMAL_NWB_OBJECTS = (
+    "file_create_date",
+    "general",
+    "identifier",
+    "session_description",
+    "session_start_time",
+    "specifications",
+    "timestamps_reference_time",
+)
+# groups required by the NWB schema, created empty in a minimal NWB file
+MINIMAL_NWB_EMPTY_GROUPS = (
+    "acquisition",
+    "analysis",
+    "processing",
+    "stimulus/presentation",
+    "stimulus/templates",
+)
+
+
+def write_minimal_nwb_file(nwb_file_path, new_nwb_file_path):
+    """Write an NWB file holding only the metadata of another NWB file.
+
+    The new file has the session metadata, subject, devices, electrode groups
+    and electrodes table of the original, with the same object IDs, and no
+    data. Objects are copied at the HDF5 level, so unlike reading the file and
+    exporting it, the cost does not depend on the size of the original.
+
+    Parameters
+    ----------
+    nwb_file_path : str
+        Absolute path of the NWB file to copy metadata from.
+    new_nwb_file_path : str
+        Absolute path of the NWB file to write.
+    """
+    with h5py.File(nwb_file_path, "r") as src, h5py.File(
+        new_nwb_file_path, "w"
+    ) as dst:
+        for name in MINIMAL_NWB_OBJECTS:
+            if name in src:
+                # expand_refs keeps references inside the copied group (e.g.
+                # from the electrodes table to electrode groups) valid
+                src.copy(src[name], dst, name=name, expand_refs=True)
+        # objects copied for references are also linked from the destination
+        # group as "~obj_pointed_by_<address>"; they are already linked in
+        # /general, so drop the extra links
+        for name in list(dst):
+            if name.startswith("~obj_pointed_by_"):
+                del dst[name]
+        for name in MINIMAL_NWB_EMPTY_GROUPS:
+            dst.require_group(name)
+        for attr, value in src.attrs.items():
+            if isinstance(value, h5py.Reference):  # e.g. .specloc
+                value = dst[src[value].name].ref
+            dst.attrs[attr] = value
+
+
+def export_pruned_nwb_file(nwb_file_path, new_nwb_file_path, keep_fields):
+    """Export a copy of an NWB file without the contents of most fields.
+
+    Every field of the NWBFile not in `keep_fields` that is a dictionary of
+    NWB objects (e.g. acquisition, processing) is emptied before the export.
+
+    Parameters
+    ----------
+    nwb_file_path : str
+        Absolute path of the NWB file to copy.
+    new_nwb_file_path : str
+        Absolute path of the NWB file to write.
+    keep_fields : Iterable[str]
+        Names of the NWBFile fields to keep.
+    """
+    with pynwb.NWBHDF5IO(
+        path=nwb_file_path, mode="r", load_namespaces=True
+    ) as io:
+        nwbf = io.read()
+        # pop off the unnecessary elements to save space
+        nwb_fields = nwbf.fields
+        for field in nwb_fields:
+            if field not in keep_fields:
+                nwb_object = getattr(nwbf, field)
+                if isinstance(nwb_object, pynwb.core.LabelledDict):
+                    for module in list(nwb_object.keys()):
+                        nwb_object.pop(module)
+        # export the new NWB file
+        with pynwb.NWBHDF5IO(
+            path=new_nwb_file_path, mode="w", manager=io.manager
+        ) as export_io:
+            export_io.export(io, nwbf)
 
 
 def get_data_interface(nwbfile, data_interface_name, data_interface_class=None):
@@ -314,52 +588,65 @@ def get_electrode_indices(nwb_object, electrode_ids):
     then the indices returned are relative to the selected rows in
     ElectricalSeries.electrodes. For example, if electricalseries.electrodes =
     [5], and row index 5 of nwbfile.electrodes has ID 10, then calling
-    get_electrode_indices(electricalseries, 10) will return 0, the index of the
-    matching electrode in electricalseries.electrodes.
+    get_electrode_indices(electricalseries, [10]) will return [0], the index
+    of the matching electrode in electricalseries.electrodes.
 
     Indices for electrode_ids that are not in the electrical series are
-    returned as np.nan
+    returned as `invalid_electrode_index`.
 
-    If an NWBFile is given, then the row indices with the matching IDs in the
-    file's electrodes table are returned.
+    If an NWBFile, or its electrodes table, is given, then the row indices
+    with the matching IDs in the file's electrodes table are returned.
+
+    IDs are looked up in the sorted electrode IDs, so the cost is
+    O((N + M) log N) for N electrodes and M IDs. If an ID appears more than
+    once, the index of its first appearance is returned.
 
     Parameters
     ----------
-    nwb_object : pynwb.NWBFile or pynwb.ecephys.ElectricalSeries
-        The NWB file object or NWB electrical series object.
+    nwb_object : pynwb.NWBFile, pynwb.ecephys.ElectricalSeries or
+    hdmf.common.DynamicTable
+        The NWB file object, NWB electrical series object or electrodes table.
     electrode_ids : np.ndarray or list
         Array or list of electrode IDs.
 
     Returns
     -------
-    electrode_indices : list
-        Array of indices of the specified electrode IDs.
+    electrode_indices : np.ndarray or list
+        Indices of the specified electrode IDs, as an array if electrode_ids
+        is an array and as a list otherwise.
     """
     if isinstance(nwb_object, pynwb.ecephys.ElectricalSeries):
         # electrodes is a DynamicTableRegion which may contain a subset of the
         # rows in NWBFile.electrodes match against only the subset of
         # electrodes referenced by this ElectricalSeries
         electrode_table_indices = nwb_object.electrodes.data[:]
-        selected_elect_ids = [
-            nwb_object.electrodes.table.id[x] for x in electrode_table_indices
+        selected_elect_ids = np.asarray(nwb_object.electrodes.table.id[:])[
+            electrode_table_indices
         ]
     elif isinstance(nwb_object, pynwb.NWBFile):
         # electrodes is a DynamicTable that contains all electrodes
-        selected_elect_ids = list(nwb_object.electrodes.id[:])
+        selected_elect_ids = np.asarray(nwb_object.electrodes.id[:])
+    elif isinstance(nwb_object, DynamicTable):
+        selected_elect_ids = np.asarray(nwb_object.id[:])
     else:
         raise ValueError(
-            "nwb_object must be of type ElectricalSeries or NWBFile"
+            "nwb_object must be of type ElectricalSeries, NWBFile or "
+            + "DynamicTable"
         )
 
     # for each electrode_id, find its index in selected_elect_ids and return
     # that if it's there and invalid_electrode_index if not.
+    sorted_ids, first_index = np.unique(selected_elect_ids, return_index=True)
+    ids = np.asarray(electrode_ids).ravel()
+    position = np.searchsorted(sorted_ids, ids)
+    found = position < len(sorted_ids)
+    found[found] = sorted_ids[position[found]] == ids[found]
+    electrode_indices = np.full(len(ids), invalid_electrode_index)
+    electrode_indices[found] = first_index[position[found]]
 
-    return [
-        selected_elect_ids.index(elect_id)
-        if elect_id in selected_elect_ids
-        else invalid_electrode_index
-        for elect_id in electrode_ids
-    ]
+    if isinstance(electrode_ids, np.ndarray):
+        return electrode_indices.reshape(electrode_ids.shape)
+    return electrode_indices.tolist()
 
 
 def _get_epoch_groups(position: pynwb.behavior.Position):
@@ -404,25 +691,38 @@ def _get_pos_dict(
     pos_data_dict = dict()
     all_spatial_series = list(position.values())
 
-    for epoch, index_list in enumerate(epoch_groups.values()):
-        pos_data_dict[epoch] = []
-        for index in index_list:
-            spatial_series = all_spatial_series[index]
-            valid_times = None
-            if incl_times:  # get the valid intervals for the position data
-                timestamps = np.asarray(spatial_series.timestamps)
+    valid_times = [None] * len(all_spatial_series)
+    if incl_times:  # get the valid intervals for the position data
+        # series of an epoch often link the same timestamps dataset: read it
+        # and find its valid intervals once for all of them
+        timestamps_valid_times = dict()
+        for index, spatial_series in enumerate(all_spatial_series):
+            timestamps = spatial_series.timestamps
+            timestamps_key = (
+                timestamps
+                if isinstance(timestamps, h5py.Dataset)
+                else id(timestamps)
+            )
+            if timestamps_key not in timestamps_valid_times:
+                timestamps = np.asarray(timestamps)
                 sampling_rate = estimate_sampling_rate(
                     timestamps, verbose=verbose, filename=session_id
                 )
-                valid_times = get_valid_intervals(
+                timestamps_valid_times[timestamps_key] = get_valid_intervals(
                     timestamps=timestamps,
                     sampling_rate=sampling_rate,
                     min_valid_len=int(sampling_rate),
                 )
+            valid_times[index] = timestamps_valid_times[timestamps_key]
+
+    for epoch, index_list in enumerate(epoch_groups.values()):
+        pos_data_dict[epoch] = []
+        for index in index_list:
+            spatial_series = all_spatial_series[index]
             # add the valid intervals to the Interval list
             pos_data_dict[epoch].append(
                 {
-                    "valid_times": valid_times,
+                    "valid_times": valid_times[index],
                     "raw_position_object_id": spatial_series.object_id,
                     "name": spatial_series.name,
                 }
@@ -0,0 +1,156 @@
+import datetime
+import os
+import tempfile
+
+import numpy as np
+import pynwb
+import pytest
+
+pytest.importorskip("ghostipy")
+
+from spyglass.common.common_filter import FirFilterParameters  # noqa: E402
+
+
+def _make_nwbfile(electrode_ids):
+    nwbfile = pynwb.NWBFile(
+        session_description="session_description",
+        identifier="identifier",
+        session_start_time=datetime.datetime.now(datetime.timezone.utc),
+    )
+    dev = nwbfile.create_device(name="device")
+    elec_group = nwbfile.create_electrode_group(
+        name="electrodes",
+        description="description",
+        location="location",
+        device=dev,
+    )
+    for electrode_id in electrode_ids:
+        nwbfile.add_electrode(
+            id=electrode_id,
+            x=0.0,
+            y=0.0,
+            z=0.0,
+            imp=-1.0,
+            location="location",
+            filtering="filtering",
+            group=elec_group,
+        )
+    return nwbfile
+
+
+def _write_raw_file(path, electrode_ids, data, timestamps):
+    nwbfile = _make_nwbfile(electrode_ids)
+    nwbfile.add_acquisition(
+        pynwb.ecephys.ElectricalSeries(
+            name="eseries",
+            data=data,
+            timestamps=timestamps,
+            electrodes=nwbfile.create_electrode_table_region(
+                list(range(len(electrode_ids))), "electrodes"
+            ),
+        )
+    )
+    with pynwb.NWBHDF5IO(path, "w") as io:
+        io.write(nwbfile)
+
+
+def test_filter_data_nwb_electrode_id_array():
+    electrode_ids = [10, 11, 12, 13]
+    n_samples = 1000
+    timestamps = np.arange(n_samples) / 1000.0
+    data = (
+        np.random.default_rng(0)
+        .normal(size=(n_samples, len(electrode_ids)))
+        .astype(np.float32)
+    )
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        raw_path = os.path.join(tmpdir, "raw.nwb")
+        analysis_path = os.path.join(tmpdir, "analysis.nwb")
+
+        _write_raw_file(raw_path, electrode_ids, data, timestamps)
+        with pynwb.NWBHDF5IO(analysis_path, "w") as io:
+            io.write(_make_nwbfile(electrode_ids))
+
+        with pynwb.NWBHDF5IO(raw_path, "r") as io:
+            eseries = io.read().acquisition["eseries"]
+            FirFilterParameters().filter_data_nwb(
+                analysis_path,
+                eseries,
+                np.ones(5) / 5,
+                np.array([[timestamps[0], timestamps[-1]]]),
+                np.array([11, 13]),
+                decimation=2,
+                n_jobs=1,
+            )
+
+        with pynwb.NWBHDF5IO(analysis_path, "r") as io:
+            filtered = io.read().scratch["filtered data"]
+            assert list(filtered.electrodes.data[:]) == [1, 3]
+            assert filtered.data.shape[1] == 2
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_filter_data_nwb_chunked_equals_single_pass(n_jobs):
+    electrode_ids = [10, 11, 12, 13, 14]
+    n_samples = 1000
+    timestamps = np.arange(n_samples) / 1000.0
+    data = (
+        np.random.default_rng(1)
+        .normal(size=(n_samples, len(electrode_ids)))
+        .astype(np.float32)
+    )
+    filter_coeff = np.hanning(21) / np.hanning(21).sum()
+    valid_times = np.array(
+        [
+            [timestamps[0], timestamps[250]],
+            [timestamps[300], timestamps[301]],
+            [timestamps[400], timestamps[990]],
+        ]
+    )
+    filter_ids = [10, 12, 13, 14]
+    decimation = 3
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        raw_path = os.path.join(tmpdir, "raw.nwb")
+        _write_raw_file(raw_path, electrode_ids, data, timestamps)
+
+        results = []
+        for chunk_kwargs in [
+            dict(),  # one chunk per interval and electrode block
+            dict(chunk_samples=37, electrodes_per_chunk=3, n_jobs=n_jobs),
+        ]:
+            analysis_path = os.path.join(tmpdir, f"{len(results)}.nwb")
+            with pynwb.NWBHDF5IO(analysis_path, "w") as io:
+                io.write(_make_nwbfile(electrode_ids))
+            with pynwb.NWBHDF5IO(raw_path, "r") as io:
+                eseries = io.read().acquisition["eseries"]
+                FirFilterParameters().filter_data_nwb(
+                    analysis_path,
+                    eseries,
+                    filter_coeff,
+                    valid_times,
+                    filter_ids,
+                    decimation,
+                    **chunk_kwargs,
+                )
+            with pynwb.NWBHDF5IO(analysis_path, "r") as io:
+                filtered = io.read().scratch["filtered data"]
+                results.append((filtered.data[:], filtered.timestamps[:]))
+
+    single_data, single_timestamps = results[0]
+    chunked_data, chunked_timestamps = results[1]
+    np.testing.assert_array_equal(chunked_timestamps, single_timestamps)
+    np.testing.assert_allclose(chunked_data, single_data, rtol=1e-5, atol=1e-6)
+
+    # same result as filtering the data in memory
+    expected_data, expected_timestamps = FirFilterParameters().filter_data(
+        timestamps,
+        data,
+        filter_coeff,
+        valid_times,
+        [0, 2, 3, 4],
+        decimation,
+    )
+    np.testing.assert_array_equal(single_timestamps, expected_timestamps)
+    np.testing.assert_allclose(single_data, expected_data, rtol=1e-5, atol=1e-6)
@@ -1,5 +1,15 @@
 import numpy as np
+from hypothesis import given, settings
+from hypothesis import strategies as st
 from spyglass.common.common_interval import (
+    _consolidate_intervals_reduce,
+    _interval_list_contains_ind_loop,
+    _interval_list_intersect_pairwise,
+    consolidate_intervals,
+    interval_from_inds,
+    interval_list_contains,
+    interval_list_contains_ind,
+    interval_list_excludes,
     interval_list_intersect,
     interval_set_difference_inds,
 )
@@ -20,6 +30,12 @@ def test_interval_list_intersect2():
     assert len(intersection_list) == 0
 
 
+def test_interval_from_inds():
+    intervals = interval_from_inds([6, 2, 3, 4, 7, 8, 9, 10, 3, 12])
+    assert np.all(intervals == np.array([[2, 4], [6, 10], [12, 12]]))
+    assert len(interval_from_inds([])) == 0
+
+
 def test_interval_set_difference_inds_no_overlap():
     intervals1 = [(0, 5), (8, 10)]
     intervals2 = [(5, 8)]
@@ -60,3 +76,60 @@ def test_interval_set_difference_inds_multiple_overlaps():
     intervals2 = [(1, 3), (4, 6), (7, 9)]
     result = interval_set_difference_inds(intervals1, intervals2)
     assert result == [(0, 1), (3, 4), (6, 7), (9, 10)]
+
+
+interval_lists = st.lists(
+    st.tuples(st.integers(0, 100), st.integers(0, 20)),
+    min_size=1,
+    max_size=40,
+).map(lambda pairs: np.array([[t, t + dur] for t, dur in pairs], dtype=float))
+
+
+@settings(max_examples=500, deadline=None)
+@given(interval_lists, interval_lists, st.sampled_from([0, 0.5, 5]))
+def test_interval_list_intersect_matches_pairwise(
+    interval_list1, interval_list2, min_length
+):
+    result = interval_list_intersect(
+        interval_list1.copy(), interval_list2.copy(), min_length=min_length
+    )
+    expected = _interval_list_intersect_pairwise(
+        interval_list1.copy(), interval_list2.copy(), min_length=min_length
+    )
+    np.testing.assert_array_equal(np.asarray(result), np.asarray(expected))
+
+
+@settings(max_examples=500, deadline=None)
+@given(interval_lists)
+def test_consolidate_intervals_matches_reduce(interval_list):
+    np.testing.assert_array_equal(
+        consolidate_intervals(interval_list.copy()),
+        _consolidate_intervals_reduce(interval_list.copy()),
+    )
+
+
+@settings(max_examples=500, deadline=None)
+@given(
+    interval_lists,
+    st.lists(st.integers(-10, 130), max_size=100).map(np.array),
+    st.booleans(),
+)
+def test_interval_list_contains_matches_loop(
+    interval_list, timestamps, sort_timestamps
+):
+    timestamps = timestamps.astype(float)
+    if sort_timestamps:
+        timestamps = np.sort(timestamps)
+    expected_ind = _interval_list_contains_ind_loop(interval_list, timestamps)
+
+    np.testing.assert_array_equal(
+        interval_list_contains_ind(interval_list, timestamps), expected_ind
+    )
+    np.testing.assert_array_equal(
+        interval_list_contains(interval_list, timestamps),
+        timestamps[expected_ind],
+    )
+    np.testing.assert_array_equal(
+        interval_list_excludes(interval_list, timestamps),
+        np.setdiff1d(timestamps, timestamps[expected_ind]),
+    )
@@ -0,0 +1,239 @@
+import numpy as np
+import pandas as pd
+import pytest
+import spikeinterface as si
+import spikeinterface.extractors as se
+
+from spyglass.decoding.clusterless import (
+    UnitMarks,
+    UnitMarksIndicator,
+    _iter_spike_samples,
+)
+
+
+def _get_peak_amplitude(waveform, peak_sign="neg", estimate_peak_time=False):
+    """Peak amplitudes of the waveforms of one unit, as UnitMarks computed
+    them from `si.extract_waveforms` before reading them at the spike peaks.
+    """
+    if len(waveform) == 0:
+        return waveform[:, 0]
+    if estimate_peak_time:
+        if peak_sign == "neg":
+            peak_inds = np.argmin(np.min(waveform, axis=2), axis=1)
+        elif peak_sign == "pos":
+            peak_inds = np.argmax(np.max(waveform, axis=2), axis=1)
+        elif peak_sign == "both":
+            peak_inds = np.argmax(np.max(np.abs(waveform), axis=2), axis=1)
+        values, counts = np.unique(peak_inds, return_counts=True)
+        spike_peak_ind = values[counts.argmax()]
+    else:
+        spike_peak_ind = waveform.shape[1] // 2
+    return waveform[:, spike_peak_ind]
+
+
+@pytest.fixture(params=["float32", "int16"])
+def recording_and_sorting(request):
+    recording, sorting = se.toy_example(
+        duration=2.0, num_channels=4, num_units=5, num_segments=1, seed=0
+    )
+    if request.param == "int16":
+        # scaled to uV by its gains, like the recordings of spike sorting
+        probe = recording.get_probe()
+        recording = si.NumpyRecording(
+            [(recording.get_traces() * 100).astype("int16")],
+            sampling_frequency=recording.get_sampling_frequency(),
+        )
+        recording = recording.set_probe(probe)
+        recording.annotate(is_filtered=True)
+        recording.set_channel_gains(0.01)
+        recording.set_channel_offsets(0)
+    num_samples = recording.get_num_samples()
+    units_dict = {
+        unit_id: sorting.get_unit_spike_train(unit_id)
+        for unit_id in sorting.get_unit_ids()
+    }
+    # spikes whose waveforms extend past the recording
+    units_dict[sorting.get_unit_ids()[0]] = np.concatenate(
+        ([2], units_dict[sorting.get_unit_ids()[0]], [num_samples - 3])
+    )
+    # a unit without spikes
+    units_dict[99] = np.array([], dtype=np.int64)
+    sorting = si.NumpySorting.from_dict(
+        [units_dict], sampling_frequency=recording.get_sampling_frequency()
+    )
+    return recording, sorting
+
+
+@pytest.mark.parametrize("peak_sign", ["neg", "pos", "both"])
+@pytest.mark.parametrize("estimate_peak_time", [False, True])
+@pytest.mark.parametrize("chunk_duration", [0.05, 10.0])
+def test_peak_amplitudes_equal_waveforms(
+    recording_and_sorting, peak_sign, estimate_peak_time, chunk_duration
+):
+    recording, sorting = recording_and_sorting
+    waveform_extractor = si.extract_waveforms(
+        recording,
+        sorting,
+        folder=None,
+        mode="memory",
+        ms_before=0.5,
+        ms_after=0.5,
+        max_spikes_per_unit=None,
+        n_jobs=1,
+    )
+    unit_ids = list(sorting.get_unit_ids())[::-1]
+    expected = np.concatenate(
+        [
+            _get_peak_amplitude(
+                waveform_extractor.get_waveforms(unit_id),
+                peak_sign=peak_sign,
+                estimate_peak_time=estimate_peak_time,
+            )
+            for unit_id in unit_ids
+        ]
+    )
+
+    peak_amplitudes = UnitMarks._get_spike_peak_amplitudes(
+        recording,
+        [sorting.get_unit_spike_train(unit_id) for unit_id in unit_ids],
+        peak_sign=peak_sign,
+        estimate_peak_time=estimate_peak_time,
+        chunk_duration=chunk_duration,
+    )
+    assert peak_amplitudes.dtype == expected.dtype
+    np.testing.assert_array_equal(peak_amplitudes, expected)
+
+
+def test_iter_spike_samples(recording_and_sorting):
+    recording, _ = recording_and_sorting
+    traces = recording.get_traces()
+    frames = np.array([500, 10, 3000, 10, 29000, 2999])
+    offsets = np.array([-3, 0, 4])
+
+    for chunk_size in (None, 1000, 1):
+        samples = np.zeros((len(frames), len(offsets), traces.shape[1]))
+        n_reads = 0
+        for spike_inds, chunk_samples in _iter_spike_samples(
+            recording, frames, offsets, chunk_size=chunk_size
+        ):
+            samples[spike_inds] = chunk_samples
+            n_reads += 1
+        np.testing.assert_array_equal(
+            samples, traces[frames[:, np.newaxis] + offsets]
+        )
+        # one read per chunk with spikes
+        assert n_reads == (
+            len(np.unique(frames // chunk_size)) if chunk_size else 1
+        )
+
+    assert list(_iter_spike_samples(recording, frames[:0], offsets)) == []
+
+
+def test_saved_marks_equal_recording(recording_and_sorting):
+    recording, sorting = recording_and_sorting
+    spike_trains = [
+        sorting.get_unit_spike_train(unit_id)
+        for unit_id in sorting.get_unit_ids()
+    ]
+    expected = UnitMarks._get_spike_peak_amplitudes(recording, spike_trains)
+
+    # marks saved by the clusterless thresholder at every spike frame
+    saved_frames = np.unique(np.concatenate(spike_trains))
+    saved_marks = recording.get_traces(return_scaled=recording.has_scaled())[
+        saved_frames
+    ].astype(expected.dtype)
+    saved_marks_used = UnitMarks._get_spike_peak_amplitudes(
+        recording,
+        spike_trains,
+        saved_frames=saved_frames,
+        saved_marks=saved_marks + 0.5,
+    )
+    # spikes whose waveforms extend past the recording stay zero
+    valid = np.any(expected != 0, axis=1)
+    np.testing.assert_array_equal(
+        saved_marks_used[valid], expected[valid] + 0.5
+    )
+    np.testing.assert_array_equal(saved_marks_used[~valid], 0)
+
+    # the recording is read if some spike frames were not saved
+    saved = np.arange(len(saved_frames)) != len(saved_frames) // 2
+    np.testing.assert_array_equal(
+        UnitMarks._get_spike_peak_amplitudes(
+            recording,
+            spike_trains,
+            saved_frames=saved_frames[saved],
+            saved_marks=saved_marks[saved] + 0.5,
+        ),
+        expected,
+    )
+
+
+def _get_dense_marks_indicator(marks_df, time):
+    """Mean marks in every time bin, as UnitMarksIndicator stored them
+    before.
+    """
+    marks_df = marks_df.loc[time.min() : time.max()]
+    time_index = np.digitize(marks_df.index, time[1:-1])
+    return (
+        marks_df.groupby(time[time_index])
+        .mean()
+        .reindex(index=pd.Index(time, name="time"))
+    )
+
+
+@pytest.mark.parametrize("n_spikes", [0, 1, 300])
+@pytest.mark.parametrize("stored", ["sparse", "dense"])
+@pytest.mark.parametrize(
+    "time_slices",
+    [
+        None,
+        # between bins, on bins, and overlapping
+        [slice(0.0123, 0.5071), slice(2.0, 2.5), slice(0.25, 0.3)],
+        # outside of the bins or between two bins
+        [slice(None, -0.5), slice(0.0121, 0.0129), slice(4.0, None)],
+    ],
+)
+def test_marks_indicator_round_trip(monkeypatch, n_spikes, stored, time_slices):
+    time = UnitMarksIndicator.get_time_bins_from_interval(
+        np.array([[0.0, 1.0], [2.0, 3.0]]), 100
+    )
+    rng = np.random.default_rng(0)
+    # spikes on the first and last bins, outside of the bins, and several
+    # in the same bin
+    spike_times = np.sort(
+        np.concatenate(
+            (
+                [-0.5, time[0], 0.1001, 0.1002, time[-1], 3.5],
+                rng.uniform(0, 3, 294),
+            )
+        )[:n_spikes]
+    )
+    marks_df = pd.DataFrame(
+        rng.normal(size=(n_spikes, 4)),
+        index=pd.Index(spike_times, name="time"),
+        columns=[f"amplitude_{ind:04d}" for ind in range(4)],
+    )
+    dense = _get_dense_marks_indicator(marks_df, time)
+    if stored == "sparse":
+        marks_indicator = UnitMarksIndicator.get_marks_indicator(marks_df, time)
+    else:  # entries made before the sparse storage
+        marks_indicator = dense
+    monkeypatch.setattr(
+        UnitMarksIndicator,
+        "fetch_nwb",
+        lambda self: [{"marks_indicator": marks_indicator.reset_index()}],
+    )
+
+    ((fetched_time, sparse),) = UnitMarksIndicator().fetch_sparse(
+        return_time=True
+    )
+    np.testing.assert_array_equal(fetched_time, time)
+    pd.testing.assert_frame_equal(sparse, dense.dropna(how="all"))
+
+    expected = (
+        dense
+        if time_slices is None
+        else pd.concat([dense.loc[time_slice] for time_slice in time_slices])
+    )
+    (fetched,) = UnitMarksIndicator().fetch_dataframe(time_slices=time_slices)
+    pd.testing.assert_frame_equal(fetched, expected)
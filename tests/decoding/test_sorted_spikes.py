@@ -0,0 +1,156 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from spyglass.decoding.core import (
+    convert_time_slices_to_bin_slices,
+    get_time_bin_indices,
+)
+from spyglass.decoding.sorted_spikes import (
+    SortedSpikesIndicator,
+    get_spike_indicator_from_bin_indices,
+)
+
+UNIT_NAMES = ["0000_0000", "0000_0001", "0001_0000"]
+
+TIME_SLICES = [
+    None,
+    [slice(None, None)],
+    # between bins, on bins, and overlapping
+    [slice(0.0123, 0.5071), slice(2.0, 2.5), slice(0.25, 0.3)],
+    [slice(None, 0.011), slice(2.995, None)],
+    # outside of the bins or between two bins
+    [slice(-1.0, -0.5), slice(0.0121, 0.0129), slice(4.0, 5.0)],
+]
+
+
+@pytest.fixture
+def time():
+    return SortedSpikesIndicator.get_time_bins_from_interval(
+        np.array([[0.0, 1.0], [2.0, 3.0]]), 100
+    )
+
+
+@pytest.fixture
+def spike_times(time):
+    rng = np.random.default_rng(0)
+    return [
+        # spikes on the first and last bins, and outside of the bins
+        np.concatenate(
+            ([-0.5, time[0], time[1], time[-1], 3.5], rng.uniform(0, 3, 500))
+        ),
+        np.array([]),
+        np.sort(rng.uniform(0, 3, 50)),
+    ]
+
+
+def _get_dense_spike_indicator(time, spike_times):
+    """Spike counts as SortedSpikesIndicator stored them before."""
+    spike_indicator = []
+    for unit_spike_times in spike_times:
+        unit_spike_times = unit_spike_times[
+            (unit_spike_times > time[0]) & (unit_spike_times <= time[-1])
+        ]
+        spike_indicator.append(
+            np.bincount(
+                np.digitize(unit_spike_times, time[1:-1]),
+                minlength=time.shape[0],
+            )
+        )
+    return pd.DataFrame(
+        np.stack(spike_indicator, axis=1),
+        index=pd.Index(time, name="time"),
+        columns=UNIT_NAMES,
+    )
+
+
+def _get_sparse_spike_indicator(time, spike_times):
+    """Time bins of the spikes, as SortedSpikesIndicator stores them."""
+    return pd.DataFrame(
+        {
+            "unit_name": UNIT_NAMES,
+            "time_index": [
+                list(get_time_bin_indices(unit_spike_times, time))
+                for unit_spike_times in spike_times
+            ],
+            "start_time": time[0],
+            "end_time": time[-1],
+            "n_time": len(time),
+        }
+    )
+
+
+def _slice_dense(dense, time_slices):
+    if time_slices is None:
+        return dense
+    return pd.concat([dense.loc[time_slice] for time_slice in time_slices])
+
+
+def test_get_time_bin_indices(time, spike_times):
+    dense = _get_dense_spike_indicator(time, spike_times)
+    for unit_name, unit_spike_times in zip(UNIT_NAMES, spike_times):
+        bin_indices = get_time_bin_indices(unit_spike_times, time)
+        np.testing.assert_array_equal(
+            np.bincount(bin_indices, minlength=len(time)), dense[unit_name]
+        )
+
+
+@pytest.mark.parametrize("time_slices", TIME_SLICES)
+def test_convert_time_slices_to_bin_slices(time, time_slices):
+    dense = pd.DataFrame(
+        {"bin": np.arange(len(time))}, index=pd.Index(time, name="time")
+    )
+    bin_indices = np.concatenate(
+        [
+            np.arange(len(time))[bin_slice]
+            for bin_slice in convert_time_slices_to_bin_slices(
+                time, time_slices
+            )
+        ]
+    )
+    np.testing.assert_array_equal(
+        bin_indices, _slice_dense(dense, time_slices)["bin"]
+    )
+
+
+@pytest.mark.parametrize("time_slices", TIME_SLICES)
+def test_get_spike_indicator_from_bin_indices(time, spike_times, time_slices):
+    spike_bin_indices = {
+        unit_name: get_time_bin_indices(unit_spike_times, time)
+        for unit_name, unit_spike_times in zip(UNIT_NAMES, spike_times)
+    }
+    pd.testing.assert_frame_equal(
+        get_spike_indicator_from_bin_indices(
+            time, spike_bin_indices, time_slices=time_slices
+        ),
+        _slice_dense(
+            _get_dense_spike_indicator(time, spike_times), time_slices
+        ),
+    )
+
+
+@pytest.mark.parametrize("stored", ["sparse", "dense"])
+@pytest.mark.parametrize("time_slices", TIME_SLICES)
+def test_fetch_round_trip(monkeypatch, time, spike_times, stored, time_slices):
+    dense = _get_dense_spike_indicator(time, spike_times)
+    if stored == "sparse":
+        spike_indicator = _get_sparse_spike_indicator(time, spike_times)
+    else:  # entries made before the sparse storage
+        spike_indicator = dense.reset_index()
+    monkeypatch.setattr(
+        SortedSpikesIndicator,
+        "fetch_nwb",
+        lambda self: [{"spike_indicator": spike_indicator}],
+    )
+
+    (
+        (fetched_time, spike_bin_indices),
+    ) = SortedSpikesIndicator().fetch_sparse()
+    np.testing.assert_array_equal(fetched_time, time)
+    assert list(spike_bin_indices) == UNIT_NAMES
+    assert len(spike_bin_indices["0000_0001"]) == 0
+
+    pd.testing.assert_frame_equal(
+        SortedSpikesIndicator().fetch_dataframe(time_slices=time_slices),
+        _slice_dense(dense, time_slices),
+    )
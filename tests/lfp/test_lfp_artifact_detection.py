@@ -0,0 +1,134 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from spyglass.lfp.v1.lfp_artifact_difference_detection import (
+    difference_artifact_detector,
+)
+from spyglass.lfp.v1.lfp_artifact_MAD_detection import mad_artifact_detector
+
+# outputs of the detectors before they were chunked, rounded to 0.1 ms
+DIFFERENCE_VALID_TIMES = {
+    0: [
+        [1.0, 1.007],
+        [1.017, 1.287],
+        [1.3, 1.301],
+        [1.315, 2.186],
+        [2.199, 2.201],
+        [2.214, 2.499],
+        [3.0, 3.986],
+        [3.999, 4.001],
+        [4.015, 4.476],
+    ],
+    1: [
+        [1.0, 1.293],
+        [1.309, 2.192],
+        [2.208, 2.499],
+        [3.0, 3.993],
+        [4.008, 4.482],
+        [4.495, 4.499],
+    ],
+}
+DIFFERENCE_ARTIFACT_TIMES = {
+    0: [
+        [1.007, 1.017],
+        [1.287, 1.3],
+        [1.302, 1.315],
+        [2.187, 2.199],
+        [2.202, 2.214],
+        [3.987, 3.999],
+        [4.002, 4.014],
+        [4.477, 4.501],
+    ],
+    1: [
+        [1.293, 1.309],
+        [2.193, 2.208],
+        [3.993, 4.008],
+        [4.483, 4.495],
+    ],
+}
+MAD_VALID_TIMES = [
+    [1.011, 1.294],
+    [1.309, 2.194],
+    [2.208, 3.294],
+    [3.306, 3.994],
+    [4.008, 4.484],
+]
+MAD_ARTIFACT_TIMES = [
+    [1.0, 1.01],
+    [1.295, 1.308],
+    [2.195, 2.207],
+    [3.295, 3.305],
+    [3.995, 4.007],
+    [4.485, 4.499],
+]
+
+CHUNKING = [
+    (None, 1),
+    (1, 1),
+    (7, 3),
+    (500, 1),
+    (500, 3),
+    (2999, 2),
+    (10_000, 1),
+]
+
+
+def _make_lfp(dtype):
+    """Random walk LFP with artifacts on all channels and on one channel."""
+    rng = np.random.default_rng(0)
+    n_samples = 3000
+    data = rng.normal(scale=20, size=(n_samples, 4)).cumsum(axis=0) * 0.1
+    data = data + rng.normal(scale=5, size=(n_samples, 4))
+    for start in [300, 301, 1200, 2500]:
+        data[start : start + 3] += 800
+    data[1800, 0] += 900
+    data[2990:] += 700  # near the end
+    data[5] -= 700  # near the start
+    timestamps = 1.0 + np.arange(n_samples) / 1000.0
+    timestamps[1500:] += 0.5  # gap between valid intervals
+    return data.astype(dtype), timestamps
+
+
+@pytest.mark.parametrize("chunk_size, n_jobs", CHUNKING)
+@pytest.mark.parametrize("referencing", [0, 1])
+@pytest.mark.parametrize("dtype", [np.int16, np.float64])
+def test_difference_artifact_detector(dtype, referencing, chunk_size, n_jobs):
+    data, timestamps = _make_lfp(dtype)
+    valid_times, artifact_times = difference_artifact_detector(
+        data,
+        timestamps,
+        amplitude_thresh_1st=500,
+        amplitude_thresh_2nd=300,
+        proportion_above_thresh_1st=0.5,
+        proportion_above_thresh_2nd=0.5,
+        removal_window_ms=10,
+        local_window_ms=20,
+        sampling_frequency=1000.0,
+        referencing=referencing,
+        chunk_size=chunk_size,
+        n_jobs=n_jobs,
+    )
+    np.testing.assert_allclose(
+        valid_times, DIFFERENCE_VALID_TIMES[referencing], atol=1e-6
+    )
+    np.testing.assert_allclose(
+        artifact_times, DIFFERENCE_ARTIFACT_TIMES[referencing], atol=1e-6
+    )
+
+
+@pytest.mark.parametrize("chunk_size, n_jobs", CHUNKING)
+def test_mad_artifact_detector(chunk_size, n_jobs):
+    data, timestamps = _make_lfp(np.float64)
+    valid_times, artifact_times = mad_artifact_detector(
+        SimpleNamespace(data=data, timestamps=timestamps),
+        mad_thresh=6.0,
+        proportion_above_thresh=0.1,
+        removal_window_ms=10,
+        sampling_frequency=1000.0,
+        chunk_size=chunk_size,
+        n_jobs=n_jobs,
+    )
+    np.testing.assert_allclose(valid_times, MAD_VALID_TIMES, atol=1e-6)
+    np.testing.assert_allclose(artifact_times, MAD_ARTIFACT_TIMES, atol=1e-6)
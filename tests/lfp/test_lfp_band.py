@@ -0,0 +1,75 @@
+import h5py
+import numpy as np
+import pytest
+from scipy.signal import butter, hilbert, sosfiltfilt
+
+from spyglass.lfp.analysis.v1.lfp_band import hilbert_chunked
+
+SAMPLING_RATE = 1000.0
+LOW_FREQUENCY = 6.0
+
+
+@pytest.fixture(scope="module")
+def theta_band():
+    """Noise band-passed in the theta band, with a prime number of samples."""
+    rng = np.random.default_rng(0)
+    sos = butter(
+        4, [LOW_FREQUENCY, 10.0], btype="band", fs=SAMPLING_RATE, output="sos"
+    )
+    return sosfiltfilt(sos, rng.normal(size=(60_013, 3)), axis=0)
+
+
+def _concatenate_chunks(data, chunk_size, overlap, columns=None):
+    starts, stops, chunks = zip(
+        *hilbert_chunked(data, chunk_size, overlap, columns=columns)
+    )
+    # the chunks tile the signal in order
+    assert starts[0] == 0 and stops[-1] == len(data)
+    assert list(starts[1:]) == list(stops[:-1])
+    assert all(stop - start <= chunk_size for start, stop in zip(starts, stops))
+    return np.concatenate(chunks)
+
+
+@pytest.mark.parametrize(
+    "chunk_size, overlap",
+    [(1000, None), (4096, 2000), (3000, 5000), (7919, 1024)],
+)
+def test_hilbert_chunked_equals_hilbert(theta_band, chunk_size, overlap):
+    analytic_signal = _concatenate_chunks(theta_band, chunk_size, overlap)
+    expected = hilbert(theta_band, axis=0)
+
+    # the real part is the signal
+    np.testing.assert_allclose(analytic_signal.real, theta_band, atol=1e-12)
+    # away from the ends, within the error bound of truncating the kernel
+    if overlap is None:
+        overlap = chunk_size // 4
+    margin = overlap + int(SAMPLING_RATE)
+    bound = (
+        np.abs(theta_band).max()
+        * SAMPLING_RATE
+        / (np.pi**2 * LOW_FREQUENCY * overlap)
+    )
+    error = np.abs(analytic_signal - expected)[margin:-margin]
+    assert error.max() < bound
+
+
+def test_hilbert_chunked_columns(theta_band, tmp_path):
+    """Reads the columns of an h5py dataset, as from an NWB file."""
+    with h5py.File(tmp_path / "data.h5", "w") as file:
+        dataset = file.create_dataset("data", data=theta_band)
+        np.testing.assert_array_equal(
+            _concatenate_chunks(dataset, 5000, 1000, columns=[0, 2]),
+            _concatenate_chunks(theta_band, 5000, 1000)[:, [0, 2]],
+        )
+
+
+def test_hilbert_chunked_single_chunk(theta_band):
+    # one chunk, padded to a fast length instead of the prime length
+    analytic_signal = _concatenate_chunks(theta_band, len(theta_band), 0)
+    expected = hilbert(theta_band, axis=0)
+    margin = 5 * int(SAMPLING_RATE)
+    np.testing.assert_allclose(
+        analytic_signal[margin:-margin],
+        expected[margin:-margin],
+        atol=1e-4 * np.abs(theta_band).max(),
+    )
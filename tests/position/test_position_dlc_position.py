@@ -0,0 +1,90 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from spyglass.position.v1.dlc_utils import get_span_start_stop, interp_pos
+from spyglass.position.v1.position_dlc_position import (
+    get_good_spans,
+    nan_inds,
+)
+
+# outputs of get_good_spans, nan_inds and interp_pos before they were
+# vectorized, for the inputs stored alongside them
+OUTPUTS = np.load(Path(__file__).parent / "dlc_position_outputs.npz")
+
+
+def _dlc_df():
+    return pd.DataFrame(
+        dict(x=OUTPUTS["x"], y=OUTPUTS["y"], likelihood=OUTPUTS["likelihood"]),
+        index=pd.Index(OUTPUTS["time"], name="time"),
+    )
+
+
+def _printed_lines(capsys):
+    return capsys.readouterr().out.splitlines()
+
+
+@pytest.mark.parametrize("inds_to_span", [0, 1, 2, 5, 50])
+def test_get_good_spans(inds_to_span):
+    good_spans, modified_spans = get_good_spans(
+        OUTPUTS["span_mask"], inds_to_span=inds_to_span
+    )
+    np.testing.assert_array_equal(good_spans, OUTPUTS["good_spans"])
+    np.testing.assert_array_equal(
+        modified_spans, OUTPUTS[f"modified_spans_{inds_to_span}"]
+    )
+
+
+def test_get_good_spans_single_span():
+    assert get_good_spans(np.zeros(5, dtype=bool)) == (None, [(0, 4)])
+    assert get_good_spans(np.ones(5, dtype=bool)) == (None, [])
+    assert get_good_spans(np.zeros(0, dtype=bool)) == (None, [])
+
+
+@pytest.mark.parametrize("inds_to_span", [5, 50])
+def test_nan_inds_and_interp_pos(inds_to_span, capsys):
+    df_w_nans, bad_inds_mask = nan_inds(
+        _dlc_df(), 5, likelihood_thresh=0.95, inds_to_span=inds_to_span
+    )
+    np.testing.assert_array_equal(
+        bad_inds_mask, OUTPUTS[f"bad_inds_mask_{inds_to_span}"]
+    )
+    assert np.all(np.isnan(df_w_nans.loc[bad_inds_mask, ["x", "y"]]))
+
+    spans = get_span_start_stop(np.flatnonzero(bad_inds_mask))
+    _printed_lines(capsys)
+    interp_df = interp_pos(
+        df_w_nans, spans, max_pts_to_interp=10, max_cm_to_interp=15
+    )
+    np.testing.assert_array_equal(
+        interp_df["x"], OUTPUTS[f"interp_x_{inds_to_span}"]
+    )
+    np.testing.assert_array_equal(
+        interp_df["y"], OUTPUTS[f"interp_y_{inds_to_span}"]
+    )
+    assert _printed_lines(capsys) == list(
+        OUTPUTS[f"interp_messages_{inds_to_span}"]
+    )
+
+
+def test_interp_pos(capsys):
+    spans = [tuple(span) for span in OUTPUTS["spans"].tolist()]
+    interp_df = interp_pos(
+        _dlc_df(), spans, max_pts_to_interp=10, max_cm_to_interp=15
+    )
+    np.testing.assert_array_equal(interp_df["x"], OUTPUTS["interp_x"])
+    np.testing.assert_array_equal(interp_df["y"], OUTPUTS["interp_y"])
+    assert _printed_lines(capsys) == list(OUTPUTS["interp_messages"])
+
+
+def test_nan_inds_all_bad():
+    # used to raise UnboundLocalError
+    dlc_df = _dlc_df()
+    dlc_df["likelihood"] = 0.1
+    df_w_nans, bad_inds_mask = nan_inds(
+        dlc_df, 5, likelihood_thresh=0.95, inds_to_span=50
+    )
+    assert np.all(bad_inds_mask)
+    assert np.all(np.isnan(df_w_nans[["x", "y"]]))
@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+import spikeinterface as si
+
+from spyglass.spikesorting.merged_sorting_extractor import (
+    MergedSortingExtractor,
+)
+
+MERGE_GROUPS = [[4, 2], [3], [6, 5, 7]]
+# unit ids of the merged sorting and the units merged into each
+MERGED_UNITS = {1: [1], 2: [4, 2], 3: [3], 5: [6, 5, 7], 8: [8]}
+
+
+@pytest.fixture
+def parent_sorting():
+    rng = np.random.default_rng(0)
+    units_dict_list = []
+    for num_frames in (1000, 500):
+        units_dict = {
+            unit_id: np.sort(rng.integers(0, num_frames, size=unit_id * 10))
+            for unit_id in range(1, 9)
+        }
+        units_dict[7] = np.array([], dtype=np.int64)
+        # a spike at the same frame in two merged units is kept twice
+        units_dict[5] = np.union1d(units_dict[5], units_dict[6][:3])
+        units_dict_list.append(units_dict)
+    return si.NumpySorting.from_dict(units_dict_list, sampling_frequency=1e3)
+
+
+def _expected_spike_train(
+    parent_sorting, unit_id, segment_index, start_frame, end_frame
+):
+    spike_train = np.sort(
+        np.concatenate(
+            [
+                parent_sorting.get_unit_spike_train(
+                    merged_unit_id, segment_index=segment_index
+                )
+                for merged_unit_id in MERGED_UNITS[unit_id]
+            ]
+        )
+    )
+    in_window = np.ones(len(spike_train), dtype=bool)
+    if start_frame is not None:
+        in_window &= spike_train >= start_frame
+    if end_frame is not None:
+        in_window &= spike_train < end_frame
+    return spike_train[in_window]
+
+
+def test_merged_spike_trains(parent_sorting):
+    sorting = MergedSortingExtractor(
+        parent_sorting=parent_sorting, merge_groups=MERGE_GROUPS
+    )
+    assert list(sorting.get_unit_ids()) == list(MERGED_UNITS)
+
+    windows = [
+        (None, None),
+        (None, 250),
+        (250, None),
+        (100, 300),
+        (300, 300),  # empty
+        (300, 100),  # stop before start
+        (-10, 0),
+        (499, 2000),
+    ]
+    for segment_index in range(2):
+        for unit_id in MERGED_UNITS:
+            for start_frame, end_frame in windows:
+                np.testing.assert_array_equal(
+                    sorting.get_unit_spike_train(
+                        unit_id,
+                        segment_index=segment_index,
+                        start_frame=start_frame,
+                        end_frame=end_frame,
+                    ),
+                    _expected_spike_train(
+                        parent_sorting,
+                        unit_id,
+                        segment_index,
+                        start_frame,
+                        end_frame,
+                    ),
+                )
+
+
+def test_total_num_spikes(parent_sorting):
+    sorting = MergedSortingExtractor(
+        parent_sorting=parent_sorting, merge_groups=MERGE_GROUPS
+    )
+    assert sorting.get_total_num_spikes() == {
+        unit_id: sum(
+            len(parent_sorting.get_unit_spike_train(merged_unit_id, segment))
+            for merged_unit_id in merged_unit_ids
+            for segment in range(2)
+        )
+        for unit_id, merged_unit_ids in MERGED_UNITS.items()
+    }
+
+
+def test_no_merge_groups(parent_sorting):
+    sorting = MergedSortingExtractor(
+        parent_sorting=parent_sorting, merge_groups=[]
+    )
+    for unit_id in parent_sorting.get_unit_ids():
+        np.testing.assert_array_equal(
+            sorting.get_unit_spike_train(unit_id, segment_index=1),
+            parent_sorting.get_unit_spike_train(unit_id, segment_index=1),
+        )
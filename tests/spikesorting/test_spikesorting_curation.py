@@ -0,0 +1,174 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import spikeinterface as si
+
+from spyglass.spikesorting import spikesorting_curation
+from spyglass.spikesorting.spikesorting_curation import (
+    QualityMetrics,
+    _allocate_evenly,
+    _select_spikes_stratified,
+)
+
+N_UNITS = 10
+
+
+class _FakeSorting:
+    def get_unit_ids(self):
+        return np.arange(N_UNITS)
+
+
+class _FakeWaveformExtractor:
+    sorting = _FakeSorting()
+
+
+def _fake_nn_metric(waveform_extractor, this_unit_id, seed):
+    return this_unit_id / 10 + seed
+
+
+def _fake_num_spikes(waveform_extractor):
+    return {str(unit_id): 2 * unit_id for unit_id in range(N_UNITS)}
+
+
+def test_compute_metrics_pooled_equals_serial(monkeypatch):
+    waveform_extractor = _FakeWaveformExtractor()
+    calls = []
+
+    def nn_isolation(waveform_extractor, this_unit_id, seed):
+        calls.append(this_unit_id)
+        # nn_isolation also returns the unit number
+        metric = _fake_nn_metric(waveform_extractor, this_unit_id, seed)
+        return metric, this_unit_id
+
+    def nn_noise_overlap(waveform_extractor, this_unit_id, seed):
+        calls.append(this_unit_id)
+        return _fake_nn_metric(waveform_extractor, this_unit_id, seed)
+
+    metric_name_to_func = spikesorting_curation._metric_name_to_func
+    monkeypatch.setitem(metric_name_to_func, "nn_isolation", nn_isolation)
+    monkeypatch.setitem(
+        metric_name_to_func, "nn_noise_overlap", nn_noise_overlap
+    )
+    monkeypatch.setitem(metric_name_to_func, "num_spikes", _fake_num_spikes)
+    # threads share the patched metrics, unlike spawned processes
+    monkeypatch.setattr(
+        spikesorting_curation, "ProcessPoolExecutor", ThreadPoolExecutor
+    )
+    monkeypatch.setattr(
+        spikesorting_curation.si.WaveformExtractor,
+        "load_from_folder",
+        lambda we_path: waveform_extractor,
+    )
+    params = {
+        "nn_isolation": {"seed": 0},
+        "nn_noise_overlap": {"seed": 1},
+        "num_spikes": {},
+    }
+
+    serial = QualityMetrics._compute_metrics(waveform_extractor, params)
+    assert sorted(calls) == sorted(2 * list(range(N_UNITS)))
+    calls.clear()
+    pooled = QualityMetrics._compute_metrics(
+        waveform_extractor, params, we_path="waveforms", n_jobs=3
+    )
+    # each unit is computed once, in one of the chunks
+    assert sorted(calls) == sorted(2 * list(range(N_UNITS)))
+
+    assert pooled == serial
+    assert serial["nn_isolation"] == {
+        str(unit_id): unit_id / 10 for unit_id in range(N_UNITS)
+    }
+    assert serial["nn_noise_overlap"] == {
+        str(unit_id): unit_id / 10 + 1 for unit_id in range(N_UNITS)
+    }
+    assert serial["num_spikes"] == _fake_num_spikes(waveform_extractor)
+
+
+def test_allocate_evenly():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        counts = rng.integers(0, 50, size=rng.integers(1, 12))
+        total = rng.integers(0, counts.sum() + 1)
+        quotas = _allocate_evenly(counts, total)
+
+        assert quotas.sum() == total
+        assert np.all(quotas <= counts)
+        # the groups not giving all their items get the largest quotas,
+        # within one of each other
+        not_full = quotas < counts
+        if not_full.any():
+            assert quotas[not_full].max() - quotas[not_full].min() <= 1
+            assert quotas.max() == quotas[not_full].max()
+
+    np.testing.assert_array_equal(
+        _allocate_evenly(np.array([1, 10, 0, 10, 3]), 20), [1, 8, 0, 8, 3]
+    )
+
+
+def test_select_spikes_stratified():
+    num_samples = [3000, 1000]
+    rng = np.random.default_rng(1)
+    recording = si.NumpyRecording(
+        [np.zeros((n, 2), dtype="float32") for n in num_samples],
+        sampling_frequency=1000.0,
+    )
+    sorting = si.NumpySorting.from_dict(
+        [
+            {
+                # most spikes at the start of the first segment
+                0: np.sort(rng.integers(0, 300, size=400)),
+                1: np.sort(rng.integers(0, n, size=n // 10)),
+                2: np.array([5, 100, 2999]),
+            }
+            for n in num_samples
+        ],
+        sampling_frequency=1000.0,
+    )
+    nbefore, nafter = 10, 10
+
+    selected = _select_spikes_stratified(
+        recording, sorting, 100, nbefore, nafter, n_strata=4, seed=0
+    )
+    for unit_id, expected_size in [(0, 100), (1, 100), (2, 2)]:
+        spike_inds = selected[unit_id]
+        assert sum(inds.size for inds in spike_inds) == expected_size
+        for segment_index, inds in enumerate(spike_inds):
+            assert np.all(np.diff(inds) > 0)
+            frames = sorting.get_unit_spike_train(unit_id, segment_index)[inds]
+            # the waveforms are within the segment
+            assert np.all(frames >= nbefore)
+            assert np.all(frames < num_samples[segment_index] - nafter)
+
+    # spikes of each stratum of 1000 samples: unit 1 has 100 in each and is
+    # sampled evenly, unit 0 only has spikes in the first and last strata
+    strata = [
+        np.concatenate(
+            [
+                sorting.get_unit_spike_train(unit_id, segment_index)[inds]
+                + 3000 * segment_index
+                for segment_index, inds in enumerate(selected[unit_id])
+            ]
+        )
+        // 1000
+        for unit_id in (0, 1)
+    ]
+    np.testing.assert_array_equal(np.bincount(strata[1]), [25, 25, 25, 25])
+    np.testing.assert_array_equal(np.bincount(strata[0]), [50, 0, 0, 50])
+
+    # the same seed gives the same spikes, another seed other spikes
+    for unit_id, spike_inds in _select_spikes_stratified(
+        recording, sorting, 100, nbefore, nafter, n_strata=4, seed=0
+    ).items():
+        for inds, expected_inds in zip(spike_inds, selected[unit_id]):
+            np.testing.assert_array_equal(inds, expected_inds)
+    other = _select_spikes_stratified(
+        recording, sorting, 100, nbefore, nafter, n_strata=4, seed=1
+    )
+    assert not np.array_equal(other[1][0], selected[1][0])
+
+    # all spikes without a maximum
+    selected = _select_spikes_stratified(
+        recording, sorting, None, nbefore, nafter, n_strata=4
+    )
+    for segment_index, inds in enumerate(selected[2]):
+        np.testing.assert_array_equal(inds, np.arange(3))
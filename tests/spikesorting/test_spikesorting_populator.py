@@ -0,0 +1,180 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from spyglass.spikesorting import spikesorting_populator
+from spyglass.spikesorting.spikesorting_curation import QualityMetrics
+from spyglass.spikesorting.spikesorting_populator import (
+    _get_pipeline_steps,
+    _run_pipeline_concurrently,
+    _run_pipeline_step,
+)
+
+SORT_GROUP_IDS = [0, 1, 2]
+
+
+class _StepRecorder:
+    """Stand-in for _run_pipeline_step that records what runs when."""
+
+    def __init__(self, resources, fail=()):
+        self.resources = resources
+        self.fail = set(fail)
+        self.lock = threading.Lock()
+        self.events = []  # ("start" or "stop", sort group, step)
+        self.running = set()
+        self.n_jobs = {}
+        self.max_cpus = 0
+        self.max_memory_gb = 0
+        self.ran_alone = {}
+
+    def __call__(
+        self, step, restriction, params, populate_kwargs=None, n_jobs=None
+    ):
+        task = (restriction["sort_group_id"], step)
+        assert params["sort_group_ids"] == [task[0]]
+        assert populate_kwargs == dict(reserve_jobs=True)
+        with self.lock:
+            self.events.append(("start", *task))
+            self.running.add(task)
+            self.n_jobs[task] = n_jobs
+            self.max_cpus = max(self.max_cpus, self._in_use("cpus"))
+            self.max_memory_gb = max(
+                self.max_memory_gb, self._in_use("memory_gb")
+            )
+            self.ran_alone[task] = len(self.running) == 1
+        time.sleep(0.01)
+        with self.lock:
+            self.running.remove(task)
+            self.events.append(("stop", *task))
+        if task in self.fail:
+            raise ValueError(f"{step} failed")
+
+    def _in_use(self, resource):
+        return sum(self.resources[step][resource] for _, step in self.running)
+
+    def order(self, event, sort_group_id, step):
+        return self.events.index((event, sort_group_id, step))
+
+
+@pytest.fixture
+def run_in_threads(monkeypatch):
+    """Run the pipeline steps in threads, sharing the recorder."""
+
+    def run(recorder, **kwargs):
+        monkeypatch.setattr(
+            spikesorting_populator, "ProcessPoolExecutor", ThreadPoolExecutor
+        )
+        monkeypatch.setattr(
+            spikesorting_populator, "_init_pipeline_worker", lambda: None
+        )
+        monkeypatch.setattr(
+            spikesorting_populator, "_run_pipeline_step", recorder
+        )
+        _run_pipeline_concurrently(
+            _get_pipeline_steps(auto_curate=True),
+            dict(nwb_file_name="session.nwb"),
+            SORT_GROUP_IDS,
+            dict(team_name="team"),
+            **kwargs,
+        )
+
+    return run
+
+
+def _resources(**overrides):
+    resources = {
+        step: dict(cpus=2, memory_gb=1) for step in _get_pipeline_steps()
+    }
+    resources.update(overrides)
+    return resources
+
+
+def test_dependency_order(run_in_threads):
+    resources = _resources()
+    recorder = _StepRecorder(resources)
+    run_in_threads(
+        recorder, n_workers=4, step_resources=resources, cpu_budget=8
+    )
+
+    steps = _get_pipeline_steps(auto_curate=True)
+    for sort_group_id in SORT_GROUP_IDS:
+        for step, deps in steps.items():
+            for dep in deps:
+                assert recorder.order(
+                    "stop", sort_group_id, dep
+                ) < recorder.order("start", sort_group_id, step)
+    assert len(recorder.events) == 2 * len(steps) * len(SORT_GROUP_IDS)
+    # the sort groups ran concurrently
+    assert recorder.max_cpus > 2
+
+
+def test_budget(run_in_threads):
+    resources = _resources(
+        SpikeSortingRecording=dict(cpus=3, memory_gb=4),
+        SpikeSorting=dict(cpus=4, memory_gb=2),
+    )
+    recorder = _StepRecorder(resources)
+    run_in_threads(
+        recorder,
+        n_workers=8,
+        step_resources=resources,
+        cpu_budget=6,
+        memory_budget_gb=5,
+    )
+
+    assert recorder.max_cpus <= 6
+    assert recorder.max_memory_gb <= 5
+    # each step is given the CPUs it reserves as its number of jobs
+    for (_, step), n_jobs in recorder.n_jobs.items():
+        assert n_jobs == resources[step]["cpus"]
+
+
+def test_step_larger_than_budget(run_in_threads):
+    resources = _resources(SpikeSorting=dict(cpus=16, memory_gb=1))
+    recorder = _StepRecorder(resources)
+    run_in_threads(
+        recorder, n_workers=4, step_resources=resources, cpu_budget=4
+    )
+
+    for sort_group_id in SORT_GROUP_IDS:
+        task = (sort_group_id, "SpikeSorting")
+        assert recorder.ran_alone[task]
+        assert recorder.n_jobs[task] == 4
+
+
+def test_failure(run_in_threads):
+    resources = _resources()
+    recorder = _StepRecorder(resources, fail=[(1, "SpikeSorting")])
+    with pytest.raises(RuntimeError, match="sort group 1 at SpikeSorting"):
+        run_in_threads(
+            recorder, n_workers=4, step_resources=resources, cpu_budget=8
+        )
+
+    steps = list(_get_pipeline_steps(auto_curate=True))
+    ran = {(sort_group_id, step) for _, sort_group_id, step in recorder.events}
+    # the later steps of the failed sort group are skipped, the other sort
+    # groups finish
+    assert ran == {
+        (sort_group_id, step)
+        for sort_group_id in SORT_GROUP_IDS
+        for step in steps
+        if sort_group_id != 1
+        or steps.index(step) <= steps.index("SpikeSorting")
+    }
+
+
+def test_run_pipeline_step_n_jobs(monkeypatch):
+    n_jobs = []
+    monkeypatch.setitem(
+        spikesorting_populator._PIPELINE_STEPS,
+        "QualityMetrics",
+        (lambda *args: n_jobs.append(QualityMetrics.n_jobs), ("Waveforms",)),
+    )
+    default_n_jobs = QualityMetrics.n_jobs
+
+    _run_pipeline_step("QualityMetrics", {}, {}, n_jobs=3)
+    _run_pipeline_step("QualityMetrics", {}, {})
+    assert n_jobs == [3, default_n_jobs]
+    assert QualityMetrics.n_jobs == default_n_jobs
@@ -0,0 +1,133 @@
+import json
+
+import numpy as np
+import pytest
+import spikeinterface as si
+import spikeinterface.extractors as se
+import spikeinterface.preprocessing as sip
+
+from spyglass.spikesorting import spikesorting_recording
+from spyglass.spikesorting.spikesorting_recording import (
+    _save_recording_resumable,
+)
+
+CHUNK_DURATION = "100ms"  # 10 chunks per segment
+
+
+@pytest.fixture
+def recording(tmp_path):
+    """Filtered recording with two segments, which can be dumped to json."""
+    raw, _ = se.toy_example(
+        duration=[1.0, 0.95], num_channels=4, num_segments=2, seed=0
+    )
+    raw = raw.save(folder=tmp_path / "raw", n_jobs=1)
+    return sip.bandpass_filter(raw, freq_min=300, freq_max=6000)
+
+
+def _manifest_chunks(folder):
+    lines = (folder / "chunk_manifest.txt").read_text().splitlines()
+    return [tuple(map(int, line.split())) for line in lines[1:]]
+
+
+def _assert_same_folder(folder, expected_folder):
+    loaded = si.load_extractor(folder)
+    expected = si.load_extractor(expected_folder)
+    assert loaded.get_num_segments() == expected.get_num_segments()
+    assert loaded.get_sampling_frequency() == expected.get_sampling_frequency()
+    np.testing.assert_array_equal(
+        loaded.get_channel_ids(), expected.get_channel_ids()
+    )
+    np.testing.assert_array_equal(
+        loaded.get_channel_locations(), expected.get_channel_locations()
+    )
+    for segment_index in range(expected.get_num_segments()):
+        np.testing.assert_array_equal(
+            loaded.get_traces(segment_index=segment_index),
+            expected.get_traces(segment_index=segment_index),
+        )
+        np.testing.assert_array_equal(
+            loaded.get_times(segment_index=segment_index),
+            expected.get_times(segment_index=segment_index),
+        )
+
+
+def test_save_equals_recording_save(recording, tmp_path):
+    cached = _save_recording_resumable(
+        recording, tmp_path / "resumable", CHUNK_DURATION, n_jobs=1
+    )
+    recording.save(
+        folder=tmp_path / "saved", chunk_duration=CHUNK_DURATION, n_jobs=1
+    )
+
+    _assert_same_folder(tmp_path / "resumable", tmp_path / "saved")
+    np.testing.assert_array_equal(
+        cached.get_traces(segment_index=1),
+        si.load_extractor(tmp_path / "saved").get_traces(segment_index=1),
+    )
+    assert len(_manifest_chunks(tmp_path / "resumable")) == 20
+
+
+@pytest.mark.parametrize("n_written", [0, 3, 13])
+def test_resume_interrupted_save(recording, tmp_path, monkeypatch, n_written):
+    write_chunk = spikesorting_recording._write_recording_chunk
+    calls = []
+
+    def interrupted_write_chunk(*args):
+        if len(calls) == n_written:
+            raise KeyboardInterrupt
+        calls.append(args[:2])
+        return write_chunk(*args)
+
+    monkeypatch.setattr(
+        spikesorting_recording,
+        "_write_recording_chunk",
+        interrupted_write_chunk,
+    )
+    folder = tmp_path / "resumable"
+    with pytest.raises(KeyboardInterrupt):
+        _save_recording_resumable(recording, folder, CHUNK_DURATION, n_jobs=1)
+    assert _manifest_chunks(folder) == calls
+    # a chunk cut short when the save was killed is written again
+    with open(folder / "chunk_manifest.txt", "a") as manifest:
+        manifest.write("1 ")
+
+    written = []
+
+    def counted_write_chunk(*args):
+        chunk = write_chunk(*args)
+        if chunk is not None:
+            written.append(chunk)
+        return chunk
+
+    monkeypatch.setattr(
+        spikesorting_recording, "_write_recording_chunk", counted_write_chunk
+    )
+    _save_recording_resumable(recording, folder, CHUNK_DURATION, n_jobs=1)
+    # only the missing chunks are written
+    assert len(written) == 20 - n_written
+    assert not set(written) & set(calls)
+
+    recording.save(
+        folder=tmp_path / "saved", chunk_duration=CHUNK_DURATION, n_jobs=1
+    )
+    _assert_same_folder(folder, tmp_path / "saved")
+
+
+def test_restart_other_recording(recording, tmp_path):
+    folder = tmp_path / "resumable"
+    _save_recording_resumable(recording, folder, CHUNK_DURATION, n_jobs=1)
+    header = json.loads(
+        (folder / "chunk_manifest.txt").read_text().splitlines()[0]
+    )
+
+    # a different recording, or chunk size, starts the save over
+    other = sip.bandpass_filter(recording, freq_min=300, freq_max=3000)
+    _save_recording_resumable(other, folder, "200ms", n_jobs=1)
+    other_header = json.loads(
+        (folder / "chunk_manifest.txt").read_text().splitlines()[0]
+    )
+    assert other_header["chunk_size"] == 2 * header["chunk_size"]
+    assert len(_manifest_chunks(folder)) == 10
+
+    other.save(folder=tmp_path / "saved", chunk_duration="200ms", n_jobs=1)
+    _assert_same_folder(folder, tmp_path / "saved")
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+import spikeinterface as si
+import spikeinterface.extractors as se
+from spikeinterface.sortingcomponents.peak_detection import detect_peaks
+
+from spyglass.spikesorting.spikesorting_sorting import _ChannelAmplitudes
+
+# default clusterless thresholder parameters, with a lower threshold
+CLUSTERLESS_PARAMS = dict(
+    detect_threshold=40.0,
+    method="locally_exclusive",
+    peak_sign="neg",
+    exclude_sweep_ms=0.1,
+    local_radius_um=100,
+    noise_levels=np.asarray([1.0]),
+    random_chunk_kwargs={},
+)
+
+
+@pytest.fixture(params=["float32", "int16"])
+def recording(request):
+    recording, _ = se.toy_example(
+        duration=3.0, num_channels=4, num_units=5, num_segments=1, seed=0
+    )
+    if request.param == "int16":
+        # scaled to uV by its gains
+        probe = recording.get_probe()
+        recording = si.NumpyRecording(
+            [(recording.get_traces() * 100).astype("int16")],
+            sampling_frequency=recording.get_sampling_frequency(),
+        )
+        recording = recording.set_probe(probe)
+        recording.set_channel_gains(0.01)
+        recording.set_channel_offsets(1.0)
+    return recording
+
+
+@pytest.mark.parametrize("chunk_size", [1000, 30000])
+def test_channel_amplitudes_at_peaks(recording, chunk_size):
+    peaks, marks = detect_peaks(
+        recording,
+        pipeline_nodes=[_ChannelAmplitudes(recording)],
+        chunk_size=chunk_size,
+        n_jobs=1,
+        progress_bar=False,
+        **CLUSTERLESS_PARAMS,
+    )
+    assert len(peaks) > 10
+
+    # same peaks as without the amplitudes
+    np.testing.assert_array_equal(
+        peaks,
+        detect_peaks(
+            recording,
+            chunk_size=chunk_size,
+            n_jobs=1,
+            progress_bar=False,
+            **CLUSTERLESS_PARAMS,
+        ),
+    )
+    # amplitudes of all channels at the peak frames, scaled to uV with the
+    # dtype of the waveforms of si.extract_waveforms
+    traces = recording.get_traces(return_scaled=recording.has_scaled())
+    if np.issubdtype(recording.get_dtype(), np.integer):
+        assert marks.dtype == np.float32
+    else:
+        assert marks.dtype == recording.get_dtype()
+    assert marks.shape == (len(peaks), recording.get_num_channels())
+    np.testing.assert_allclose(marks, traces[peaks["sample_index"]], rtol=1e-6)
+    # peaks are detected on the unscaled traces
+    assert np.all(
+        recording.get_traces()[peaks["sample_index"], peaks["channel_index"]]
+        <= -CLUSTERLESS_PARAMS["detect_threshold"]
+    )
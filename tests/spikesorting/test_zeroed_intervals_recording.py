@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+import spikeinterface as si
+import spikeinterface.preprocessing as sip
+
+from spyglass.spikesorting.zeroed_intervals_recording import (
+    ZeroedIntervalsRecording,
+)
+
+NUM_SAMPLES = [1000, 700]
+
+# [start, stop) frames to zero, per segment
+FRAME_RANGES = {
+    "overlapping": [[[100, 200], [150, 180], [190, 250]], [[10, 20], [5, 15]]],
+    "adjacent": [[[100, 200], [200, 300], [300, 301]], [[50, 60], [60, 61]]],
+    "segment_edges": [[[0, 10], [990, 1000]], [[0, 1], [699, 700]]],
+    "unsorted_and_empty": [[[600, 650], [20, 20], [10, 30]], []],
+    "whole_segment": [[[0, 1000]], [[300, 350]]],
+}
+
+
+@pytest.fixture
+def recording():
+    rng = np.random.default_rng(0)
+    return si.NumpyRecording(
+        [rng.normal(size=(n, 4)).astype("float32") for n in NUM_SAMPLES],
+        sampling_frequency=1000.0,
+    )
+
+
+def _remove_artifacts(recording, list_frame_ranges):
+    """Zero the ranges with a trigger on each of their frames."""
+    list_triggers = [
+        np.concatenate(
+            [np.arange(start, stop) for start, stop in frame_ranges]
+            + [np.zeros(0, dtype=int)]
+        )
+        for frame_ranges in list_frame_ranges
+    ]
+    return sip.remove_artifacts(
+        recording,
+        list_triggers=[list(triggers) for triggers in list_triggers],
+        ms_before=None,
+        ms_after=None,
+        mode="zeros",
+    )
+
+
+@pytest.mark.parametrize("frame_ranges", FRAME_RANGES)
+def test_equals_remove_artifacts(recording, frame_ranges):
+    list_frame_ranges = FRAME_RANGES[frame_ranges]
+    zeroed = ZeroedIntervalsRecording(recording, list_frame_ranges)
+    expected = _remove_artifacts(recording, list_frame_ranges)
+
+    for segment_index, num_samples in enumerate(NUM_SAMPLES):
+        is_zeroed = np.zeros(num_samples, dtype=bool)
+        for start, stop in list_frame_ranges[segment_index]:
+            is_zeroed[start:stop] = True
+        traces = zeroed.get_traces(segment_index=segment_index)
+        assert np.all(traces[is_zeroed] == 0)
+        assert np.all(traces[~is_zeroed] != 0)
+
+        # whole segment, then chunks starting or stopping inside the ranges
+        windows = [(None, None)] + [
+            (start, min(start + chunk_size, num_samples))
+            for chunk_size in (1, 7, 150)
+            for start in range(0, num_samples, chunk_size)
+        ]
+        for start_frame, end_frame in windows:
+            np.testing.assert_array_equal(
+                zeroed.get_traces(
+                    segment_index=segment_index,
+                    start_frame=start_frame,
+                    end_frame=end_frame,
+                ),
+                expected.get_traces(
+                    segment_index=segment_index,
+                    start_frame=start_frame,
+                    end_frame=end_frame,
+                ),
+            )
+        np.testing.assert_array_equal(
+            zeroed.get_traces(segment_index=segment_index, channel_ids=[1, 3]),
+            expected.get_traces(
+                segment_index=segment_index, channel_ids=[1, 3]
+            ),
+        )
+
+
+def test_merged_frame_ranges(recording):
+    zeroed = ZeroedIntervalsRecording(
+        recording,
+        FRAME_RANGES["overlapping"][:1] + FRAME_RANGES["adjacent"][1:],
+    )
+    assert zeroed._kwargs["list_frame_ranges"] == [[[100, 250]], [[50, 61]]]
+    # the parent traces are not changed
+    assert np.all(recording.get_traces(segment_index=0)[100:250] != 0)
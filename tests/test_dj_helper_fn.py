@@ -0,0 +1,146 @@
+import datetime
+import gc
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pynwb
+
+# NOTE: importing this calls spyglass.__init__ and spyglass.common.__init__
+# which both require the DataJoint MySQL server to be already set up and
+# running
+from spyglass.utils.dj_helper_fn import NwbObjectProxy
+from spyglass.utils.nwb_helper_fn import nwb_file_cache
+
+
+class TestNwbObjectProxy(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tempdir.name, "session.nwb")
+        nwbfile = pynwb.NWBFile(
+            session_description="session_description",
+            identifier="identifier",
+            session_start_time=datetime.datetime.now(datetime.timezone.utc),
+        )
+        self.timestamps = np.arange(10) * 0.5
+        self.data = np.arange(20.0).reshape(10, 2)
+        nwbfile.add_acquisition(
+            pynwb.TimeSeries(
+                name="timestamped",
+                data=self.data,
+                timestamps=self.timestamps,
+                unit="m",
+            )
+        )
+        nwbfile.add_acquisition(
+            pynwb.TimeSeries(
+                name="sampled",
+                data=np.arange(8.0),
+                starting_time=1.0,
+                rate=4.0,
+                unit="m",
+            )
+        )
+        nwbfile.add_unit_column(name="quality", description="quality")
+        self.spike_times = [[0.1, 0.5, 1.0, 2.0], [], [1.0, 1.5]]
+        for unit_id, spike_times in enumerate(self.spike_times):
+            nwbfile.add_unit(
+                id=10 + unit_id, spike_times=spike_times, quality="good"
+            )
+        for start_time, stop_time in [(0.0, 1.0), (2.0, 3.0), (3.5, 4.0)]:
+            nwbfile.add_epoch(start_time=start_time, stop_time=stop_time)
+        self.object_ids = {
+            "timestamped": nwbfile.acquisition["timestamped"].object_id,
+            "sampled": nwbfile.acquisition["sampled"].object_id,
+            "units": nwbfile.units.object_id,
+            "epochs": nwbfile.epochs.object_id,
+        }
+        with pynwb.NWBHDF5IO(self.path, "w") as io:
+            io.write(nwbfile)
+        # cleanups run last in, first out: proxies are closed first
+        self.addCleanup(self.tempdir.cleanup)
+        self.addCleanup(nwb_file_cache.close_all)
+
+    def _proxy(self, name):
+        proxy = NwbObjectProxy(self.path, self.object_ids[name])
+        self.addCleanup(proxy.close)
+        return proxy
+
+    def test_timestamps_slice(self):
+        proxy = self._proxy("timestamped")
+        sliced = proxy.time_slice(0.5, 1.5)
+        # both ends are included
+        np.testing.assert_array_equal(sliced.index, [0.5, 1.0, 1.5])
+        np.testing.assert_array_equal(sliced.to_numpy(), self.data[1:4])
+
+        sliced = proxy.time_slice(-np.inf, np.inf)
+        np.testing.assert_array_equal(sliced.index, self.timestamps)
+        np.testing.assert_array_equal(sliced.to_numpy(), self.data)
+
+    def test_timestamps_slice_edges(self):
+        proxy = self._proxy("timestamped")
+        for start, stop, expected in [
+            (-1.0, 0.0, [0.0]),  # first sample
+            (4.5, 10.0, [4.5]),  # last sample
+            (0.6, 0.9, []),  # between samples
+            (-2.0, -1.0, []),  # before the data
+            (5.0, 6.0, []),  # after the data
+            (1.0, 0.5, []),  # stop before start
+        ]:
+            sliced = proxy.time_slice(start, stop)
+            np.testing.assert_array_equal(sliced.index, expected)
+            assert sliced.shape == (len(expected), 2)
+
+    def test_rate_slice(self):
+        proxy = self._proxy("sampled")
+        sliced = proxy.time_slice(1.25, 1.6)
+        np.testing.assert_array_equal(sliced.index, [1.25, 1.5])
+        np.testing.assert_array_equal(sliced.to_numpy().ravel(), [1.0, 2.0])
+
+        for start, stop in [(0.0, 0.9), (3.0, 4.0), (1.3, 1.4)]:
+            assert len(proxy.time_slice(start, stop)) == 0
+        assert len(proxy.time_slice(0.0, 10.0)) == len(proxy) == 8
+
+    def test_spike_times_slice(self):
+        proxy = self._proxy("units")
+        sliced = proxy.time_slice(0.5, 1.0)
+        assert list(sliced.index) == [10, 11, 12]
+        assert list(sliced["quality"]) == ["good"] * 3
+        for spike_times, expected in zip(
+            sliced["spike_times"], [[0.5, 1.0], [], [1.0]]
+        ):
+            np.testing.assert_array_equal(spike_times, expected)
+
+        sliced = proxy.time_slice(5.0, 6.0)
+        assert len(sliced) == 3
+        assert all(
+            len(spike_times) == 0 for spike_times in sliced["spike_times"]
+        )
+
+    def test_intervals_slice(self):
+        proxy = self._proxy("epochs")
+        sliced = proxy.time_slice(0.5, 2.0)
+        assert list(sliced["start_time"]) == [0.0, 2.0]
+        assert len(proxy.time_slice(1.5, 1.8)) == 0
+
+    def test_to_dataframe(self):
+        proxy = self._proxy("units")
+        assert proxy.to_dataframe() is proxy.to_dataframe()
+        assert list(proxy.to_dataframe().index) == [10, 11, 12]
+
+    def test_release_on_del(self):
+        proxy = NwbObjectProxy(self.path, self.object_ids["timestamped"])
+        other = NwbObjectProxy(self.path, self.object_ids["units"])
+        assert nwb_file_cache.stats["in_use"] == {self.path: 2}
+
+        del proxy
+        gc.collect()
+        assert nwb_file_cache.stats["in_use"] == {self.path: 1}
+
+        # released once, whether by close, the with block or __del__
+        with other:
+            pass
+        del other
+        gc.collect()
+        assert nwb_file_cache.stats["in_use"] == {}
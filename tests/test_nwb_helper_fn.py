@@ -1,11 +1,24 @@
 import datetime
+import os
+import tempfile
 import unittest
 
+import numpy as np
 import pynwb
 
 # NOTE: importing this calls spyglass.__init__ whichand spyglass.common.__init__ which both require the
 # DataJoint MySQL server to be already set up and running
 from spyglass.common import get_electrode_indices
+from spyglass.common.common_nwbfile import NWB_KEEP_FIELDS
+from spyglass.utils.nwb_helper_fn import (
+    NwbFileCache,
+    invalid_electrode_index,
+    export_pruned_nwb_file,
+    get_nwb_file,
+    nwb_file_cache,
+    open_nwb_file,
+    write_minimal_nwb_file,
+)
 
 
 class TestGetElectrodeIndices(unittest.TestCase):
@@ -56,3 +69,209 @@ class TestGetElectrodeIndices(unittest.TestCase):
         eseries = self.nwbfile.acquisition["eseries"]
         ret = get_electrode_indices(eseries, [102, 105])
         assert ret == [0, 3]
+
+    def test_electrodes_table(self):
+        ret = get_electrode_indices(self.nwbfile.electrodes, [102, 105])
+        assert ret == [2, 5]
+
+    def test_arrays_and_missing_ids(self):
+        ret = get_electrode_indices(
+            self.nwbfile.electrodes, np.array([109, 100, 42])
+        )
+        assert isinstance(ret, np.ndarray)
+        np.testing.assert_array_equal(ret, [9, 0, invalid_electrode_index])
+
+
+class TestNwbFileCache(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.paths = []
+        for i in range(3):
+            path = os.path.join(self.tempdir.name, f"file{i}.nwb")
+            nwbfile = pynwb.NWBFile(
+                session_description="session_description",
+                identifier=f"identifier{i}",
+                session_start_time=datetime.datetime.now(datetime.timezone.utc),
+            )
+            with pynwb.NWBHDF5IO(path, mode="w") as io:
+                io.write(nwbfile)
+            self.paths.append(path)
+        self.cache = NwbFileCache(max_handles=2)
+
+    def tearDown(self):
+        self.cache.close_all()
+        self.tempdir.cleanup()
+
+    def test_hits_and_misses(self):
+        first = self.cache.get(self.paths[0])
+        assert self.cache.get(self.paths[0]) is first
+        assert first.identifier == "identifier0"
+        assert self.cache.stats["hits"] == 1
+        assert self.cache.stats["misses"] == 1
+
+    def _use(self, path):
+        with self.cache.open(path):
+            pass
+
+    def test_evicts_least_recently_used(self):
+        self._use(self.paths[0])
+        self._use(self.paths[1])
+        self._use(self.paths[0])
+        self._use(self.paths[2])
+        assert self.paths[1] not in self.cache
+        assert self.paths[0] in self.cache
+        assert len(self.cache) == 2
+        assert self.cache.stats["evictions"] == 1
+
+    def test_acquired_file_is_not_evicted(self):
+        with self.cache.open(self.paths[0]):
+            self._use(self.paths[1])
+            self._use(self.paths[2])
+            assert self.paths[0] in self.cache
+            assert self.cache.stats["in_use"] == {self.paths[0]: 1}
+        assert self.paths[0] in self.cache
+        self._use(self.paths[1])
+        assert self.paths[0] not in self.cache
+
+    def test_get_pins_file(self):
+        nwbfile = self.cache.get(self.paths[0])
+        for path in self.paths[1:]:
+            self._use(path)
+        assert self.paths[0] in self.cache
+        assert self.cache.stats["pinned"] == [self.paths[0]]
+        assert nwbfile.identifier == "identifier0"
+
+    def test_open_nwb_file_is_evicted(self):
+        max_handles = nwb_file_cache.max_handles
+        nwb_file_cache.close_all()
+        nwb_file_cache.max_handles = 2
+        try:
+            nwbfile = get_nwb_file(self.paths[0])
+            for path in self.paths[1:]:
+                with open_nwb_file(path) as opened:
+                    assert opened.identifier == f"identifier{path[-5]}"
+            # the file from get_nwb_file is kept, those from open_nwb_file
+            # are closed once over the limit
+            assert self.paths[0] in nwb_file_cache
+            assert self.paths[1] not in nwb_file_cache
+            assert len(nwb_file_cache) == 2
+            assert nwbfile.identifier == "identifier0"
+        finally:
+            nwb_file_cache.close_all()
+            nwb_file_cache.max_handles = max_handles
+
+    def test_size_limit(self):
+        self.cache.max_size = os.path.getsize(self.paths[0])
+        self._use(self.paths[0])
+        self._use(self.paths[1])
+        assert len(self.cache) == 1
+        assert self.cache.stats["evicted_size"] == os.path.getsize(
+            self.paths[0]
+        )
+
+
+class TestWriteMinimalNwbFile(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tempdir.name, "session.nwb")
+        nwbfile = pynwb.NWBFile(
+            session_description="session_description",
+            identifier="identifier",
+            session_start_time=datetime.datetime.now(datetime.timezone.utc),
+            subject=pynwb.file.Subject(subject_id="subject_id"),
+        )
+        dev = nwbfile.create_device(name="device")
+        for group in range(4):
+            elec_group = nwbfile.create_electrode_group(
+                name=f"group{group}",
+                description="description",
+                location="location",
+                device=dev,
+            )
+            for i in range(4):
+                nwbfile.add_electrode(
+                    id=4 * group + i,
+                    x=0.0,
+                    y=0.0,
+                    z=0.0,
+                    imp=-1.0,
+                    location="location",
+                    filtering="filtering",
+                    group=elec_group,
+                )
+        # synthetic session: 16 channels, 100 s at 1 kHz
+        nwbfile.add_acquisition(
+            pynwb.ecephys.ElectricalSeries(
+                name="eseries",
+                data=np.random.randn(100_000, 16),
+                rate=1000.0,
+                electrodes=nwbfile.create_electrode_table_region(
+                    list(range(16)), "electrodes"
+                ),
+            )
+        )
+        nwbfile.add_epoch(0.0, 100.0)
+        with pynwb.NWBHDF5IO(self.path, mode="w") as io:
+            io.write(nwbfile)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_keeps_metadata(self):
+        new_path = os.path.join(self.tempdir.name, "minimal.nwb")
+        write_minimal_nwb_file(self.path, new_path)
+        with pynwb.NWBHDF5IO(self.path, mode="r") as io, pynwb.NWBHDF5IO(
+            new_path, mode="r"
+        ) as new_io:
+            nwbfile, new_nwbfile = io.read(), new_io.read()
+            assert new_nwbfile.identifier == nwbfile.identifier
+            assert new_nwbfile.subject.subject_id == "subject_id"
+            assert new_nwbfile.electrodes.object_id == (
+                nwbfile.electrodes.object_id
+            )
+            assert set(new_nwbfile.electrode_groups) == set(
+                nwbfile.electrode_groups
+            )
+            assert new_nwbfile.electrodes["group"][5].name == "group1"
+            assert new_nwbfile.electrodes["group"][5] is (
+                new_nwbfile.electrode_groups["group1"]
+            )
+            assert not new_nwbfile.acquisition
+            assert new_nwbfile.epochs is None
+
+    def test_append(self):
+        new_path = os.path.join(self.tempdir.name, "minimal.nwb")
+        write_minimal_nwb_file(self.path, new_path)
+        with pynwb.NWBHDF5IO(new_path, mode="a") as io:
+            nwbfile = io.read()
+            nwbfile.add_scratch(
+                pynwb.ecephys.ElectricalSeries(
+                    name="lfp",
+                    data=np.zeros((10, 2)),
+                    rate=10.0,
+                    electrodes=nwbfile.create_electrode_table_region(
+                        [1, 6], "electrodes"
+                    ),
+                )
+            )
+            io.write(nwbfile)
+        with pynwb.NWBHDF5IO(new_path, mode="r") as io:
+            electrodes = io.read().scratch["lfp"].electrodes
+            assert electrodes.to_dataframe().index.tolist() == [1, 6]
+
+    def test_smaller_than_export(self):
+        minimal_path = os.path.join(self.tempdir.name, "minimal.nwb")
+        export_path = os.path.join(self.tempdir.name, "export.nwb")
+        write_minimal_nwb_file(self.path, minimal_path)
+        export_pruned_nwb_file(self.path, export_path, NWB_KEEP_FIELDS)
+        with pynwb.NWBHDF5IO(minimal_path, mode="r") as io, pynwb.NWBHDF5IO(
+            export_path, mode="r"
+        ) as export_io:
+            nwbfile, export_nwbfile = io.read(), export_io.read()
+            assert nwbfile.electrodes.to_dataframe().index.equals(
+                export_nwbfile.electrodes.to_dataframe().index
+            )
+            # only the export keeps the intervals
+            assert nwbfile.epochs is None
+            assert len(export_nwbfile.epochs) == 1
+        assert os.path.getsize(minimal_path) <= os.path.getsize(export_path)